@@ -2,35 +2,260 @@
 """
 Atlas Data Provider for RelayQ
 Provides episode data to RelayQ runners and accepts results back
+
+Transcripts are stored compressed (zstd if the zstandard package is
+installed, else gzip) in the content-addressed relayq_transcripts table and
+referenced from episodes.transcript_hash, so episode rows stay small; the
+text is only decompressed by get_transcript().
+
+RelayQ's own additions to the Atlas schema (lease columns, indexes for the
+pending scan and stats, the transcript table) are applied as numbered MIGRATIONS on first use and
+recorded in the relayq_schema table. bin/bench_atlas.py measures the
+queries before and after them.
 """
 
+import hashlib
+import io
 import json
 import sqlite3
 import os
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_DB_PATH = os.environ.get('ATLAS_DB_PATH', "/home/ubuntu/dev/atlas/podcast_processing.db")
+
+# Applied to every connection; WAL lets readers run alongside a writer
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=30000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+)
+
+DEFAULT_LEASE_SECONDS = 3600
+# Transcripts are read, hashed and compressed in pieces of this size
+TRANSCRIPT_CHUNK = 1 << 20
+
+def add_columns(*columns: Tuple[str, str]):
+    """Migration step adding episodes columns (skipped if already present)"""
+    def apply(conn: sqlite3.Connection):
+        existing = {row['name'] for row in conn.execute("PRAGMA table_info(episodes)")}
+        for name, kind in columns:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE episodes ADD COLUMN {name} {kind}")
+    return apply
+
+# RelayQ-owned schema changes, applied in order and recorded in relayq_schema.
+# Append new entries; never edit one that has shipped.
+MIGRATIONS = [
+    (1, "claim lease columns", add_columns(('claimed_by', "TEXT"), ('lease_expires', "REAL"))),
+    (2, "pending work, lease and status indexes", [
+        # Partial index over pending rows only; covers the claim scan
+        """CREATE INDEX IF NOT EXISTS idx_relayq_episodes_pending
+           ON episodes(podcast_id, published_date DESC, id)
+           WHERE processing_status = 'pending' AND transcript_found = FALSE""",
+        """CREATE INDEX IF NOT EXISTS idx_relayq_episodes_leases
+           ON episodes(lease_expires, podcast_id, published_date, id)
+           WHERE processing_status = 'processing'""",
+        # Covers get_podcast_stats without touching transcript text
+        """CREATE INDEX IF NOT EXISTS idx_relayq_episodes_status
+           ON episodes(processing_status, transcript_found)""",
+    ]),
+    (3, "content-addressed transcript blobs", [
+        """CREATE TABLE IF NOT EXISTS relayq_transcripts (
+               hash TEXT PRIMARY KEY,
+               codec TEXT NOT NULL,
+               size INTEGER NOT NULL,
+               stored_size INTEGER NOT NULL,
+               data BLOB NOT NULL,
+               created_at TEXT
+           )""",
+        add_columns(('transcript_hash', "TEXT")),
+    ]),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+TranscriptSource = Union[str, bytes, BinaryIO]
+
+def compress_transcript(source: TranscriptSource) -> Dict:
+    """Hash and compress a transcript (text, bytes or a binary stream) in chunks.
+
+    Returns the relayq_transcripts row: the sha256 of the UTF-8 text is the
+    key, so identical transcripts are stored once.
+    """
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    if zstandard is not None:
+        codec, compressor = 'zstd', zstandard.ZstdCompressor(level=10).compressobj()
+    else:
+        codec, compressor = 'gzip', zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    digest = hashlib.sha256()
+    out = bytearray()
+    size = 0
+    while True:
+        chunk = source.read(TRANSCRIPT_CHUNK)
+        if not chunk:
+            break
+        digest.update(chunk)
+        out += compressor.compress(chunk)
+        size += len(chunk)
+    out += compressor.flush()
+    return {'hash': digest.hexdigest(), 'codec': codec, 'size': size, 'stored_size': len(out), 'data': bytes(out)}
+
+def decompress_transcript(codec: str, data: bytes) -> str:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise Exception("Transcript is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data).decode('utf-8')
+    return zlib.decompress(data, 31).decode('utf-8')
+
+def open_transcript(value: Optional[str]) -> TranscriptSource:
+    """CLI transcript argument: '-' reads stdin, '@path' reads a file, anything else is the text"""
+    if value == '-':
+        return sys.stdin.buffer
+    if value and value.startswith('@'):
+        return open(value[1:], 'rb')
+    return value or ''
 
 class AtlasDataProvider:
-    def __init__(self):
-        self.db_path = "/home/ubuntu/dev/atlas/podcast_processing.db"
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, persistent: bool = True):
+        """With persistent=True each thread keeps one open connection; otherwise connect per call"""
+        self.db_path = db_path
+        self.persistent = persistent
+        self.local = threading.local()
         self.ensure_database()
+        self.migrate()
 
     def ensure_database(self):
         """Make sure database exists and is accessible"""
         if not os.path.exists(self.db_path):
             raise Exception(f"Atlas database not found: {self.db_path}")
 
-    def get_pending_episodes(self, limit: int = 10, podcast_name: str = None) -> List[Dict]:
-        """Get pending episodes from Atlas database"""
-        conn = sqlite3.connect(self.db_path)
+    def schema_version(self, conn: sqlite3.Connection) -> int:
+        """Highest RelayQ migration applied to this database (0 if none)"""
+        try:
+            return conn.execute("SELECT COALESCE(MAX(version), 0) FROM relayq_schema").fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0
+
+    def migrate(self) -> int:
+        """Apply pending MIGRATIONS; returns how many ran.
+
+        Concurrent runners serialize on BEGIN IMMEDIATE and re-check the
+        version inside the transaction, so each migration runs once.
+        """
+        with self.connection() as conn:
+            if self.schema_version(conn) >= SCHEMA_VERSION:
+                return 0
+
+        applied = 0
+        with self.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS relayq_schema (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT,
+                    applied_at TEXT
+                )
+            """)
+            current = self.schema_version(conn)
+            for version, description, steps in MIGRATIONS:
+                if version <= current:
+                    continue
+                for step in (steps if isinstance(steps, list) else [steps]):
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute("INSERT INTO relayq_schema VALUES (?, ?, ?)",
+                             (version, description, datetime.now().isoformat()))
+                applied += 1
+        if applied:
+            with self.connection() as conn:
+                conn.execute("ANALYZE")
+        return applied
+
+    def open_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
         conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """This thread's persistent connection, or a short-lived one"""
+        if not self.persistent:
+            conn = self.open_connection()
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
+
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.open_connection()
+            self.local.conn = conn
+        yield conn
+
+    @contextmanager
+    def transaction(self):
+        """One write transaction (a single commit/fsync for everything inside)"""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        """Close this thread's persistent connection"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def __enter__(self):
+        return self
 
+    def __exit__(self, *exc):
+        self.close()
+
+    def pending_query(self, limit: int = 10, podcast_name: str = None):
+        """SQL and parameters for get_pending_episodes.
+
+        The inner query sorts narrow (id, podcast, date) rows read from the
+        pending partial index; full episode rows are only fetched for the
+        `limit` winners.
+        """
         query = """
         SELECT e.*, p.name as podcast_name
         FROM episodes e
         JOIN podcasts p ON e.podcast_id = p.id
-        WHERE e.processing_status = 'pending'
-        AND e.transcript_found = FALSE
+        WHERE e.id IN (
+            SELECT e.id
+            FROM episodes e
+            JOIN podcasts p ON e.podcast_id = p.id
+            WHERE e.processing_status = 'pending'
+            AND e.transcript_found = FALSE
         """
 
         params = []
@@ -38,76 +263,226 @@ class AtlasDataProvider:
             query += " AND p.name LIKE ?"
             params.append(f"%{podcast_name}%")
 
+        query += " ORDER BY p.priority DESC, e.published_date DESC LIMIT ?)"
+        query += " ORDER BY p.priority DESC, e.published_date DESC"
+        params.append(limit)
+        return query, params
+
+    def get_pending_episodes(self, limit: int = 10, podcast_name: str = None) -> List[Dict]:
+        """Get pending episodes from Atlas database"""
+        query, params = self.pending_query(limit, podcast_name)
+        with self.connection() as conn:
+            cursor = conn.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
+
+    def claim_episodes(self, limit: int = 10, worker_id: str = None, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                       podcast_name: str = None) -> List[Dict]:
+        """Atomically select and mark up to `limit` episodes as processing for worker_id.
+
+        Pending episodes and episodes whose lease has expired (their worker
+        died or timed out) are eligible. Selection and update happen in one
+        BEGIN IMMEDIATE transaction, so concurrent runners never claim the
+        same episode.
+        """
+        worker_id = worker_id or f"{os.uname().nodename}-{os.getpid()}"
+        now = time.time()
+
+        # Each branch reads only claimable rows from its partial index (the
+        # planner would otherwise pick the non-covering status index)
+        query = """
+        SELECT e.id
+        FROM (
+            SELECT id, podcast_id, published_date FROM episodes INDEXED BY idx_relayq_episodes_pending
+            WHERE processing_status = 'pending' AND transcript_found = FALSE
+            UNION ALL
+            SELECT id, podcast_id, published_date FROM episodes
+            WHERE processing_status = 'processing' AND lease_expires < ?
+        ) e
+        JOIN podcasts p ON e.podcast_id = p.id
+        """
+
+        params = [now]
+        if podcast_name:
+            query += " WHERE p.name LIKE ?"
+            params.append(f"%{podcast_name}%")
+
         query += " ORDER BY p.priority DESC, e.published_date DESC LIMIT ?"
         params.append(limit)
 
-        cursor = conn.execute(query, params)
-        episodes = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        with self.transaction() as conn:
+            ids = [row[0] for row in conn.execute(query, params)]
+            if not ids:
+                return []
+            conn.executemany(
+                "UPDATE episodes SET processing_status = 'processing', claimed_by = ?, lease_expires = ?,"
+                " last_attempt = ? WHERE id = ?",
+                [(worker_id, now + lease_seconds, datetime.now().isoformat(), episode_id) for episode_id in ids]
+            )
+            placeholders = ', '.join('?' for _ in ids)
+            rows = conn.execute(f"""
+                SELECT e.*, p.name as podcast_name
+                FROM episodes e
+                JOIN podcasts p ON e.podcast_id = p.id
+                WHERE e.id IN ({placeholders})
+                ORDER BY p.priority DESC, e.published_date DESC
+            """, ids)
+            return [dict(row) for row in rows]
 
-        return episodes
+    def renew_leases(self, episode_ids: Iterable[int], worker_id: str,
+                     lease_seconds: float = DEFAULT_LEASE_SECONDS) -> int:
+        """Extend the lease on episodes this worker still holds; returns how many were renewed"""
+        expires = time.time() + lease_seconds
+        with self.transaction() as conn:
+            cursor = conn.executemany(
+                "UPDATE episodes SET lease_expires = ? WHERE id = ? AND claimed_by = ?"
+                " AND processing_status = 'processing'",
+                [(expires, episode_id, worker_id) for episode_id in episode_ids]
+            )
+            return cursor.rowcount
 
     def mark_episode_processing(self, episode_id: int, status: str = 'processing'):
         """Mark episode as being processed"""
-        conn = sqlite3.connect(self.db_path)
-        conn.execute(
-            "UPDATE episodes SET processing_status = ?, last_attempt = ? WHERE id = ?",
-            (status, datetime.now().isoformat(), episode_id)
-        )
-        conn.commit()
-        conn.close()
-
-    def mark_episode_completed(self, episode_id: int, transcript_text: str, source_url: str, quality_score: int = 5):
-        """Mark episode as completed with transcript"""
-        conn = sqlite3.connect(self.db_path)
-        conn.execute("""
-            UPDATE episodes SET
-                processing_status = 'completed',
-                transcript_found = TRUE,
-                transcript_text = ?,
-                transcript_source = ?,
-                transcript_url = ?,
-                processing_attempts = processing_attempts + 1,
-                last_attempt = ?
-            WHERE id = ?
-        """, (transcript_text, "RelayQ Discovery", source_url, quality_score, datetime.now().isoformat(), episode_id))
-        conn.commit()
-        conn.close()
+        self.mark_many_processing([episode_id], status)
+
+    def mark_many_processing(self, episode_ids: Iterable[int], status: str = 'processing') -> int:
+        """Mark a batch of episodes as being processed in one transaction"""
+        now = datetime.now().isoformat()
+        rows = [(status, now, episode_id) for episode_id in episode_ids]
+        with self.transaction() as conn:
+            conn.executemany("UPDATE episodes SET processing_status = ?, last_attempt = ? WHERE id = ?", rows)
+        return len(rows)
+
+    def mark_episode_completed(self, episode_id: int, transcript_text: TranscriptSource, source_url: str,
+                               quality_score: int = 5):
+        """Mark episode as completed with transcript (text, bytes or a binary stream)"""
+        self.complete_many([{
+            'episode_id': episode_id,
+            'transcript': transcript_text,
+            'source_url': source_url,
+        }])
+
+    def complete_many(self, results: Iterable[Dict]) -> int:
+        """Store a batch of transcripts in one transaction.
+
+        Each result is {"episode_id", "source_url"} plus the transcript as
+        "transcript_text", "transcript_path" (read in chunks) or
+        "transcript" (a binary stream). Compression happens before the
+        write transaction starts.
+        """
+        now = datetime.now().isoformat()
+        blobs, rows = {}, []
+        for r in results:
+            if r.get('transcript_path'):
+                with open(r['transcript_path'], 'rb') as f:
+                    blob = compress_transcript(f)
+            else:
+                blob = compress_transcript(r.get('transcript', r.get('transcript_text') or ''))
+            blobs[blob['hash']] = (blob['hash'], blob['codec'], blob['size'], blob['stored_size'], blob['data'], now)
+            rows.append((blob['hash'], "RelayQ Discovery", r.get('source_url', ''), now, r['episode_id']))
+
+        with self.transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO relayq_transcripts VALUES (?, ?, ?, ?, ?, ?)", blobs.values())
+            conn.executemany("""
+                UPDATE episodes SET
+                    processing_status = 'completed',
+                    transcript_found = TRUE,
+                    transcript_text = NULL,
+                    transcript_hash = ?,
+                    transcript_source = ?,
+                    transcript_url = ?,
+                    processing_attempts = processing_attempts + 1,
+                    last_attempt = ?,
+                    lease_expires = NULL
+                WHERE id = ?
+            """, rows)
+        return len(rows)
+
+    def get_transcript(self, episode_id: int) -> Optional[str]:
+        """Load one episode's transcript (blob, or legacy inline text)"""
+        with self.connection() as conn:
+            row = conn.execute("""
+                SELECT e.transcript_text, t.codec, t.data
+                FROM episodes e
+                LEFT JOIN relayq_transcripts t ON t.hash = e.transcript_hash
+                WHERE e.id = ?
+            """, (episode_id,)).fetchone()
+        if row is None:
+            return None
+        if row['data'] is not None:
+            return decompress_transcript(row['codec'], row['data'])
+        return row['transcript_text']
+
+    def externalize_transcripts(self, batch_size: int = 500) -> int:
+        """Move inline transcript_text into relayq_transcripts, one transaction per batch"""
+        moved = 0
+        while True:
+            with self.connection() as conn:
+                rows = conn.execute(
+                    "SELECT id, transcript_text FROM episodes WHERE transcript_text IS NOT NULL LIMIT ?",
+                    (batch_size,)).fetchall()
+            if not rows:
+                return moved
+            now = datetime.now().isoformat()
+            blobs, updates = {}, []
+            for row in rows:
+                blob = compress_transcript(row['transcript_text'])
+                blobs[blob['hash']] = (blob['hash'], blob['codec'], blob['size'], blob['stored_size'],
+                                       blob['data'], now)
+                updates.append((blob['hash'], row['id']))
+            with self.transaction() as conn:
+                conn.executemany("INSERT OR IGNORE INTO relayq_transcripts VALUES (?, ?, ?, ?, ?, ?)",
+                                 blobs.values())
+                conn.executemany("UPDATE episodes SET transcript_hash = ?, transcript_text = NULL WHERE id = ?",
+                                 updates)
+            moved += len(updates)
 
     def mark_episode_failed(self, episode_id: int, error_message: str):
         """Mark episode as failed"""
-        conn = sqlite3.connect(self.db_path)
-        conn.execute("""
-            UPDATE episodes SET
-                processing_status = 'failed',
-                processing_attempts = processing_attempts + 1,
-                last_attempt = ?,
-                error_message = ?
-            WHERE id = ?
-        """, (datetime.now().isoformat(), error_message, episode_id))
-        conn.commit()
-        conn.close()
+        self.fail_many([{'episode_id': episode_id, 'error_message': error_message}])
 
-    def get_podcast_stats(self) -> Dict:
-        """Get statistics about podcasts"""
-        conn = sqlite3.connect(self.db_path)
+    def fail_many(self, failures: Iterable[Dict]) -> int:
+        """Mark a batch of episodes ({"episode_id", "error_message"}) as failed in one transaction"""
+        now = datetime.now().isoformat()
+        rows = [(now, f.get('error_message', 'Unknown error'), f['episode_id']) for f in failures]
+        with self.transaction() as conn:
+            conn.executemany("""
+                UPDATE episodes SET
+                    processing_status = 'failed',
+                    processing_attempts = processing_attempts + 1,
+                    last_attempt = ?,
+                    error_message = ?,
+                    lease_expires = NULL
+                WHERE id = ?
+            """, rows)
+        return len(rows)
 
+    def get_podcast_stats(self) -> Dict:
+        """Get statistics about podcasts (one pass over the status index)"""
         stats = {
-            'total_podcasts': conn.execute("SELECT COUNT(*) FROM podcasts").fetchone()[0],
-            'total_episodes': conn.execute("SELECT COUNT(*) FROM episodes").fetchone()[0],
-            'pending_episodes': conn.execute("SELECT COUNT(*) FROM episodes WHERE processing_status = 'pending'").fetchone()[0],
-            'processing_episodes': conn.execute("SELECT COUNT(*) FROM episodes WHERE processing_status = 'processing'").fetchone()[0],
-            'completed_episodes': conn.execute("SELECT COUNT(*) FROM episodes WHERE transcript_found = 1").fetchone()[0],
-            'failed_episodes': conn.execute("SELECT COUNT(*) FROM episodes WHERE processing_status = 'failed'").fetchone()[0]
+            'total_podcasts': 0,
+            'total_episodes': 0,
+            'pending_episodes': 0,
+            'processing_episodes': 0,
+            'completed_episodes': 0,
+            'failed_episodes': 0
         }
-
-        conn.close()
+        with self.connection() as conn:
+            stats['total_podcasts'] = conn.execute("SELECT COUNT(*) FROM podcasts").fetchone()[0]
+            rows = conn.execute("""
+                SELECT processing_status, transcript_found, COUNT(*)
+                FROM episodes
+                GROUP BY processing_status, transcript_found
+            """)
+            for status, transcript_found, count in rows:
+                stats['total_episodes'] += count
+                if status in ('pending', 'processing', 'failed'):
+                    stats[f'{status}_episodes'] += count
+                if transcript_found == 1:
+                    stats['completed_episodes'] += count
         return stats
 
 # CLI interface for RelayQ runners
 if __name__ == "__main__":
-    import sys
-
     provider = AtlasDataProvider()
     command = sys.argv[1] if len(sys.argv) > 1 else "help"
 
@@ -122,27 +497,64 @@ if __name__ == "__main__":
             "podcast_filter": podcast_name
         }, indent=2))
 
+    elif command == "claim":
+        limit = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+        worker_id = sys.argv[3] if len(sys.argv) > 3 else None
+        lease_seconds = float(sys.argv[4]) if len(sys.argv) > 4 else DEFAULT_LEASE_SECONDS
+        podcast_name = sys.argv[5] if len(sys.argv) > 5 else None
+
+        episodes = provider.claim_episodes(limit, worker_id, lease_seconds, podcast_name)
+        print(json.dumps({
+            "episodes": episodes,
+            "count": len(episodes),
+            "podcast_filter": podcast_name
+        }, indent=2))
+
     elif command == "start_processing":
-        episode_id = int(sys.argv[2])
-        provider.mark_episode_processing(episode_id)
+        episode_ids = [int(arg) for arg in sys.argv[2:]]
+        provider.mark_many_processing(episode_ids)
         print(json.dumps({
             "status": "processing_started",
-            "episode_id": episode_id,
+            "episode_id": episode_ids[0] if len(episode_ids) == 1 else episode_ids,
+            "timestamp": datetime.now().isoformat()
+        }, indent=2))
+
+    elif command in ("complete_many", "fail_many"):
+        # One JSON object per line on stdin, applied in a single transaction
+        rows = [json.loads(line) for line in sys.stdin if line.strip()]
+        if command == "complete_many":
+            count = provider.complete_many(rows)
+        else:
+            count = provider.fail_many(rows)
+        print(json.dumps({
+            "status": "completed" if command == "complete_many" else "failed",
+            "count": count,
             "timestamp": datetime.now().isoformat()
         }, indent=2))
 
     elif command == "complete_episode":
         episode_id = int(sys.argv[2])
-        transcript_text = sys.argv[3] if len(sys.argv) > 3 else ""
+        transcript = open_transcript(sys.argv[3] if len(sys.argv) > 3 else "")
         source_url = sys.argv[4] if len(sys.argv) > 4 else ""
 
-        provider.mark_episode_completed(episode_id, transcript_text, source_url)
+        provider.mark_episode_completed(episode_id, transcript, source_url)
         print(json.dumps({
             "status": "completed",
             "episode_id": episode_id,
             "timestamp": datetime.now().isoformat()
         }, indent=2))
 
+    elif command == "get_transcript":
+        transcript = provider.get_transcript(int(sys.argv[2]))
+        if transcript is None:
+            print(f"Error: no transcript for episode {sys.argv[2]}", file=sys.stderr)
+            sys.exit(1)
+        sys.stdout.write(transcript)
+
+    elif command == "externalize_transcripts":
+        moved = provider.externalize_transcripts()
+        print(json.dumps({"status": "externalized", "count": moved}, indent=2))
+
     elif command == "fail_episode":
         episode_id = int(sys.argv[2])
         error_message = sys.argv[3] if len(sys.argv) > 3 else "Unknown error"
@@ -163,7 +575,12 @@ if __name__ == "__main__":
         print("Atlas Data Provider for RelayQ")
         print("Commands:")
         print("  python3 atlas_data_provider.py get_episodes [limit] [podcast_filter]")
-        print("  python3 atlas_data_provider.py start_processing <episode_id>")
-        print("  python3 atlas_data_provider.py complete_episode <episode_id> <transcript> <source>")
+        print("  python3 atlas_data_provider.py claim [limit] [worker_id] [lease_seconds] [podcast_filter]")
+        print("  python3 atlas_data_provider.py start_processing <episode_id> [episode_id...]")
+        print("  python3 atlas_data_provider.py complete_episode <episode_id> <transcript|-|@file> <source>")
+        print("  python3 atlas_data_provider.py get_transcript <episode_id>")
+        print("  python3 atlas_data_provider.py externalize_transcripts")
         print("  python3 atlas_data_provider.py fail_episode <episode_id> <error>")
+        print("  python3 atlas_data_provider.py complete_many < results.jsonl  # {episode_id, transcript_text|transcript_path, source_url}")
+        print("  python3 atlas_data_provider.py fail_many < failures.jsonl     # {episode_id, error_message}")
         print("  python3 atlas_data_provider.py stats")
\ No newline at end of file
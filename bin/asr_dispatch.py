@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+RelayQ Remote ASR Dispatcher
+
+Sends an audio file to the remote transcription APIs (OpenAI, and the
+OpenAI-compatible router) with every configured key as its own endpoint:
+all of OPENROUTER_KEYS are used, not just the first.
+
+Per endpoint it records latency (seconds per MB uploaded) and recent
+errors in a per-runner stats file, and orders attempts by:
+    cooling down (429 / auth failure / repeated errors) last
+    the requested backend first
+    error rate, then requests in flight from this process, then least
+    recently used (rotates load across healthy keys)
+A failed attempt moves straight on to the next endpoint.
+
+With --hedge, a second endpoint (another backend when one is configured)
+is started once the first has run past its p95 latency for a file of this
+size, and whichever succeeds first wins.
+
+Set OPENAI_BASE_URL / ROUTER_BASE_URL to local fake servers in tests.
+
+Usage:
+    asr_dispatch.py transcribe <audio> <output> [--backend auto|openai|router] [--hedge] [--timeout S]
+    asr_dispatch.py endpoints
+    asr_dispatch.py stats
+"""
+
+import argparse
+import fcntl
+import hashlib
+import http.client
+import json
+import math
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_STATS_PATH = os.path.expanduser(
+    os.environ.get('RELAYQ_ASR_STATS') or '~/.cache/relayq/asr_stats.json')
+DEFAULT_TIMEOUT = float(os.environ.get('RELAYQ_ASR_TIMEOUT', '600'))
+
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+ROUTER_BASE_URL = os.environ.get('ROUTER_BASE_URL', 'https://openrouter.ai/api/v1')
+ROUTER_MODEL = os.environ.get('ROUTER_MODEL', 'openai/whisper-1')
+ROUTER_HEADERS = {'HTTP-Referer': 'https://github.com/Khamel83/relayq', 'X-Title': 'RelayQ'}
+
+# Samples kept per endpoint, and the window error rates are computed over
+LATENCY_SAMPLES = 100
+ERROR_WINDOW = 20
+
+# Hedge deadline: p95 seconds/MB x size, never below MIN_HEDGE_S; before an
+# endpoint has MIN_SAMPLES successes DEFAULT_HEDGE_S_PER_MB is used
+MIN_SAMPLES = 5
+MIN_HEDGE_S = 5.0
+DEFAULT_HEDGE_S_PER_MB = 6.0
+
+# Cool-downs (seconds) after failures
+RATE_LIMIT_COOLDOWN_S = 60
+AUTH_COOLDOWN_S = 3600
+ERROR_COOLDOWN_S = 30
+ERRORS_BEFORE_COOLDOWN = 3
+
+class ASRError(Exception):
+    """One attempt failed; status is the HTTP code (None for network errors)"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class Endpoint:
+    """One backend + key; the id carries a key fingerprint, never the key"""
+
+    def __init__(self, backend: str, base_url: str, key: str, model: str, headers: Optional[Dict[str, str]] = None):
+        self.backend = backend
+        self.base_url = base_url.rstrip('/')
+        self.key = key
+        self.model = model
+        self.headers = headers or {}
+        self.id = f"{backend}#{hashlib.sha256(key.encode()).hexdigest()[:8]}"
+
+    def transcribe(self, body: bytes, boundary: str, timeout: float) -> str:
+        headers = dict(self.headers, **{
+            'Authorization': f"Bearer {self.key}",
+            'Content-Type': f"multipart/form-data; boundary={boundary}",
+        })
+        request = urllib.request.Request(f"{self.base_url}/audio/transcriptions", data=body, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return response.read().decode('utf-8', errors='replace')
+        except urllib.error.HTTPError as e:
+            retry_after = e.headers.get('Retry-After') if e.headers else None
+            e.close()
+            raise ASRError(f"{self.id}: HTTP {e.code}", e.code,
+                           float(retry_after) if retry_after and retry_after.isdigit() else None)
+        except (urllib.error.URLError, OSError) as e:
+            raise ASRError(f"{self.id}: {getattr(e, 'reason', e)}")
+        except (http.client.HTTPException, ValueError) as e:
+            # Truncated or malformed responses, and base URLs urllib cannot open
+            raise ASRError(f"{self.id}: {e!r}")
+
+def split_keys(value: Optional[str]) -> List[str]:
+    return [k.strip() for k in (value or '').split(',') if k.strip()]
+
+def configured_endpoints(env: Dict[str, str] = os.environ) -> List[Endpoint]:
+    """Endpoints from the same variables transcribe.sh reads.
+
+    AI_API_KEY belongs to whichever backend ASR_BACKEND names.
+    """
+    backend = env.get('ASR_BACKEND', 'local')
+    shared = env.get('AI_API_KEY', '')
+
+    openai_keys = split_keys(env.get('OPENAI_API_KEY'))
+    router_keys = split_keys(env.get('OPENROUTER_KEYS')) or split_keys(env.get('ROUTER_API_KEY'))
+    if shared:
+        target = openai_keys if backend == 'openai' else router_keys
+        if shared not in target:
+            target.insert(0, shared)
+
+    endpoints = [Endpoint('openai', OPENAI_BASE_URL, key, 'whisper-1') for key in openai_keys]
+    endpoints += [Endpoint('router', ROUTER_BASE_URL, key, ROUTER_MODEL, ROUTER_HEADERS) for key in router_keys]
+    return endpoints
+
+def multipart(path: str, model: str) -> Tuple[bytes, str]:
+    """Body and boundary for file + model + response_format=text"""
+    boundary = uuid.uuid4().hex
+    with open(path, 'rb') as f:
+        audio = f.read()
+    parts = []
+    for name, value in (('model', model), ('response_format', 'text')):
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+                 f'filename="{os.path.basename(path)}"\r\nContent-Type: application/octet-stream\r\n\r\n'.encode())
+    parts.append(audio)
+    parts.append(f'\r\n--{boundary}--\r\n'.encode())
+    return b''.join(parts), boundary
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(math.ceil(q * len(ordered))) - 1, len(ordered) - 1)]
+
+class EndpointStats:
+    """Latency/error history per endpoint, shared by all jobs on the runner through a JSON file.
+
+    Attempts are recorded in memory and merged into the file under an
+    exclusive lock, so concurrent jobs do not lose each other's updates.
+    """
+
+    def __init__(self, path: str = DEFAULT_STATS_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pending = []
+        self.data = self.load()
+
+    def load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def entry(self, endpoint_id: str) -> Dict[str, Any]:
+        return self.data.get(endpoint_id) or {}
+
+    def cooling(self, endpoint_id: str, now: float) -> bool:
+        return self.entry(endpoint_id).get('cooldown_until', 0) > now
+
+    def error_rate(self, endpoint_id: str) -> float:
+        recent = self.entry(endpoint_id).get('recent', [])
+        return recent.count(0) / len(recent) if recent else 0.0
+
+    def hedge_deadline(self, endpoint_id: str, size_mb: float) -> float:
+        samples = self.entry(endpoint_id).get('s_per_mb', [])
+        per_mb = percentile(samples, 0.95) if len(samples) >= MIN_SAMPLES else DEFAULT_HEDGE_S_PER_MB
+        return max(per_mb * size_mb, MIN_HEDGE_S)
+
+    def order(self, endpoints: List[Endpoint], preferred: Optional[str] = None,
+              busy: Optional[Dict[str, int]] = None) -> List[Endpoint]:
+        now = time.time()
+        busy = busy or {}
+        return sorted(endpoints, key=lambda e: (
+            self.cooling(e.id, now),
+            preferred is not None and e.backend != preferred,
+            round(self.error_rate(e.id), 1),
+            busy.get(e.id, 0),
+            self.entry(e.id).get('last_used', 0),
+        ))
+
+    def record(self, endpoint_id: str, ok: bool, seconds: float, size_mb: float,
+               error: Optional[ASRError] = None):
+        event = {'id': endpoint_id, 'ok': ok, 'seconds': seconds, 'size_mb': size_mb, 'at': time.time(),
+                 'status': error.status if error else None, 'retry_after': error.retry_after if error else None}
+        with self.lock:
+            self.pending.append(event)
+            self.apply(self.data, event)
+
+    @staticmethod
+    def apply(data: Dict[str, Any], event: Dict[str, Any]):
+        entry = data.setdefault(event['id'], {'ok': 0, 'errors': 0, 'recent': [], 's_per_mb': []})
+        entry['last_used'] = event['at']
+        entry['recent'] = (entry['recent'] + [1 if event['ok'] else 0])[-ERROR_WINDOW:]
+        if event['ok']:
+            entry['ok'] += 1
+            entry['s_per_mb'] = (entry['s_per_mb'] + [round(event['seconds'] / max(event['size_mb'], 0.01), 3)])[-LATENCY_SAMPLES:]
+            entry['cooldown_until'] = 0
+            return
+        entry['errors'] += 1
+        status = event['status']
+        if status == 429:
+            cooldown = event['retry_after'] or RATE_LIMIT_COOLDOWN_S
+        elif status in (401, 403):
+            cooldown = AUTH_COOLDOWN_S
+        elif entry['recent'][-ERRORS_BEFORE_COOLDOWN:] == [0] * ERRORS_BEFORE_COOLDOWN:
+            cooldown = ERROR_COOLDOWN_S
+        else:
+            cooldown = 0
+        entry['cooldown_until'] = max(entry.get('cooldown_until', 0), event['at'] + cooldown)
+
+    def save(self):
+        """Merge this process's attempts into the shared file"""
+        with self.lock:
+            events, self.pending = self.pending, []
+        if not events:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            data = self.load()
+            for event in events:
+                self.apply(data, event)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        self.data = data
+
+    def summary(self) -> Dict[str, Any]:
+        now = time.time()
+        out = {}
+        for endpoint_id, entry in sorted(self.data.items()):
+            samples = entry.get('s_per_mb', [])
+            out[endpoint_id] = {
+                'ok': entry.get('ok', 0),
+                'errors': entry.get('errors', 0),
+                'error_rate': round(self.error_rate(endpoint_id), 3),
+                'p50_s_per_mb': percentile(samples, 0.5) if samples else None,
+                'p95_s_per_mb': percentile(samples, 0.95) if samples else None,
+                'cooling_s': max(round(entry.get('cooldown_until', 0) - now), 0),
+            }
+        return out
+
+class Dispatcher:
+    """Fallback chain (and optional hedge) over the configured endpoints.
+
+    Safe to share between threads (chunked_upload.py sends chunks
+    concurrently); requests in flight count against an endpoint when
+    picking the next one.
+    """
+
+    def __init__(self, endpoints: List[Endpoint], stats: EndpointStats, timeout: float = DEFAULT_TIMEOUT):
+        self.endpoints = endpoints
+        self.stats = stats
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.busy = {}
+
+    def pick(self, candidates: List[Endpoint], backend: Optional[str],
+             avoid: Optional[str] = None) -> Endpoint:
+        """Take the best remaining candidate (preferably not on backend `avoid`) and mark it busy"""
+        with self.lock:
+            ordered = self.stats.order(candidates, backend, self.busy)
+            endpoint = next((e for e in ordered if e.backend != avoid), ordered[0])
+            candidates.remove(endpoint)
+            self.busy[endpoint.id] = self.busy.get(endpoint.id, 0) + 1
+        return endpoint
+
+    def attempt(self, endpoint: Endpoint, path: str, size_mb: float, results: queue.Queue):
+        """Run one request; puts (endpoint, text, seconds, error) on results"""
+        started = time.monotonic()
+        text, error = None, None
+        try:
+            body, boundary = multipart(path, endpoint.model)
+            text = endpoint.transcribe(body, boundary, self.timeout)
+        except Exception as e:
+            # Every attempt must post a result, or transcribe() waits for it forever
+            error = e if isinstance(e, ASRError) else ASRError(f"{endpoint.id}: {e!r}")
+        finally:
+            with self.lock:
+                self.busy[endpoint.id] -= 1
+        elapsed = time.monotonic() - started
+        try:
+            self.stats.record(endpoint.id, error is None, elapsed, size_mb, error)
+        finally:
+            results.put((endpoint, text, elapsed, error))
+
+    def transcribe(self, path: str, backend: Optional[str] = None, hedge: bool = False) -> Dict[str, Any]:
+        if not self.endpoints:
+            raise ASRError("no remote ASR keys configured (OPENAI_API_KEY, OPENROUTER_KEYS, ROUTER_API_KEY, AI_API_KEY)")
+        size_mb = os.path.getsize(path) / 1048576.0
+        candidates = list(self.endpoints)
+        results = queue.Queue()
+        errors = []
+        started = time.monotonic()
+        in_flight, hedged, hedge_at = 0, False, None
+
+        def launch(endpoint: Endpoint):
+            nonlocal in_flight
+            # Daemon threads: a losing hedge must not keep the process alive
+            threading.Thread(target=self.attempt, args=(endpoint, path, size_mb, results), daemon=True).start()
+            in_flight += 1
+
+        try:
+            while candidates or in_flight:
+                if not in_flight:
+                    primary = self.pick(candidates, backend)
+                    launch(primary)
+                    hedge_at = time.monotonic() + self.stats.hedge_deadline(primary.id, size_mb) if hedge else None
+                wait_s = None
+                if hedge_at is not None and candidates:
+                    wait_s = max(hedge_at - time.monotonic(), 0)
+                try:
+                    endpoint, text, elapsed, error = results.get(timeout=wait_s)
+                except queue.Empty:
+                    # Past p95: race a second endpoint, preferably on another backend
+                    launch(self.pick(candidates, backend, avoid=primary.backend))
+                    hedged, hedge_at = True, None
+                    continue
+                in_flight -= 1
+                if error is not None:
+                    errors.append(str(error))
+                    continue
+                return {'text': text, 'endpoint': endpoint.id, 'latency_s': round(elapsed, 2),
+                        'wall_s': round(time.monotonic() - started, 2), 'hedged': hedged,
+                        'attempts': len(errors) + 1, 'errors': errors}
+        finally:
+            self.stats.save()
+        raise ASRError("all endpoints failed: " + '; '.join(errors))
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="Remote ASR dispatcher with key rotation and hedging")
+    parser.add_argument('--stats-file', default=DEFAULT_STATS_PATH)
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('transcribe', help="Transcribe one file")
+    p.add_argument('audio')
+    p.add_argument('output')
+    p.add_argument('--backend', default='auto', choices=['auto', 'openai', 'router'],
+                   help="Backend to try first (others remain fallbacks)")
+    p.add_argument('--hedge', action='store_true', default=os.environ.get('RELAYQ_ASR_HEDGE') == '1',
+                   help="Start a second endpoint after the first passes its p95 latency")
+    p.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help="Per-request timeout in seconds")
+    sub.add_parser('endpoints', help="Configured endpoints in the order they would be tried")
+    sub.add_parser('stats', help="Latency and error rates per endpoint")
+    args = parser.parse_args()
+
+    stats = EndpointStats(args.stats_file)
+    if args.command == 'stats':
+        print(json.dumps(stats.summary(), indent=2))
+        return
+    if args.command == 'endpoints':
+        for endpoint in stats.order(configured_endpoints()):
+            print(endpoint.id)
+        return
+
+    dispatcher = Dispatcher(configured_endpoints(), stats, args.timeout)
+    try:
+        result = dispatcher.transcribe(args.audio, None if args.backend == 'auto' else args.backend, args.hedge)
+    except (ASRError, OSError) as e:
+        print(f"Error: remote transcription failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    with open(args.output, 'w') as f:
+        f.write(result.pop('text'))
+    print(json.dumps(result), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
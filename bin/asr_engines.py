@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+RelayQ ASR Engines
+
+Quantized alternatives to PyTorch openai-whisper for CPU runners:
+
+    ggml    whisper.cpp on the ggml .bin files download_whisper_model fetches
+            into WHISPER_MODEL_PATH (pywhispercpp binding, else the
+            whisper-cli binary); quantized with WHISPER_QUANT (q8_0 = int8)
+    ct2     CTranslate2 via faster-whisper, compute_type int8
+    torch   openai-whisper (fp32; the only engine for mps)
+
+Models are named "<engine>:<model>" (e.g. "ggml:base"); a bare name is
+torch, so existing WHISPER_MODEL values keep working. whisperd.load_model
+resolves the prefix, so whisperd, chunked and streaming transcription all
+accept these names.
+
+The engine is picked per runner: `asr_engine` under the runner in
+policy.yaml if that engine is installed, else torch for GPU devices, else
+the first installed of ggml, ct2, torch.
+
+Usage:
+    asr_engines.py select [--runner LABEL] [--device DEVICE]   # prints the engine
+    asr_engines.py qualify <model> [--runner LABEL] [--device DEVICE]
+    asr_engines.py list
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import wave
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from select_target import DEFAULT_POLICY_PATH, load_policy
+
+ENGINES = ('ggml', 'ct2', 'torch')
+QUANTIZED_ENGINES = ('ggml', 'ct2')
+GPU_DEVICES = ('cuda', 'mps')
+
+WHISPER_MODEL_PATH = os.environ.get('WHISPER_MODEL_PATH', '/opt/models')
+WHISPER_QUANT = os.environ.get('WHISPER_QUANT', 'q8_0')
+WHISPER_CPP_BIN = os.environ.get('WHISPER_CPP_BIN')
+WHISPER_CPP_NAMES = ('whisper-cli', 'whisper-cpp')
+CT2_COMPUTE_TYPE = os.environ.get('RELAYQ_CT2_COMPUTE_TYPE', 'int8')
+
+SAMPLE_RATE = 16000
+
+def split_model(name: str) -> Tuple[str, str]:
+    """("ggml", "base") for "ggml:base"; bare names are torch"""
+    engine, _, model = name.rpartition(':')
+    if engine in ENGINES:
+        return engine, model
+    return 'torch', name
+
+def whisper_cpp_binary() -> Optional[str]:
+    if WHISPER_CPP_BIN:
+        return WHISPER_CPP_BIN if os.path.exists(WHISPER_CPP_BIN) else None
+    for name in WHISPER_CPP_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+def available_engines() -> Dict[str, bool]:
+    """Which engines are installed (checked without importing them)"""
+    return {
+        'ggml': importlib.util.find_spec('pywhispercpp') is not None or whisper_cpp_binary() is not None,
+        'ct2': importlib.util.find_spec('faster_whisper') is not None,
+        'torch': importlib.util.find_spec('whisper') is not None,
+    }
+
+def select_engine(runner: Optional[str] = None, device: str = 'cpu',
+                  policy_path: str = DEFAULT_POLICY_PATH) -> str:
+    """Engine for this runner: policy asr_engine if installed, torch on GPUs, else fastest installed"""
+    available = available_engines()
+    caps = {}
+    if runner:
+        caps = (load_policy(policy_path).get('runner_capabilities', {}) or {}).get(runner) or {}
+    configured = caps.get('asr_engine')
+    if configured in ENGINES and available[configured]:
+        return configured
+    if device in GPU_DEVICES and available['torch']:
+        return 'torch'
+    for engine in ENGINES:
+        if available[engine]:
+            return engine
+    return 'torch'
+
+def qualify(model: str, engine: str) -> str:
+    """Model name as load_model expects it for this engine"""
+    if model.startswith('stub') or engine == 'torch':
+        return model
+    return f"{engine}:{split_model(model)[1]}"
+
+def ggml_model_path(model: str, quant: str = WHISPER_QUANT, model_dir: str = WHISPER_MODEL_PATH) -> str:
+    """Downloaded ggml file for a model: quantized first, then full precision"""
+    candidates = [f"ggml-{model}.bin", f"{model}.bin"]
+    if quant:
+        candidates.insert(0, f"ggml-{model}-{quant}.bin")
+    for name in candidates:
+        path = os.path.join(model_dir, name)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"no ggml model for {model} in {model_dir} (tried {', '.join(candidates)})")
+
+def read_audio(audio) -> Any:
+    """float32 samples from a 16 kHz mono 16-bit WAV path, or the array as given"""
+    import numpy as np
+
+    if not isinstance(audio, str):
+        return np.asarray(audio, dtype=np.float32)
+    with wave.open(audio, 'rb') as f:
+        if f.getsampwidth() != 2 or f.getnchannels() != 1 or f.getframerate() != SAMPLE_RATE:
+            raise ValueError(f"{audio}: expected 16 kHz mono 16-bit WAV (run convert_audio first)")
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+    return samples.astype(np.float32) / 32768.0
+
+def result_dict(segments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """whisper-style result from (start, end, text) segments"""
+    return {'text': ''.join(s['text'] for s in segments).strip(), 'segments': segments}
+
+class GgmlModel:
+    """whisper.cpp through pywhispercpp, or the whisper-cli binary when the binding is missing"""
+
+    def __init__(self, model: str, threads: Optional[int] = None):
+        self.path = ggml_model_path(model)
+        self.threads = threads or os.cpu_count() or 1
+        self.binding = None
+        if importlib.util.find_spec('pywhispercpp') is not None:
+            from pywhispercpp.model import Model
+            self.binding = Model(self.path, n_threads=self.threads, print_progress=False,
+                                 print_realtime=False)
+        else:
+            self.binary = whisper_cpp_binary()
+            if self.binary is None:
+                raise RuntimeError("whisper.cpp not found (pip install pywhispercpp, or set WHISPER_CPP_BIN)")
+
+    def transcribe(self, audio, **options) -> Dict[str, Any]:
+        if self.binding is not None:
+            # whisper.cpp timestamps are in centiseconds
+            return result_dict([{'start': s.t0 / 100.0, 'end': s.t1 / 100.0, 'text': s.text}
+                                for s in self.binding.transcribe(read_audio(audio))])
+        return self.transcribe_cli(audio)
+
+    def transcribe_cli(self, audio) -> Dict[str, Any]:
+        with tempfile.TemporaryDirectory(prefix='relayq-ggml-') as tmp:
+            if not isinstance(audio, str):
+                import numpy as np
+                path = os.path.join(tmp, 'input.wav')
+                with wave.open(path, 'wb') as f:
+                    f.setnchannels(1)
+                    f.setsampwidth(2)
+                    f.setframerate(SAMPLE_RATE)
+                    f.writeframes((np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+                audio = path
+            prefix = os.path.join(tmp, 'out')
+            subprocess.run([self.binary, '-m', self.path, '-f', audio, '-t', str(self.threads),
+                            '-np', '-oj', '-of', prefix], check=True, stdout=subprocess.DEVNULL)
+            with open(prefix + '.json') as f:
+                transcription = json.load(f).get('transcription', [])
+        return result_dict([{'start': s['offsets']['from'] / 1000.0, 'end': s['offsets']['to'] / 1000.0,
+                             'text': s['text']} for s in transcription])
+
+class Ct2Model:
+    """CTranslate2 (faster-whisper) with int8 weights"""
+
+    def __init__(self, model: str, device: str = 'cpu', threads: Optional[int] = None):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model, device='cuda' if device == 'cuda' else 'cpu',
+                                  compute_type=CT2_COMPUTE_TYPE, cpu_threads=threads or 0)
+
+    def transcribe(self, audio, **options) -> Dict[str, Any]:
+        segments, _ = self.model.transcribe(read_audio(audio), **options)
+        return result_dict([{'start': s.start, 'end': s.end, 'text': s.text} for s in segments])
+
+def load_engine_model(engine: str, model: str, device: str = 'cpu', threads: Optional[int] = None):
+    """Load a model with a quantized engine"""
+    if engine == 'ggml':
+        return GgmlModel(model, threads)
+    if engine == 'ct2':
+        return Ct2Model(model, device, threads)
+    raise ValueError(f"not a quantized engine: {engine}")
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="Select the local ASR engine for this runner")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name in ('select', 'qualify'):
+        p = sub.add_parser(name)
+        if name == 'qualify':
+            p.add_argument('model')
+        p.add_argument('--runner', default=os.environ.get('RELAYQ_RUNNER'))
+        p.add_argument('--device', default=os.environ.get('WHISPER_DEVICE', 'cpu'))
+        p.add_argument('--engine', default=os.environ.get('WHISPER_ENGINE', 'auto'),
+                       help="auto, or force one of: " + ', '.join(ENGINES))
+    sub.add_parser('list')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        print(json.dumps(available_engines()))
+        return
+    engine = args.engine if args.engine in ENGINES else select_engine(args.runner, args.device)
+    print(engine if args.command == 'select' else qualify(args.model, engine))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+RelayQ ASR Engine Benchmark
+
+Transcribes the same audio with each installed engine (ggml/whisper.cpp,
+ct2/faster-whisper int8, torch/openai-whisper) and reports load time,
+real-time factor and peak RSS. Each engine runs in a fresh process so
+RSS figures do not include the others.
+
+Run it on each runner (e.g. the Pi) with a real recording; without --audio
+it uses bench_chunked.py's synthetic speech, which is fine for timing but
+produces nonsense text.
+
+Usage:
+    bench_asr.py [--audio WAV] [--minutes N] [--model NAME] [--engine ENGINE ...] [--threads N]
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import traceback
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from asr_engines import ENGINES, available_engines, qualify
+from bench_chunked import synthetic_speech
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+def run_engine(model: str, device: str, audio: str, threads: int, duration: float) -> Dict[str, Any]:
+    """Load and transcribe in this (fresh) process"""
+    from whisperd import load_model
+
+    try:
+        baseline = peak_rss_mb()
+        started = time.monotonic()
+        instance = load_model(model, device, threads)
+        load_s = time.monotonic() - started
+        started = time.monotonic()
+        result = instance.transcribe(audio)
+        transcribe_s = time.monotonic() - started
+    except Exception as e:
+        return {'error': f"{type(e).__name__}: {e}", 'trace': traceback.format_exc(limit=3)}
+    return {
+        'load_s': load_s,
+        'transcribe_s': transcribe_s,
+        'rtf': transcribe_s / duration,
+        'peak_rss_mb': peak_rss_mb(),
+        'model_rss_mb': peak_rss_mb() - baseline,
+        'chars': len(result.get('text', '')),
+    }
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="Compare RTF and RSS of the local ASR engines")
+    parser.add_argument('--audio', help="16 kHz mono WAV (default: synthetic speech)")
+    parser.add_argument('--minutes', type=float, default=2.0, help="Length of the synthetic audio")
+    parser.add_argument('--model', default='base')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--engine', action='append', choices=ENGINES, help="Engines to run (default: all installed)")
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    available = available_engines()
+    engines = args.engine or [e for e in ENGINES if available[e]]
+    if not engines:
+        print("Error: no ASR engine installed (pip install pywhispercpp, faster-whisper or openai-whisper)",
+              file=sys.stderr)
+        sys.exit(1)
+
+    # spawn: every engine starts from a clean interpreter, so peak RSS is its own
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        audio = args.audio
+        if not audio:
+            audio = os.path.join(tmp, 'speech.wav')
+            synthetic_speech(audio, args.minutes)
+        import wave
+        with wave.open(audio, 'rb') as f:
+            duration = f.getnframes() / float(f.getframerate())
+        print(f"{duration / 60:.1f} min audio, model {args.model}, {args.threads} threads\n")
+
+        print(f"{'engine':<8} {'model':<14} {'load s':>7} {'wall s':>8} {'RTF':>7} {'peak RSS MB':>12} {'model MB':>9}")
+        for engine in engines:
+            model = qualify(args.model, engine)
+            with context.Pool(1) as pool:
+                stats = pool.apply(run_engine, (model, args.device, audio, args.threads, duration))
+            if 'error' in stats:
+                print(f"{engine:<8} {model:<14} skipped: {stats['error']}")
+                continue
+            print(f"{engine:<8} {model:<14} {stats['load_s']:>7.2f} {stats['transcribe_s']:>8.2f} "
+                  f"{stats['rtf']:>7.3f} {stats['peak_rss_mb']:>12.0f} {stats['model_rss_mb']:>9.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+RelayQ Atlas Query Benchmark
+
+Builds a synthetic Atlas database (podcasts + episodes with transcript
+text) and times the pending-episode scan, a claim and the stats query
+before and after AtlasDataProvider's schema migrations. Query plans are
+printed for both.
+
+Usage:
+    bench_atlas.py [--episodes N] [--podcasts N] [--pending-ratio R] [--repeat N] [--db PATH]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from atlas_data_provider import AtlasDataProvider
+
+# Atlas schema as the podcast processor creates it (no RelayQ additions)
+ATLAS_SCHEMA = """
+CREATE TABLE podcasts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    priority INTEGER DEFAULT 0
+);
+CREATE TABLE episodes (
+    id INTEGER PRIMARY KEY,
+    podcast_id INTEGER NOT NULL REFERENCES podcasts(id),
+    title TEXT,
+    episode_url TEXT,
+    published_date TEXT,
+    processing_status TEXT DEFAULT 'pending',
+    transcript_found BOOLEAN DEFAULT FALSE,
+    transcript_text TEXT,
+    transcript_source TEXT,
+    transcript_url TEXT,
+    processing_attempts INTEGER DEFAULT 0,
+    last_attempt TEXT,
+    error_message TEXT
+);
+"""
+
+# The queries AtlasDataProvider ran before the migrations
+LEGACY_PENDING = """
+SELECT e.*, p.name as podcast_name
+FROM episodes e
+JOIN podcasts p ON e.podcast_id = p.id
+WHERE e.processing_status = 'pending'
+AND e.transcript_found = FALSE
+ORDER BY p.priority DESC, e.published_date DESC LIMIT ?
+"""
+LEGACY_STATS = [
+    "SELECT COUNT(*) FROM podcasts",
+    "SELECT COUNT(*) FROM episodes",
+    "SELECT COUNT(*) FROM episodes WHERE processing_status = 'pending'",
+    "SELECT COUNT(*) FROM episodes WHERE processing_status = 'processing'",
+    "SELECT COUNT(*) FROM episodes WHERE transcript_found = 1",
+    "SELECT COUNT(*) FROM episodes WHERE processing_status = 'failed'",
+]
+
+def build_database(path: str, episodes: int, podcasts: int, pending_ratio: float):
+    """Synthetic Atlas DB; finished episodes carry ~2 KB of transcript text"""
+    rng = random.Random(42)
+    conn = sqlite3.connect(path)
+    conn.executescript(ATLAS_SCHEMA)
+    conn.executemany("INSERT INTO podcasts VALUES (?, ?, ?)",
+                     [(i, f"Podcast {i}", rng.randint(0, 10)) for i in range(podcasts)])
+    transcript = "word " * 400
+
+    def rows():
+        for i in range(episodes):
+            pending = rng.random() < pending_ratio
+            status = 'pending' if pending else rng.choice(['completed', 'completed', 'failed'])
+            published = f"20{rng.randint(15, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            yield (i, rng.randrange(podcasts), f"Episode {i}", f"https://example.com/{i}.mp3", published,
+                   status, status == 'completed', transcript if status == 'completed' else None)
+
+    conn.executemany("INSERT INTO episodes (id, podcast_id, title, episode_url, published_date,"
+                     " processing_status, transcript_found, transcript_text) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                     rows())
+    conn.commit()
+    conn.close()
+
+def timed(fn, repeat: int) -> float:
+    """Median milliseconds per call"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+def query_plan(conn: sqlite3.Connection, sql: str, params=()) -> str:
+    return '; '.join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="Benchmark Atlas pending-episode queries")
+    parser.add_argument('--episodes', type=int, default=100000)
+    parser.add_argument('--podcasts', type=int, default=500)
+    parser.add_argument('--pending-ratio', type=float, default=0.2, help="Fraction of episodes still pending")
+    parser.add_argument('--repeat', type=int, default=20, help="Timed runs per query (median reported)")
+    parser.add_argument('--db', help="Keep the synthetic database at this path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, 'atlas.db')
+        if os.path.exists(path):
+            os.remove(path)
+        start = time.perf_counter()
+        build_database(path, args.episodes, args.podcasts, args.pending_ratio)
+        print(f"Built {args.episodes} episodes / {args.podcasts} podcasts in {time.perf_counter() - start:.1f}s")
+
+        conn = sqlite3.connect(path)
+        before = {
+            'pending (limit 10)': timed(lambda: conn.execute(LEGACY_PENDING, (10,)).fetchall(), args.repeat),
+            'stats': timed(lambda: [conn.execute(sql).fetchone() for sql in LEGACY_STATS], args.repeat),
+        }
+        print(f"\nPlan before: {query_plan(conn, LEGACY_PENDING, (10,))}")
+        conn.close()
+
+        start = time.perf_counter()
+        provider = AtlasDataProvider(path)
+        print(f"Migrations applied in {time.perf_counter() - start:.2f}s")
+        after = {
+            'pending (limit 10)': timed(lambda: provider.get_pending_episodes(10), args.repeat),
+            'stats': timed(provider.get_podcast_stats, args.repeat),
+        }
+        with provider.connection() as conn:
+            print(f"Plan after:  {query_plan(conn, *provider.pending_query(10))}")
+
+        # Claims mutate the table, so they are timed on the migrated DB only
+        claim_ms = timed(lambda: provider.claim_episodes(10, 'bench', 60), args.repeat)
+        provider.close()
+
+    print(f"\n{'query':<22} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name in before:
+        print(f"{name:<22} {before[name]:>10.2f} {after[name]:>10.2f} {before[name] / after[name]:>7.1f}x")
+    print(f"{'claim (limit 10)':<22} {'-':>10} {claim_ms:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+RelayQ Chunked Transcription Benchmark
+
+Generates synthetic speech-like audio (noise bursts separated by pauses),
+then compares one serial transcribe() call with chunked_transcribe.py's
+VAD split + process pool, using the worker count policy.yaml gives each
+runner profile.
+
+Run it on each runner to get that machine's speedup. The default
+"stub-cpu" model burns a fixed amount of CPU per second of audio, so the
+benchmark runs without torch; pass --model base (or larger) to measure real
+inference.
+
+Usage:
+    bench_chunked.py [--minutes N] [--model NAME] [--runner LABEL ...]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from chunked_transcribe import resolve_workers, transcribe_chunked
+from whisperd import load_model
+
+def synthetic_speech(path: str, minutes: float, rate: int = 16000):
+    """Noise bursts of 2-8 s separated by 0.3-1.5 s of near-silence"""
+    import numpy as np
+
+    rng = np.random.default_rng(7)
+    total = int(minutes * 60 * rate)
+    parts, length = [], 0
+    while length < total:
+        burst = (rng.normal(0, 6000, int(rng.uniform(2, 8) * rate))).clip(-32768, 32767)
+        pause = rng.normal(0, 30, int(rng.uniform(0.3, 1.5) * rate))
+        parts += [burst, pause]
+        length += len(burst) + len(pause)
+    samples = np.concatenate(parts)[:total].astype(np.int16)
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.tobytes())
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="Benchmark chunked parallel transcription")
+    parser.add_argument('--minutes', type=float, default=20.0, help="Length of the synthetic audio")
+    parser.add_argument('--model', default='stub-cpu')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--runner', action='append', help="Runner profile(s) from policy.yaml (default: macmini, rpi4)")
+    args = parser.parse_args()
+    runners = args.runner or ['macmini', 'rpi4']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        audio = os.path.join(tmp, 'speech.wav')
+        synthetic_speech(audio, args.minutes)
+        print(f"{args.minutes:.0f} min synthetic audio, model {args.model}, {os.cpu_count()} CPUs on this machine\n")
+
+        model = load_model(args.model, args.device)
+        start = time.monotonic()
+        model.transcribe(audio)
+        serial_s = time.monotonic() - start
+
+        print(f"{'mode':<22} {'workers':>7} {'chunks':>6} {'wall s':>8} {'RTF':>7} {'speedup':>8}")
+        print(f"{'serial':<22} {1:>7} {1:>6} {serial_s:>8.2f} {serial_s / (args.minutes * 60):>7.4f} {1.0:>7.1f}x")
+        for runner in runners:
+            workers = resolve_workers(runner, args.model)
+            stats = transcribe_chunked(audio, args.model, args.device, workers)['stats']
+            print(f"{'chunked (' + runner + ')':<22} {stats['workers']:>7} {stats['chunks']:>6} "
+                  f"{stats['wall_s']:>8.2f} {stats['rtf']:>7.4f} {serial_s / stats['wall_s']:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+RelayQ Routing Benchmark
+
+Compares routing throughput of the fork-per-call path (one
+`select_target.py` process per job) with the resident routing daemon.
+
+Usage:
+    bench_router.py [--forks N] [--queries N]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from routerd import CompiledPolicy, RouterClient, make_server
+from select_target import DEFAULT_POLICY_PATH, load_policy, select_workflow
+
+BIN_DIR = os.path.dirname(os.path.abspath(__file__))
+JOB_PARAMS = {"url": "https://example.com/file.mp3", "size_mb": 50}
+
+def bench_fork(n: int) -> float:
+    """Queries/s when every decision forks select_target.py"""
+    script = os.path.join(BIN_DIR, 'select_target.py')
+    env = dict(os.environ)
+    env.pop('RELAYQ_ROUTER_SOCKET', None)
+    params = '{"url": "https://example.com/file.mp3", "size_mb": 50}'
+    start = time.perf_counter()
+    for _ in range(n):
+        subprocess.run([sys.executable, script, 'transcribe', params],
+                       env=env, stdout=subprocess.DEVNULL, check=True)
+    return n / (time.perf_counter() - start)
+
+def bench_parse_per_call(n: int) -> float:
+    """Queries/s when the policy is re-parsed for every decision (no fork)"""
+    start = time.perf_counter()
+    for _ in range(n):
+        select_workflow('transcribe', JOB_PARAMS, load_policy(DEFAULT_POLICY_PATH))
+    return n / (time.perf_counter() - start)
+
+def bench_in_process(n: int) -> float:
+    """Queries/s against the compiled policy in the same process"""
+    policy = CompiledPolicy(DEFAULT_POLICY_PATH)
+    start = time.perf_counter()
+    for _ in range(n):
+        policy.select('transcribe', JOB_PARAMS)
+    return n / (time.perf_counter() - start)
+
+def bench_daemon(n: int) -> float:
+    """Queries/s through a routerd Unix socket with one persistent client"""
+    with tempfile.TemporaryDirectory() as tmp:
+        address = os.path.join(tmp, 'router.sock')
+        server = make_server(address, CompiledPolicy(DEFAULT_POLICY_PATH))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            with RouterClient(address) as client:
+                start = time.perf_counter()
+                for _ in range(n):
+                    client.query('transcribe', JOB_PARAMS)
+                elapsed = time.perf_counter() - start
+        finally:
+            server.shutdown()
+            server.server_close()
+    return n / elapsed
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="Benchmark RelayQ routing paths")
+    parser.add_argument('--forks', type=int, default=50, help="Jobs routed via fork-per-call")
+    parser.add_argument('--queries', type=int, default=20000, help="Jobs routed via the daemon")
+    args = parser.parse_args()
+
+    results = [
+        ("fork per call (select_target.py)", bench_fork(args.forks)),
+        ("re-parse policy per call", bench_parse_per_call(min(args.queries, 2000))),
+        ("routerd over Unix socket", bench_daemon(args.queries)),
+        ("compiled policy in-process", bench_in_process(args.queries)),
+    ]
+
+    baseline = results[0][1]
+    print(f"{'path':<36} {'queries/s':>12} {'us/query':>10} {'speedup':>9}")
+    for name, qps in results:
+        print(f"{name:<36} {qps:>12,.0f} {1e6 / qps:>10.1f} {qps / baseline:>8.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+RelayQ Channel Monitor
+
+Finds a YouTube channel's recent uploads (content_discovery.yml's
+channel-monitor task). The channel listing is fetched flat and capped at
+--limit entries instead of enumerating the whole upload history, then
+per-video metadata comes from a bounded pool of workers: in-process through
+the yt_dlp module when it is installed (one YoutubeDL per worker, so HTTP
+connections are reused), else one `yt-dlp --dump-json` subprocess per video.
+
+Uploads are listed newest first, so results are consumed in listing order
+and the scan stops at the first uploads older than --max-age-days; videos
+past that point are never fetched.
+
+Usage:
+    channel_monitor.py <channel-url|@handle|channel-id> [--max-age-days N] [--keywords a,b]
+                       [--limit N] [--workers N] [--output FILE]
+"""
+
+import argparse
+import collections
+import importlib.util
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+YTDLP = os.environ.get('RELAYQ_YTDLP', 'yt-dlp')
+HAVE_YTDLP_MODULE = importlib.util.find_spec('yt_dlp') is not None
+
+DEFAULT_LIMIT = 50
+DEFAULT_WORKERS = int(os.environ.get('RELAYQ_DISCOVERY_WORKERS', '8'))
+METADATA_TIMEOUT_S = float(os.environ.get('RELAYQ_DISCOVERY_TIMEOUT', '30'))
+LISTING_TIMEOUT_S = 120
+# One out-of-order upload (a premiere, a re-dated video) shouldn't end the scan
+STOP_AFTER_OLD = 2
+DESCRIPTION_CHARS = 200
+
+CHANNEL_URL = re.compile(r'^(https?://(?:www\.|m\.)?youtube\.com/(?:@|channel/|c/|user/)[^/?#]+)/?$')
+
+class DiscoveryError(Exception):
+    """The channel's uploads cannot be listed"""
+
+def watch_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+def channel_videos_url(source: str) -> str:
+    """The channel's Videos tab for a channel URL, @handle or channel ID; other URLs unchanged"""
+    source = source.strip()
+    if source.startswith('@'):
+        return f"https://www.youtube.com/{source}/videos"
+    if re.match(r'^UC[\w-]{22}$', source):
+        return f"https://www.youtube.com/channel/{source}/videos"
+    match = CHANNEL_URL.match(source)
+    return f"{match.group(1)}/videos" if match else source
+
+def list_video_ids(url: str, limit: int = DEFAULT_LIMIT, in_process: bool = HAVE_YTDLP_MODULE) -> List[str]:
+    """IDs of the first `limit` entries, without fetching each video's page"""
+    if in_process:
+        import yt_dlp
+
+        params = {'quiet': True, 'no_warnings': True, 'extract_flat': 'in_playlist', 'playlistend': limit}
+        try:
+            with yt_dlp.YoutubeDL(params) as ydl:
+                info = ydl.extract_info(url, download=False)
+        except yt_dlp.utils.YoutubeDLError as e:
+            raise DiscoveryError(f"cannot list {url}: {e}")
+        return [e['id'] for e in (info or {}).get('entries') or [] if e and e.get('id')][:limit]
+
+    command = [YTDLP, '--flat-playlist', '--playlist-end', str(limit), '--print', '%(id)s', url]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=LISTING_TIMEOUT_S)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise DiscoveryError(f"cannot list {url}: {e}")
+    if result.returncode != 0:
+        raise DiscoveryError(f"cannot list {url}: {result.stderr.strip()}")
+    return [line.strip() for line in result.stdout.splitlines() if line.strip()][:limit]
+
+class MetadataFetcher:
+    """Video metadata by ID, or None on failure; safe to call from worker threads"""
+
+    def __init__(self, timeout: float = METADATA_TIMEOUT_S, in_process: bool = HAVE_YTDLP_MODULE):
+        self.timeout = timeout
+        self.in_process = in_process
+        self.local = threading.local()
+        self.instances = []
+        self.lock = threading.Lock()
+
+    def __call__(self, video_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.extract(video_id) if self.in_process else self.run(video_id)
+        except Exception as e:
+            print(f"Warning: skipping {video_id}: {e}", file=sys.stderr)
+            return None
+
+    def extract(self, video_id: str) -> Dict[str, Any]:
+        import yt_dlp
+
+        ydl = getattr(self.local, 'ydl', None)
+        if ydl is None:
+            ydl = self.local.ydl = yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True,
+                                                      'skip_download': True, 'socket_timeout': self.timeout})
+            with self.lock:
+                self.instances.append(ydl)
+        # process=False: the extractor's metadata only, no format selection
+        return ydl.extract_info(watch_url(video_id), download=False, process=False)
+
+    def run(self, video_id: str) -> Dict[str, Any]:
+        result = subprocess.run([YTDLP, '--dump-json', '--skip-download', '--no-playlist', watch_url(video_id)],
+                                capture_output=True, text=True, timeout=self.timeout)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f"yt-dlp exited {result.returncode}")
+        return json.loads(result.stdout)
+
+    def close(self):
+        with self.lock:
+            for ydl in self.instances:
+                ydl.close()
+            self.instances = []
+
+def matches_keywords(info: Dict[str, Any], keywords: List[str]) -> bool:
+    if not keywords:
+        return True
+    text = f"{info.get('title') or ''} {info.get('description') or ''}".lower()
+    return any(keyword in text for keyword in keywords)
+
+def video_entry(video_id: str, info: Dict[str, Any]) -> Dict[str, Any]:
+    """Discovery record (the shape content_discovery.yml writes to channel_videos.json)"""
+    duration = info.get('duration_string')
+    if not duration and info.get('duration'):
+        minutes, seconds = divmod(int(info['duration']), 60)
+        hours, minutes = divmod(minutes, 60)
+        duration = f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+    description = info.get('description') or ''
+    return {
+        'id': video_id,
+        'title': info.get('title', ''),
+        'url': watch_url(video_id),
+        'duration': duration or '0:00',
+        'upload_date': info.get('upload_date'),
+        'view_count': info.get('view_count', 0),
+        'description': description[:DESCRIPTION_CHARS] + '...' if description else '',
+    }
+
+def scan_uploads(video_ids: Iterable[str], fetch: Callable[[str], Optional[Dict[str, Any]]],
+                 max_age_days: float, keywords: Optional[List[str]] = None,
+                 workers: int = DEFAULT_WORKERS, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Recent, keyword-matching videos in listing order; stops at the first old uploads"""
+    cutoff = ((now or datetime.now()) - timedelta(days=max_age_days)).strftime('%Y%m%d')
+    keywords = [k.strip().lower() for k in keywords or [] if k.strip()]
+    workers = max(workers, 1)
+    ids = iter(video_ids)
+    pending = collections.deque()
+    videos, fetched, failed, old_streak, stopped = [], 0, 0, 0, False
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+
+    def fill():
+        # Keep every worker busy, but never run ahead of the stop point by more than that
+        while len(pending) < workers:
+            video_id = next(ids, None)
+            if video_id is None:
+                return
+            pending.append((video_id, pool.submit(fetch, video_id)))
+
+    try:
+        fill()
+        while pending:
+            video_id, future = pending.popleft()
+            info = future.result()
+            fetched += 1
+            if not info or not info.get('upload_date'):
+                failed += 1
+            elif info['upload_date'] <= cutoff:
+                old_streak += 1
+                if old_streak >= STOP_AFTER_OLD:
+                    stopped = True
+                    break
+            else:
+                old_streak = 0
+                if matches_keywords(info, keywords):
+                    videos.append(video_entry(video_id, info))
+            fill()
+    finally:
+        # Fetches past the stop point that haven't started are dropped
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    return {'videos': videos, 'fetched': fetched, 'failed': failed, 'stopped_early': stopped}
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="Find a channel's recent uploads")
+    parser.add_argument('source', help="Channel URL, @handle or channel ID (or any yt-dlp playlist URL)")
+    parser.add_argument('--max-age-days', type=float, default=7)
+    parser.add_argument('--keywords', default='', help="Comma-separated; match title or description")
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help="Newest uploads to consider")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Concurrent metadata fetches")
+    parser.add_argument('--timeout', type=float, default=METADATA_TIMEOUT_S, help="Per-video timeout in seconds")
+    parser.add_argument('--subprocess', action='store_true', help="Use the yt-dlp CLI even if the module is installed")
+    parser.add_argument('--output', help="Write the videos as JSON here (default: stdout)")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    in_process = HAVE_YTDLP_MODULE and not args.subprocess
+    url = channel_videos_url(args.source)
+    try:
+        video_ids = list_video_ids(url, args.limit, in_process)
+    except DiscoveryError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    listed_s = time.monotonic() - started
+
+    fetcher = MetadataFetcher(args.timeout, in_process)
+    try:
+        result = scan_uploads(video_ids, fetcher, args.max_age_days, args.keywords.split(','), args.workers)
+    finally:
+        fetcher.close()
+
+    videos = result.pop('videos')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(videos, f, indent=2)
+    else:
+        print(json.dumps(videos, indent=2))
+    print(json.dumps(dict(result, url=url, listed=len(video_ids), matched=len(videos),
+                          mode='in-process' if fetcher.in_process else 'subprocess',
+                          list_s=round(listed_s, 2), wall_s=round(time.monotonic() - started, 2))),
+          file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+RelayQ Chunked Transcription
+
+Splits a 16 kHz mono WAV (as produced by transcribe.sh's convert_audio) at
+silences found by a simple energy VAD, transcribes the chunks in a process
+pool sized to the runner's `cpu_cores` from policy.yaml, and stitches the
+results back together in order with segment timestamps shifted to the
+original timeline.
+
+Worker count is capped by the runner's `memory_gb`, since every worker
+holds its own copy of the model. The WAV is never loaded whole: energies
+are computed block by block, and each chunk's samples are read from the
+file only when its WAV is written.
+
+Usage:
+    chunked_transcribe.py <audio.wav> <output.txt> [--model NAME] [--device DEVICE]
+                          [--runner LABEL] [--workers N] [--segments-json PATH]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from asr_engines import split_model
+from select_target import DEFAULT_POLICY_PATH, load_policy
+from whisperd import DEFAULT_DEVICE, DEFAULT_MODEL, load_model, model_memory_mb
+
+DEFAULT_RUNNER = os.environ.get('RELAYQ_RUNNER')
+
+# VAD: frame length, how long a pause must be to split at, and how far above
+# the noise floor (10th percentile frame energy) still counts as silence
+FRAME_MS = 30
+MIN_SILENCE_S = 0.4
+SILENCE_MARGIN_DB = 8.0
+MAX_SILENCE_DB = -35.0
+
+# Chunk lengths in seconds: aim for TARGET, never cut below MIN unless the
+# audio ends, hard-cut at MAX when no pause is found
+TARGET_CHUNK_S = 90.0
+MIN_CHUNK_S = 15.0
+MAX_CHUNK_S = 180.0
+
+# Share of the runner's memory the model copies may use
+MEMORY_FRACTION = 0.8
+
+# VAD frames scanned per read, and samples copied per read into chunk files
+SCAN_FRAMES = 1000
+COPY_SAMPLES = 1 << 20
+
+def open_wav(path: str) -> wave.Wave_read:
+    """Reader for a 16-bit mono PCM WAV"""
+    f = wave.open(path, 'rb')
+    if f.getsampwidth() != 2 or f.getnchannels() != 1:
+        f.close()
+        raise ValueError(f"{path}: expected 16-bit mono PCM (run convert_audio first)")
+    return f
+
+def scan_wav(path: str):
+    """Sample rate, sample count and per-frame energies, reading SCAN_FRAMES VAD frames at a time"""
+    import numpy as np
+
+    with open_wav(path) as f:
+        rate, total = f.getframerate(), f.getnframes()
+        # A whole number of VAD frames per read, so blocks can be scored separately
+        block = rate * FRAME_MS // 1000 * SCAN_FRAMES
+        energies = [frame_energy_db(np.frombuffer(data, dtype=np.int16), rate)
+                    for data in iter(lambda: f.readframes(block), b'')]
+    return rate, total, np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+
+def frame_energy_db(samples, rate: int, frame_ms: int = FRAME_MS):
+    """RMS level of each frame in dBFS"""
+    import numpy as np
+
+    frame = rate * frame_ms // 1000
+    count = len(samples) // frame
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[:count * frame].reshape(count, frame).astype(np.float32) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20.0 * np.log10(rms + 1e-10)
+
+def silence_midpoints(energy_db, frame_s: float, min_silence_s: float = MIN_SILENCE_S) -> List[float]:
+    """Centres (seconds) of pauses at least min_silence_s long"""
+    import numpy as np
+
+    if len(energy_db) == 0:
+        return []
+    floor = float(np.percentile(energy_db, 10))
+    threshold = min(floor + SILENCE_MARGIN_DB, MAX_SILENCE_DB)
+    silent = np.concatenate(([0], (energy_db < threshold).astype(np.int8), [0]))
+    edges = np.diff(silent)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    min_frames = max(int(min_silence_s / frame_s), 1)
+    return [float(s + e) / 2.0 * frame_s for s, e in zip(starts, ends) if e - s >= min_frames]
+
+def plan_chunks(duration: float, pauses: List[float], target_s: float = TARGET_CHUNK_S,
+                min_s: float = MIN_CHUNK_S, max_s: float = MAX_CHUNK_S) -> List[Tuple[float, float]]:
+    """(start, end) seconds per chunk, cutting at the pause nearest each target length"""
+    chunks = []
+    start = 0.0
+    while duration - start > target_s + min_s:
+        # Never leave a tail shorter than min_s
+        latest = min(start + max_s, duration - min_s)
+        window = [p for p in pauses if start + min_s <= p <= latest]
+        cut = min(window, key=lambda p: abs(p - (start + target_s))) if window else latest
+        chunks.append((start, cut))
+        start = cut
+    chunks.append((start, duration))
+    return chunks
+
+def split_audio(path: str, workdir: str, workers: int) -> Tuple[List[Dict[str, Any]], float]:
+    """Write one WAV per chunk; returns chunk descriptors and total duration"""
+    rate, total, energy_db = scan_wav(path)
+    duration = total / float(rate)
+    pauses = silence_midpoints(energy_db, FRAME_MS / 1000.0)
+    # Short files: shrink the target so every worker gets a chunk
+    target = max(min(TARGET_CHUNK_S, duration / max(workers, 1)), MIN_CHUNK_S)
+    plan = plan_chunks(duration, pauses, target, MIN_CHUNK_S, max(MAX_CHUNK_S, target))
+
+    chunks = []
+    with open_wav(path) as source:
+        for index, (start, end) in enumerate(plan):
+            chunk_path = os.path.join(workdir, f"chunk-{index:05d}.wav")
+            first, last = int(start * rate), min(int(end * rate), total)
+            source.setpos(first)
+            with wave.open(chunk_path, 'wb') as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(rate)
+                for position in range(first, last, COPY_SAMPLES):
+                    f.writeframes(source.readframes(min(COPY_SAMPLES, last - position)))
+            chunks.append({'index': index, 'path': chunk_path, 'offset': start, 'duration': end - start})
+    return chunks, duration
+
+_worker_model = None
+
+def init_worker(model: str, device: str, threads: int):
+    """Load the model once per worker process"""
+    global _worker_model
+    if not model.startswith('stub') and split_model(model)[0] == 'torch':
+        try:
+            import torch
+            torch.set_num_threads(max(threads, 1))
+        except ImportError:
+            pass
+    _worker_model = load_model(model, device, max(threads, 1))
+
+def transcribe_chunk(chunk: Dict[str, Any]) -> Dict[str, Any]:
+    """Transcribe one chunk (a WAV path or int16 samples), shifting segment times by its offset"""
+    if 'samples' in chunk:
+        audio = chunk['samples'].astype('float32') / 32768.0
+    else:
+        audio = chunk['path']
+    result = _worker_model.transcribe(audio)
+    segments = [
+        dict(segment, start=segment['start'] + chunk['offset'], end=segment['end'] + chunk['offset'])
+        for segment in result.get('segments', [])
+    ]
+    return {'index': chunk['index'], 'text': result.get('text', '').strip(), 'segments': segments}
+
+def merge_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Concatenate chunk results in chunk order"""
+    ordered = sorted(results, key=lambda r: r['index'])
+    return {
+        'text': ' '.join(r['text'] for r in ordered if r['text']),
+        'segments': [segment for r in ordered for segment in r['segments']],
+    }
+
+def resolve_workers(runner: Optional[str], model: str, policy_path: str = DEFAULT_POLICY_PATH) -> int:
+    """cpu_cores for the runner from policy.yaml, capped by how many model copies fit in memory_gb"""
+    caps = {}
+    if runner:
+        caps = (load_policy(policy_path).get('runner_capabilities', {}) or {}).get(runner) or {}
+    workers = int(caps.get('cpu_cores') or os.cpu_count() or 1)
+    if caps.get('memory_gb'):
+        per_worker_mb = model_memory_mb(model)
+        workers = min(workers, int(caps['memory_gb'] * 1024 * MEMORY_FRACTION // per_worker_mb))
+    return max(workers, 1)
+
+def transcribe_chunked(audio: str, model: str = DEFAULT_MODEL, device: str = DEFAULT_DEVICE,
+                       workers: int = 1) -> Dict[str, Any]:
+    """Split, transcribe in parallel and merge; returns text, segments and timing stats"""
+    started = time.monotonic()
+    with tempfile.TemporaryDirectory(prefix='relayq-chunks-') as workdir:
+        chunks, duration = split_audio(audio, workdir, workers)
+        workers = min(workers, len(chunks))
+        # Split the cores between workers rather than oversubscribing them
+        threads = max((os.cpu_count() or 1) // workers, 1)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(model, device, threads)) as pool:
+            results = list(pool.map(transcribe_chunk, chunks))
+
+    merged = merge_results(results)
+    elapsed = time.monotonic() - started
+    merged['stats'] = {
+        'chunks': len(chunks),
+        'workers': workers,
+        'audio_s': round(duration, 1),
+        'wall_s': round(elapsed, 2),
+        'rtf': round(elapsed / duration, 4) if duration else None,
+    }
+    return merged
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="Chunked parallel transcription")
+    parser.add_argument('audio', help="16 kHz mono 16-bit WAV")
+    parser.add_argument('output', help="Transcript text file")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--device', default=DEFAULT_DEVICE)
+    parser.add_argument('--runner', default=DEFAULT_RUNNER, help="Runner label for cpu_cores/memory_gb (policy.yaml)")
+    parser.add_argument('--workers', type=int, help="Override the worker count")
+    parser.add_argument('--segments-json', help="Also write merged segments to this file")
+    args = parser.parse_args()
+
+    workers = args.workers or resolve_workers(args.runner, args.model)
+    try:
+        result = transcribe_chunked(args.audio, args.model, args.device, workers)
+    except (OSError, ValueError, wave.Error) as e:
+        print(f"Error: chunked transcription failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    with open(args.output, 'w') as f:
+        f.write(result['text'])
+    if args.segments_json:
+        with open(args.segments_json, 'w') as f:
+            json.dump(result['segments'], f)
+    print(json.dumps(result['stats']), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+RelayQ Chunked Upload
+
+Remote transcription for files of any length. The audio is re-encoded to
+16 kHz mono Opus (about 11 MB per hour at 24 kbit/s instead of the
+original MP3/WAV), split at pauses into chunks that stay under the API's
+upload limit, and the chunks go through asr_dispatch.py's Dispatcher
+concurrently. The text is joined in chunk order.
+
+Splitting reuses chunked_transcribe.py's energy VAD on a decoded PCM
+stream; without numpy the cuts fall at fixed lengths. ffmpeg writes the
+chunks in one pass and each is uploaded as soon as it is complete, so
+uploads overlap encoding.
+
+Usage:
+    chunked_upload.py <audio> <output> [--backend auto|openai|router] [--hedge]
+                      [--parallel N] [--chunk-s S] [--max-mb MB] [--timeout S]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from asr_dispatch import DEFAULT_STATS_PATH, DEFAULT_TIMEOUT, ASRError, Dispatcher, EndpointStats, configured_endpoints
+from chunked_transcribe import FRAME_MS, frame_energy_db, plan_chunks, silence_midpoints
+
+FFMPEG = os.environ.get('RELAYQ_FFMPEG', 'ffmpeg')
+
+# OpenAI rejects uploads over 25 MB; stay a little under it
+MAX_CHUNK_MB = float(os.environ.get('RELAYQ_UPLOAD_MAX_MB', '24'))
+# Shorter chunks mean more parallel uploads, but more cuts in the text
+TARGET_CHUNK_S = float(os.environ.get('RELAYQ_UPLOAD_CHUNK_S', '600'))
+MIN_CHUNK_S = 60.0
+DEFAULT_PARALLEL = int(os.environ.get('RELAYQ_UPLOAD_PARALLEL', '4'))
+
+BITRATE_KBPS = int(os.environ.get('RELAYQ_UPLOAD_KBPS', '24'))
+# Opus complexity 3 encodes ~2.5x faster than the default 10; speech ASR cannot tell
+OPUS_COMPLEXITY = 3
+# Opus VBR overshoots its bitrate on dense speech; plan chunk lengths with headroom
+BITRATE_HEADROOM = 1.25
+
+SAMPLE_RATE = 16000
+READ_BYTES = SAMPLE_RATE * 2 * FRAME_MS // 1000 * 1000
+
+class UploadError(Exception):
+    """The audio cannot be encoded or split into uploadable chunks"""
+
+def scan_pauses(path: str) -> Tuple[float, List[float]]:
+    """Duration and pause midpoints (seconds) from a decoded 16 kHz PCM stream"""
+    have_numpy = importlib.util.find_spec('numpy') is not None
+    if have_numpy:
+        import numpy as np
+
+    command = [FFMPEG, '-nostdin', '-hide_banner', '-loglevel', 'error', '-i', path,
+               '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 's16le', 'pipe:1']
+    total, energies = 0, []
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as decoder:
+        # READ_BYTES is a whole number of VAD frames, so blocks can be scored separately
+        for block in iter(lambda: decoder.stdout.read(READ_BYTES), b''):
+            total += len(block)
+            if have_numpy:
+                energies.append(frame_energy_db(np.frombuffer(block[:len(block) // 2 * 2], dtype=np.int16),
+                                                SAMPLE_RATE))
+        stderr = decoder.stderr.read().decode(errors='replace').strip()
+    if decoder.returncode != 0 or total == 0:
+        raise UploadError(f"cannot decode {path}: {stderr or 'no audio'}")
+
+    duration = total / 2.0 / SAMPLE_RATE
+    if not have_numpy:
+        return duration, []
+    return duration, silence_midpoints(np.concatenate(energies), FRAME_MS / 1000.0)
+
+def plan_upload(duration: float, pauses: List[float], target_s: float = TARGET_CHUNK_S,
+                max_mb: float = MAX_CHUNK_MB, kbps: int = BITRATE_KBPS) -> List[Tuple[float, float]]:
+    """Chunk boundaries: target_s long, cut at pauses, never longer than max_mb allows"""
+    max_s = max_mb * 1048576 * 8 / (kbps * 1000 * BITRATE_HEADROOM)
+    target_s = min(target_s, max_s * 0.9)
+    return plan_chunks(duration, pauses, target_s, min(MIN_CHUNK_S, target_s / 2), max_s)
+
+def encode_chunks(path: str, plan: List[Tuple[float, float]], workdir: str,
+                  kbps: int = BITRATE_KBPS) -> Iterator[str]:
+    """Encode to Opus once, yielding each chunk's path as soon as ffmpeg closes it"""
+    cuts = ','.join(f"{start:.3f}" for start, _ in plan[1:])
+    command = [FFMPEG, '-nostdin', '-hide_banner', '-loglevel', 'error', '-i', path,
+               '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE),
+               '-c:a', 'libopus', '-b:a', f"{kbps}k", '-application', 'voip',
+               '-compression_level', str(OPUS_COMPLEXITY),
+               '-f', 'segment', '-segment_format', 'ogg', '-reset_timestamps', '1',
+               # The segment list gets a line when each chunk is finished
+               '-segment_list', 'pipe:1', '-segment_list_type', 'flat']
+    # Without cut points the muxer would fall back to 2 s segments
+    command += ['-segment_times', cuts] if cuts else ['-segment_time', str(10 ** 7)]
+    command.append(os.path.join(workdir, 'chunk-%05d.ogg'))
+
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as encoder:
+        try:
+            for line in encoder.stdout:
+                name = line.decode().strip()
+                if name:
+                    yield os.path.join(workdir, os.path.basename(name))
+        except GeneratorExit:
+            encoder.kill()
+            raise
+        stderr = encoder.stderr.read().decode(errors='replace').strip()
+    if encoder.returncode != 0:
+        raise UploadError(f"Opus encoding failed: {stderr}")
+
+def upload_chunked(audio: str, dispatcher: Dispatcher, backend: Optional[str] = None, hedge: bool = False,
+                   parallel: int = DEFAULT_PARALLEL, target_s: float = TARGET_CHUNK_S,
+                   max_mb: float = MAX_CHUNK_MB) -> Dict[str, Any]:
+    """Encode, split and transcribe `audio`; returns the merged text and stats"""
+    started = time.monotonic()
+    duration, pauses = scan_pauses(audio)
+    plan = plan_upload(duration, pauses, target_s, max_mb)
+    scanned_s = time.monotonic() - started
+
+    with tempfile.TemporaryDirectory(prefix='relayq-upload-') as workdir, \
+            ThreadPoolExecutor(max_workers=max(parallel, 1)) as pool:
+        futures, encoded_bytes = [], 0
+        for chunk in encode_chunks(audio, plan, workdir):
+            size = os.path.getsize(chunk)
+            if size > max_mb * 1048576:
+                raise UploadError(f"{os.path.basename(chunk)} is {size / 1048576.0:.1f} MB, over {max_mb} MB")
+            encoded_bytes += size
+            futures.append(pool.submit(dispatcher.transcribe, chunk, backend, hedge))
+        if len(futures) != len(plan):
+            raise UploadError(f"expected {len(plan)} chunks, ffmpeg wrote {len(futures)}")
+        # All chunks must succeed: a gap would silently drop part of the episode
+        results = [future.result() for future in futures]
+
+    return {
+        'text': ' '.join(r['text'].strip() for r in results if r['text'].strip()) + '\n',
+        'chunks': len(results),
+        'duration_s': round(duration, 1),
+        'source_mb': round(os.path.getsize(audio) / 1048576.0, 2),
+        'upload_mb': round(encoded_bytes / 1048576.0, 2),
+        'scan_s': round(scanned_s, 2),
+        'wall_s': round(time.monotonic() - started, 2),
+        'endpoints': sorted({r['endpoint'] for r in results}),
+        'hedged': sum(r['hedged'] for r in results),
+        'errors': [e for r in results for e in r['errors']],
+    }
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="Opus-encode, split and transcribe remotely in parallel")
+    parser.add_argument('audio')
+    parser.add_argument('output')
+    parser.add_argument('--backend', default='auto', choices=['auto', 'openai', 'router'],
+                        help="Backend to try first (others remain fallbacks)")
+    parser.add_argument('--hedge', action='store_true', default=os.environ.get('RELAYQ_ASR_HEDGE') == '1',
+                        help="Hedge each chunk (see asr_dispatch.py)")
+    parser.add_argument('--parallel', type=int, default=DEFAULT_PARALLEL, help="Concurrent chunk uploads")
+    parser.add_argument('--chunk-s', type=float, default=TARGET_CHUNK_S, help="Target chunk length in seconds")
+    parser.add_argument('--max-mb', type=float, default=MAX_CHUNK_MB, help="Upload size limit per chunk")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help="Per-request timeout in seconds")
+    parser.add_argument('--stats-file', default=DEFAULT_STATS_PATH)
+    args = parser.parse_args()
+
+    dispatcher = Dispatcher(configured_endpoints(), EndpointStats(args.stats_file), args.timeout)
+    try:
+        result = upload_chunked(args.audio, dispatcher, None if args.backend == 'auto' else args.backend,
+                                args.hedge, args.parallel, args.chunk_s, args.max_mb)
+    except (ASRError, UploadError, OSError) as e:
+        print(f"Error: chunked remote transcription failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    with open(args.output, 'w') as f:
+        f.write(result.pop('text'))
+    print(json.dumps(result), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,22 @@
 
 set -euo pipefail
 
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
 # Default values
 WORKFLOW_FILE=".github/workflows/transcribe_audio.yml"
 REPO="Khamel83/relayq"
 DRY_RUN=false
 VERBOSE=false
 
+# Successful `gh auth status` checks are reused for this many seconds
+AUTH_CACHE_FILE="${XDG_RUNTIME_DIR:-/tmp}/relayq-gh-auth-$(id -u)"
+AUTH_CACHE_TTL=600
+
+# Workflows that accept the relayq_id correlation input (shown in the run name)
+CORRELATED_WORKFLOWS="transcribe_audio.yml transcribe_mac.yml transcribe_rpi.yml"
+RELAYQ_ID=""
+
 # Colors for output
 RED='\033[0;31m'
 GREEN='\033[0;32m'
@@ -42,6 +52,8 @@ OPTIONS:
     -d, --dry-run       Show command without executing
     -v, --verbose       Enable verbose output
     -r, --repo REPO     Repository name (default: Khamel83/relayq)
+    -b, --batch         Read JSONL jobs on stdin and submit them with bin/dispatcher.py
+                        (remaining options are passed through, see dispatcher.py --help)
 
 EXAMPLES:
     # Basic transcription job
@@ -56,6 +68,9 @@ EXAMPLES:
     # Dry run to preview command
     $0 --dry-run .github/workflows/transcribe_audio.yml url=https://example.com/test.mp3
 
+    # Route and submit a backlog in two processes
+    ./bin/select_target.py --batch --capacity < jobs.jsonl | $0 --batch > results.jsonl
+
 WORKFLOW FILES:
     .github/workflows/transcribe_audio.yml    # Pooled (Mac or RPi4)
     .github/workflows/transcribe_mac.yml      # Mac mini only
@@ -84,6 +99,10 @@ parse_args() {
                 REPO="$2"
                 shift 2
                 ;;
+            -b|--batch)
+                shift
+                exec python3 "$SCRIPT_DIR/dispatcher.py" --repo "$REPO" "$@"
+                ;;
             *.yml|*.yaml)
                 WORKFLOW_FILE="$1"
                 shift
@@ -102,6 +121,14 @@ parse_args() {
     done
 }
 
+# True if a successful auth check was recorded within AUTH_CACHE_TTL seconds
+auth_cached() {
+    [[ -f "$AUTH_CACHE_FILE" ]] || return 1
+    local mtime
+    mtime=$(stat -c %Y "$AUTH_CACHE_FILE" 2>/dev/null || stat -f %m "$AUTH_CACHE_FILE" 2>/dev/null) || return 1
+    (( $(date +%s) - mtime < AUTH_CACHE_TTL ))
+}
+
 # Validate inputs
 validate_inputs() {
     # Check if workflow file exists
@@ -117,11 +144,14 @@ validate_inputs() {
         exit 1
     fi
 
-    # Check if authenticated with GitHub
-    if ! gh auth status &> /dev/null; then
-        log_error "Not authenticated with GitHub"
-        log_error "Run: gh auth login"
-        exit 1
+    # Check if authenticated with GitHub (cached across invocations)
+    if ! auth_cached; then
+        if ! gh auth status &> /dev/null; then
+            log_error "Not authenticated with GitHub"
+            log_error "Run: gh auth login"
+            exit 1
+        fi
+        touch "$AUTH_CACHE_FILE" 2>/dev/null || true
     fi
 
     # Validate workflow file format
@@ -152,9 +182,30 @@ build_command() {
         fi
     done
 
+    # Stamp the run with a correlation token so it can be found later
+    if [[ -n "$RELAYQ_ID" ]]; then
+        cmd="$cmd -f relayq_id=\"$RELAYQ_ID\""
+    fi
+
     echo "$cmd"
 }
 
+# Find the run carrying our correlation token (runs appear a few seconds after dispatch)
+find_run_url() {
+    [[ -n "$RELAYQ_ID" ]] || return 0
+    local attempt url
+    for attempt in 1 2 3 4 5; do
+        url=$(gh run list --repo "$REPO" --workflow "$(basename "$WORKFLOW_FILE")" \
+            --event workflow_dispatch --limit 20 --json displayTitle,url \
+            -q ".[] | select(.displayTitle | contains(\"$RELAYQ_ID\")) | .url" 2>/dev/null | head -1)
+        if [[ -n "$url" ]]; then
+            echo "$url"
+            return 0
+        fi
+        sleep 2
+    done
+}
+
 # Execute workflow
 execute_workflow() {
     local cmd=$(build_command)
@@ -178,8 +229,11 @@ execute_workflow() {
     if output=$(eval "$cmd" 2>&1); then
         log_info "Workflow submitted successfully"
 
-        # Extract run URL from output if available
+        # Extract run URL from output if available, else look it up by correlation token
         local run_url=$(echo "$output" | grep -o 'https://github.com/.*/actions/runs/[0-9]*' | head -1)
+        if [[ -z "$run_url" ]]; then
+            run_url=$(find_run_url)
+        fi
         if [[ -n "$run_url" ]]; then
             log_info "Run URL: $run_url"
             echo "$run_url"
@@ -203,6 +257,10 @@ main() {
     parse_args "$@"
     validate_inputs
 
+    if [[ " $CORRELATED_WORKFLOWS " == *" $(basename "$WORKFLOW_FILE") "* ]]; then
+        RELAYQ_ID="rq-$(od -An -N8 -tx1 /dev/urandom | tr -d ' \n')"
+    fi
+
     # Change to repository root directory
     cd "$(git rev-parse --show-toplevel 2>/dev/null || pwd)"
 
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+RelayQ Batch Dispatcher
+
+Submits many workflow_dispatch events from one process instead of forking
+`gh workflow run` per job. Each worker thread keeps one keep-alive
+connection to the GitHub API, the auth check runs once per session, and a
+token bucket paces submissions under GitHub's secondary rate limits for
+content-creating requests.
+
+Input (stdin, JSONL), one job per line:
+    {"id": "ep-1", "workflow": ".github/workflows/transcribe_mac.yml",
+     "inputs": {"url": "https://example.com/a.mp3", "backend": "local"}}
+
+Output (stdout, JSONL), one result per job as it completes:
+    {"id": "ep-1", "workflow": "...", "status": "dispatched", "http_status": 204, ...}
+
+Jobs sent to the transcribe workflows are stamped with a unique
+`relayq_id` input, which those workflows put in their run name; with
+--resolve, run IDs are looked up for the whole batch afterwards (see
+run_resolver.py). A dispatch whose response is lost is only re-sent once
+the listing shows no run carrying its relayq_id, so a dropped connection
+does not start a workflow twice; jobs without one are reported failed.
+
+Results are also written to the job ledger (job_ledger.py) in batches, so
+routing and the dashboard can see what is in flight without asking
+GitHub; pass --no-ledger to skip that.
+
+With --drain, jobs come from the ledger's intake queue instead of stdin
+(state 'queued', e.g. from the dashboard's /api/submit/batch); the
+dashboard runs the same QueueDrain in a background thread.
+
+Usage:
+    dispatcher.py [--repo REPO] [--ref REF] [--concurrency N] [--rate PER_MIN] [--api-url URL] < jobs.jsonl
+    dispatcher.py --drain [--rate PER_MIN] [--ledger PATH]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, Optional, TextIO
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from github_api import DEFAULT_REPO, GitHubAPI, UnconfirmedRequest, get_token
+from job_ledger import DEFAULT_LEDGER_PATH, JobLedger, ledger_key
+from run_resolver import RunResolver, new_token, resolve_results
+from select_target import POOLED_WORKFLOW, RUNNER_WORKFLOWS
+
+DEFAULT_REF = os.environ.get('RELAYQ_REF', 'main')
+DEFAULT_CONCURRENCY = 4
+# GitHub allows at most 80 content-creating requests per minute
+DEFAULT_RATE_PER_MIN = 60
+DEFAULT_BURST = 10
+MAX_ATTEMPTS = 4
+# Results buffered per ledger transaction
+LEDGER_BATCH = 500
+# Queued jobs claimed from the ledger per drain round, and how long an idle
+# drain sleeps when nothing wakes it
+DRAIN_BATCH = 50
+DRAIN_IDLE_S = 5.0
+AUTH_RETRY_S = 60.0
+# How long to look for the run of a dispatch whose response was lost before
+# deciding it never started
+CONFIRM_TIMEOUT_S = 30.0
+CONFIRM_INTERVAL_S = 5.0
+
+# Workflows that declare the relayq_id input (GitHub rejects undeclared inputs)
+CORRELATED_WORKFLOWS = {os.path.basename(w) for w in [POOLED_WORKFLOW] + list(RUNNER_WORKFLOWS.values())}
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `burst` banked"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        """Drain the bucket so every worker backs off (e.g. after a secondary rate limit)"""
+        with self.lock:
+            self.tokens = -seconds * self.rate
+
+class AuthError(Exception):
+    """Raised when the token cannot see the target repository"""
+
+class Dispatcher:
+    """Submits workflow_dispatch events over pooled keep-alive connections"""
+
+    def __init__(self, repo: str = DEFAULT_REPO, ref: str = DEFAULT_REF,
+                 concurrency: int = DEFAULT_CONCURRENCY, rate_per_min: float = DEFAULT_RATE_PER_MIN,
+                 api_url: Optional[str] = None, token: Optional[str] = None):
+        self.repo = repo
+        self.ref = ref
+        self.concurrency = max(1, concurrency)
+        self.api_url = api_url
+        self.token = get_token() if token is None else token
+        self.bucket = TokenBucket(rate_per_min / 60.0, DEFAULT_BURST)
+        self.local = threading.local()
+        self.clients = []
+        self.clients_lock = threading.Lock()
+        self.pool = None
+        self.authenticated = False
+
+    def client(self) -> GitHubAPI:
+        """This thread's API client (one persistent connection per worker)"""
+        api = getattr(self.local, 'api', None)
+        if api is None:
+            api = GitHubAPI(token=self.token, base_url=self.api_url)
+            self.local.api = api
+            with self.clients_lock:
+                self.clients.append(api)
+        return api
+
+    def check_auth(self):
+        """Verify access to the repository once per session"""
+        if self.authenticated:
+            return
+        response = self.client().get(f"/repos/{self.repo}")
+        if not response.ok:
+            raise AuthError(f"cannot access {self.repo} (HTTP {response.status}); run: gh auth login")
+        self.authenticated = True
+
+    def executor(self) -> ThreadPoolExecutor:
+        """Worker pool shared by every run(), so each worker's client is reused across batches"""
+        with self.clients_lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='dispatch')
+            return self.pool
+
+    def close(self):
+        with self.clients_lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+        with self.clients_lock:
+            for api in self.clients:
+                api.close()
+
+    @property
+    def requests(self) -> int:
+        with self.clients_lock:
+            return sum(api.requests for api in self.clients)
+
+    @property
+    def rate_limit(self) -> Dict[str, Any]:
+        """Most recently observed GitHub rate limit across the clients"""
+        with self.clients_lock:
+            observed = [api.rate_limit for api in self.clients if api.rate_limit]
+        return max(observed, key=lambda limit: limit.get('observed_at', 0), default={})
+
+    def build_payload(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """workflow_dispatch body; scalar inputs are sent as strings"""
+        inputs = {}
+        for key, value in (job.get('inputs') or {}).items():
+            inputs[key] = value if isinstance(value, (bool, str)) else json.dumps(value)
+        if job.get('relayq_id'):
+            inputs['relayq_id'] = job['relayq_id']
+        return {'ref': job.get('ref') or self.ref, 'inputs': inputs}
+
+    def dispatch(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Submit one job with retries on rate limiting and server errors"""
+        workflow = job.get('workflow') or POOLED_WORKFLOW
+        if os.path.basename(workflow) in CORRELATED_WORKFLOWS and not job.get('relayq_id'):
+            job = dict(job, relayq_id=new_token())
+        result = {'id': job.get('id'), 'workflow': workflow}
+        for key in ('job_type', 'runner'):
+            if job.get(key):
+                result[key] = job[key]
+        if job.get('relayq_id'):
+            result['relayq_id'] = job['relayq_id']
+        # Batches number their jobs from 0, so the caller's id cannot key the ledger
+        result['job_key'] = ledger_key(job)
+        path = f"/repos/{self.repo}/actions/workflows/{os.path.basename(workflow)}/dispatches"
+        payload = self.build_payload(job)
+
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            self.bucket.acquire()
+            result['attempts'] = attempt
+            sent_at = datetime.now(timezone.utc).isoformat()
+            try:
+                response = self.client().post(path, payload)
+            except UnconfirmedRequest as e:
+                # GitHub may have started the run; re-sending could start it twice
+                result.update(status='failed', error=str(e))
+                run = self.find_run(job.get('relayq_id'), sent_at)
+                if run:
+                    result.update(run, status='dispatched', dispatched_at=sent_at)
+                    result.pop('error', None)
+                    return result
+                if run is None:
+                    return result
+                continue
+            except (OSError, http.client.HTTPException) as e:
+                self.client().close()
+                result.update(status='failed', error=str(e))
+                time.sleep(min(2 ** attempt, 30))
+                continue
+
+            result['http_status'] = response.status
+            if response.ok:
+                result.update(status='dispatched', dispatched_at=datetime.now(timezone.utc).isoformat())
+                result.pop('error', None)
+                return result
+
+            retry_after = retry_delay(response, attempt)
+            body = response.data[:300].decode(errors='replace')
+            result.update(status='failed', error=body)
+            if retry_after is None:
+                return result
+            self.bucket.pause(retry_after)
+
+        return result
+
+    def find_run(self, token: Optional[str], sent_at: str) -> Optional[Dict[str, Any]]:
+        """Run started by an unconfirmed dispatch: its details, {} if none showed up, None if unknown"""
+        if not token:
+            return None
+        resolver = RunResolver(self.repo, self.client())
+        resolver.add(token, sent_at)
+        try:
+            return resolver.resolve(CONFIRM_TIMEOUT_S, CONFIRM_INTERVAL_S).get(token, {})
+        except (OSError, http.client.HTTPException, RuntimeError, ValueError) as e:
+            print(f"Warning: cannot check for a run of {token}: {e}", file=sys.stderr)
+            return None
+
+    def run(self, jobs: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Dispatch jobs with bounded concurrency, yielding results as they complete"""
+        self.check_auth()
+        window = self.concurrency * 2
+        pool = self.executor()
+        pending = set()
+        try:
+            for job in jobs:
+                if 'parse_error' in job:
+                    yield {'id': job.get('id'), 'status': 'failed', 'error': job['parse_error']}
+                    continue
+                if job.get('error') and not job.get('workflow'):
+                    # Routing decision from select_target.py --batch that found no workflow
+                    yield {'id': job.get('id'), 'job_key': ledger_key(job), 'status': 'failed', 'error': job['error']}
+                    continue
+                pending.add(pool.submit(self.dispatch, job))
+                if len(pending) >= window:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while pending:
+                future = pending.pop()
+                yield future.result()
+        finally:
+            # Stopped early: drop jobs not yet started, let in-flight dispatches finish
+            for future in pending:
+                future.cancel()
+            wait(pending)
+
+def ledger_job(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Dispatcher job from a queued ledger row"""
+    return {'id': row['job_id'] or row['job_key'], 'job_key': row['job_key'], 'job_type': row['job_type'],
+            'workflow': row['workflow'] or POOLED_WORKFLOW,
+            'inputs': json.loads(row['inputs']) if row['inputs'] else {}}
+
+class QueueDrain:
+    """Dispatches jobs queued in the ledger, oldest first, paced by the dispatcher's token bucket"""
+
+    def __init__(self, ledger: JobLedger, dispatcher: Dispatcher, batch: int = DRAIN_BATCH):
+        self.ledger = ledger
+        self.dispatcher = dispatcher
+        self.batch = batch
+        self.wake = threading.Event()
+        self.stop = threading.Event()
+        self.stats = {'dispatched': 0, 'failed': 0}
+
+    def drain_once(self) -> int:
+        """Claim and dispatch one batch; returns how many jobs were claimed"""
+        rows = self.ledger.claim_queued(self.batch)
+        if not rows:
+            return 0
+        unsent = {row['job_key'] for row in rows}
+        try:
+            for result in self.dispatcher.run(ledger_job(row) for row in rows):
+                # One small transaction per result keeps /api/jobs/<id> current
+                self.ledger.record_dispatches([result])
+                unsent.discard(result.get('job_key'))
+                self.stats['dispatched' if result.get('status') == 'dispatched' else 'failed'] += 1
+        finally:
+            if unsent:
+                self.ledger.release(unsent, "drain interrupted")
+        return len(rows)
+
+    def run(self, until_empty: bool = False):
+        """Drain until stopped (or, with until_empty, until the queue is empty)"""
+        while not self.stop.is_set():
+            try:
+                claimed = self.drain_once()
+            except AuthError as e:
+                if until_empty:
+                    raise
+                print(f"Warning: queue drain paused: {e}", file=sys.stderr)
+                self.stop.wait(AUTH_RETRY_S)
+                continue
+            if claimed < self.batch:
+                if until_empty:
+                    return
+                self.wake.wait(DRAIN_IDLE_S)
+                self.wake.clear()
+
+def retry_delay(response, attempt: int) -> Optional[float]:
+    """Seconds to back off before retrying, or None if the error is permanent"""
+    headers = response.headers
+    if response.status in (403, 429):
+        if 'retry-after' in headers:
+            return float(headers['retry-after'])
+        if headers.get('x-ratelimit-remaining') == '0' and 'x-ratelimit-reset' in headers:
+            return max(float(headers['x-ratelimit-reset']) - time.time(), 1.0)
+        if b'secondary rate limit' in response.data.lower():
+            return 60.0
+        return None
+    if response.status >= 500:
+        return float(min(2 ** attempt, 30))
+    return None
+
+def read_jobs(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    """Parse JSONL jobs; malformed lines become failed results"""
+    for index, line in enumerate(stream):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("job must be a JSON object")
+        except ValueError as e:
+            job = {'id': index, 'parse_error': f"Error parsing job: {e}"}
+        job.setdefault('id', index)
+        yield job
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="Dispatch RelayQ jobs in bulk")
+    parser.add_argument('--repo', default=DEFAULT_REPO, help="Repository (owner/name)")
+    parser.add_argument('--ref', default=DEFAULT_REF, help="Git ref to run workflows on")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Parallel connections")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE_PER_MIN, help="Max dispatches per minute")
+    parser.add_argument('--api-url', help="GitHub API base URL (e.g. a local fake server)")
+    parser.add_argument('--dry-run', action='store_true', help="Print payloads without submitting")
+    parser.add_argument('--resolve', action='store_true', help="Look up run IDs for the batch after dispatch")
+    parser.add_argument('--resolve-timeout', type=float, default=60.0, help="Seconds to wait for runs to appear")
+    parser.add_argument('--ledger', default=DEFAULT_LEDGER_PATH, help="Job ledger database path")
+    parser.add_argument('--no-ledger', action='store_true', help="Do not record results in the job ledger")
+    parser.add_argument('--drain', action='store_true', help="Dispatch the ledger's queued jobs instead of stdin")
+    args = parser.parse_args()
+
+    dispatcher = Dispatcher(args.repo, args.ref, args.concurrency, args.rate, args.api_url)
+
+    if args.drain:
+        drain = QueueDrain(JobLedger(args.ledger), dispatcher)
+        started = time.monotonic()
+        try:
+            drain.run(until_empty=True)
+        except AuthError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            dispatcher.close()
+        print(f"Drain finished: {drain.stats['dispatched']} dispatched, {drain.stats['failed']} failed"
+              f" in {time.monotonic() - started:.1f}s", file=sys.stderr)
+        sys.exit(1 if drain.stats['failed'] else 0)
+
+    if args.dry_run:
+        for job in read_jobs(sys.stdin):
+            if 'parse_error' in job or (job.get('error') and not job.get('workflow')):
+                print(json.dumps({'id': job.get('id'), 'status': 'failed',
+                                  'error': job.get('parse_error') or job['error']}))
+                continue
+            print(json.dumps({'id': job.get('id'), 'workflow': job.get('workflow') or POOLED_WORKFLOW,
+                              'payload': dispatcher.build_payload(job)}))
+        sys.exit(0)
+
+    ledger = None if args.no_ledger else JobLedger(args.ledger)
+    pending_records = []
+    failed = 0
+    started = time.monotonic()
+    results = []
+    try:
+        for result in dispatcher.run(read_jobs(sys.stdin)):
+            if result.get('status') != 'dispatched':
+                failed += 1
+            if args.resolve:
+                results.append(result)
+                continue
+            sys.stdout.write(json.dumps(result) + '\n')
+            sys.stdout.flush()
+            if ledger:
+                pending_records.append(result)
+                if len(pending_records) >= LEDGER_BATCH:
+                    ledger.record_dispatches(pending_records)
+                    pending_records = []
+        if args.resolve:
+            resolver = RunResolver(args.repo, dispatcher.client())
+            pending_records = resolve_results(results, resolver, args.resolve_timeout, interval=2.0)
+            for result in pending_records:
+                sys.stdout.write(json.dumps(result) + '\n')
+    except AuthError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        dispatcher.close()
+        if ledger and pending_records:
+            ledger.record_dispatches(pending_records)
+
+    elapsed = time.monotonic() - started
+    print(f"Dispatch finished: {failed} failed, {dispatcher.requests} API requests in {elapsed:.1f}s",
+          file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
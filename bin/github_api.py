@@ -0,0 +1,152 @@
+"""
+RelayQ GitHub API Client
+
+Minimal keep-alive client for the GitHub REST API, shared by the runner
+state cache and the dispatcher. One instance owns one persistent
+connection, so it is not thread-safe: give each worker thread its own.
+
+Set GITHUB_API_URL to point at a stub or recorded server in tests.
+"""
+
+import http.client
+import json
+import os
+import subprocess
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+DEFAULT_API_URL = "https://api.github.com"
+DEFAULT_REPO = "Khamel83/relayq"
+# Methods that are safe to re-send when a response is lost
+IDEMPOTENT_METHODS = {'GET', 'HEAD'}
+# Errors from a kept-alive socket the server already closed
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                           http.client.CannotSendRequest, http.client.ResponseNotReady)
+
+_token_cache = None
+
+def get_token() -> str:
+    """GitHub token from GITHUB_TOKEN/GH_TOKEN, else `gh auth token` (looked up once per process)"""
+    global _token_cache
+    if _token_cache is not None:
+        return _token_cache
+
+    token = os.environ.get('GITHUB_TOKEN') or os.environ.get('GH_TOKEN') or ''
+    if not token:
+        try:
+            result = subprocess.run(['gh', 'auth', 'token'], capture_output=True, text=True, timeout=10)
+            if result.returncode == 0:
+                token = result.stdout.strip()
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+    _token_cache = token
+    return token
+
+class UnconfirmedRequest(ConnectionError):
+    """A non-idempotent request was sent but no response came back; GitHub may have applied it"""
+
+class Response:
+    """Status, lower-cased headers and raw body of one API response"""
+
+    def __init__(self, status: int, headers: Dict[str, str], data: bytes):
+        self.status = status
+        self.headers = headers
+        self.data = data
+
+    def json(self) -> Any:
+        return json.loads(self.data) if self.data else None
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+class GitHubAPI:
+    """GitHub REST client over a single keep-alive connection"""
+
+    def __init__(self, token: Optional[str] = None, base_url: Optional[str] = None, timeout: float = 30.0):
+        self.base_url = (base_url or os.environ.get('GITHUB_API_URL') or DEFAULT_API_URL).rstrip('/')
+        parts = urlsplit(self.base_url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.token = get_token() if token is None else token
+        self.timeout = timeout
+        self.conn = None
+        self.requests = 0
+        self.rate_limit = {}
+
+    def connect(self) -> http.client.HTTPConnection:
+        if self.conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self.conn = cls(self.host, self.port, timeout=self.timeout)
+        return self.conn
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def request(self, method: str, path: str, body: Any = None,
+                headers: Optional[Dict[str, str]] = None) -> Response:
+        """Send one request, reconnecting once if the kept-alive socket went stale.
+
+        Only requests that never reached the server, or idempotent ones, are
+        re-sent; losing the response to anything else raises
+        UnconfirmedRequest so the caller can check before trying again.
+        """
+        send_headers = {
+            'Accept': 'application/vnd.github+json',
+            'User-Agent': 'relayq',
+            'X-GitHub-Api-Version': '2022-11-28',
+        }
+        if self.token:
+            send_headers['Authorization'] = f"Bearer {self.token}"
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            send_headers['Content-Type'] = 'application/json'
+        send_headers.update(headers or {})
+
+        for attempt in (1, 2):
+            conn = self.connect()
+            sent = False
+            try:
+                conn.request(method, self.prefix + path, body=payload, headers=send_headers)
+                sent = True
+                raw = conn.getresponse()
+                data = raw.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                self.close()
+                if sent and method not in IDEMPOTENT_METHODS:
+                    raise UnconfirmedRequest(f"no response to {method} {path}: {e!r}") from e
+                if attempt == 2 or not isinstance(e, STALE_CONNECTION_ERRORS):
+                    raise
+
+        self.requests += 1
+        response = Response(raw.status, {k.lower(): v for k, v in raw.getheaders()}, data)
+        self.record_rate_limit(response.headers)
+        if response.headers.get('connection', '').lower() == 'close':
+            self.close()
+        return response
+
+    def record_rate_limit(self, headers: Dict[str, str]):
+        """Remember the latest x-ratelimit-* headers"""
+        if 'x-ratelimit-remaining' in headers:
+            self.rate_limit = {
+                'limit': int(headers.get('x-ratelimit-limit', 0)),
+                'remaining': int(headers['x-ratelimit-remaining']),
+                'reset': int(headers.get('x-ratelimit-reset', 0)),
+                'observed_at': time.time(),
+            }
+
+    def get(self, path: str, etag: Optional[str] = None) -> Response:
+        """GET, optionally conditional on an ETag (304 responses are free of rate limit)"""
+        headers = {'If-None-Match': etag} if etag else None
+        return self.request('GET', path, headers=headers)
+
+    def post(self, path: str, body: Any = None) -> Response:
+        return self.request('POST', path, body=body)
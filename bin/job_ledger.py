@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+RelayQ Job Ledger
+
+Durable local record of every job: its routing decision, dispatch, GitHub
+run and state transitions with timings. Backed by SQLite in WAL mode so
+the dispatcher can write while routerd and the dashboard read; writes are
+batched into single transactions.
+
+States: queued -> routed -> dispatched -> running -> completed | failed
+Jobs submitted through the dashboard's intake queue go queued ->
+dispatching -> dispatched; a drain claims them in batches. Active jobs
+that stop getting updates end as expired (see expire_stale).
+
+routerd and the dashboard keep active jobs current with LedgerSync: one
+runs listing per interval, then stale jobs are expired.
+
+Each job is keyed by its job_key: the one select_target.py --batch stamps
+on its decision and dispatcher.py carries into its result, else the
+relayq_id correlation token, else a generated ID. Callers number every
+batch from 0, so the caller's own id is only kept alongside as job_id. A
+routing decision and the dispatch and run it led to are one row.
+
+Usage:
+    job_ledger.py record-decisions < decisions.jsonl  # select_target.py --batch output
+    job_ledger.py record-dispatches < results.jsonl   # dispatcher.py output
+    job_ledger.py sync [--api-url URL]                # refresh run states from GitHub, expire stale jobs
+    job_ledger.py stats
+    job_ledger.py recent [limit]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from github_api import DEFAULT_REPO, GitHubAPI
+from run_resolver import CLOCK_SKEW, MAX_PAGES, PER_PAGE, TOKEN_PATTERN
+
+DEFAULT_LEDGER_PATH = os.path.expanduser(
+    os.environ.get('RELAYQ_LEDGER') or '~/.local/share/relayq/jobs.db')
+
+ACTIVE_STATES = ('dispatched', 'running')
+TERMINAL_STATES = ('completed', 'failed', 'expired')
+
+# Dispatched jobs never matched to a run (a lost dispatch, or a workflow
+# without the relayq_id input) and active jobs older than the longest
+# workflow timeout stop counting as in flight
+UNMATCHED_EXPIRY_S = float(os.environ.get('RELAYQ_UNMATCHED_EXPIRY', 1800))
+ACTIVE_EXPIRY_S = float(os.environ.get('RELAYQ_ACTIVE_EXPIRY', 12 * 3600))
+STALE_WHERE = ("((state = 'dispatched' AND run_id IS NULL AND COALESCE(dispatched_at, created_at) < ?)"
+               " OR COALESCE(started_at, dispatched_at, created_at) < ?)")
+SYNC_INTERVAL_S = float(os.environ.get('RELAYQ_LEDGER_SYNC', 60))
+
+# A 'dispatching' claim older than this belongs to a drain that died; requeue it
+CLAIM_LEASE_S = 600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    job_key TEXT NOT NULL UNIQUE,
+    job_id TEXT,
+    job_type TEXT,
+    params TEXT,
+    inputs TEXT,
+    workflow TEXT,
+    runner TEXT,
+    decision TEXT,
+    relayq_id TEXT,
+    run_id INTEGER,
+    run_url TEXT,
+    state TEXT NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    routed_at REAL,
+    dispatched_at REAL,
+    started_at REAL,
+    finished_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state);
+CREATE INDEX IF NOT EXISTS idx_jobs_state_created ON jobs(state, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_job_type ON jobs(job_type);
+CREATE INDEX IF NOT EXISTS idx_jobs_relayq_id ON jobs(relayq_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_run_id ON jobs(run_id);
+
+CREATE TABLE IF NOT EXISTS job_events (
+    id INTEGER PRIMARY KEY,
+    job_key TEXT NOT NULL,
+    state TEXT NOT NULL,
+    at REAL NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_job_events_job_key ON job_events(job_key);
+"""
+
+# Columns added after the first release, for ledgers created before them
+MIGRATIONS = {
+    'job_id': ["ALTER TABLE jobs ADD COLUMN job_id TEXT",
+               "CREATE INDEX IF NOT EXISTS idx_jobs_job_id ON jobs(job_id)"],
+}
+
+def to_epoch(value: Any) -> Optional[float]:
+    """Accept epoch seconds or ISO-8601 strings (GitHub and dispatcher timestamps)"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+
+def dumps(value: Any) -> Optional[str]:
+    return None if value is None else json.dumps(value)
+
+def stale_cutoffs(now: float) -> tuple:
+    """Parameters for STALE_WHERE"""
+    return (now - UNMATCHED_EXPIRY_S, now - ACTIVE_EXPIRY_S)
+
+def ledger_key(record: Dict[str, Any]) -> str:
+    """Unique key for a job: its job_key or relayq_id, else a new ID"""
+    return str(record.get('job_key') or record.get('relayq_id') or uuid.uuid4().hex)
+
+def caller_id(record: Dict[str, Any]) -> Optional[str]:
+    return None if record.get('id') is None else str(record['id'])
+
+class JobLedger:
+    """SQLite (WAL) job ledger; one connection per thread"""
+
+    def __init__(self, path: str = DEFAULT_LEDGER_PATH):
+        self.path = path
+        self.local = threading.local()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn().executescript(SCHEMA)
+        self.migrate()
+
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self.local.conn = conn
+        return conn
+
+    def migrate(self):
+        conn = self.conn()
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, statements in MIGRATIONS.items():
+            for sql in statements if column not in columns else statements[1:]:
+                conn.execute(sql)
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def write(self, statements: List[tuple]):
+        """Run (sql, rows) pairs with executemany inside one transaction"""
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, rows in statements:
+                if rows:
+                    conn.executemany(sql, rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def record_jobs(self, jobs: Iterable[Dict[str, Any]], state: str = 'queued') -> int:
+        """Insert new jobs (ignored if job_key already exists); returns rows written"""
+        now = time.time()
+        rows, events = [], []
+        for job in jobs:
+            # Intake jobs are keyed by their submission id, so resubmitting is idempotent
+            key = str(job.get('job_key') or job['id'])
+            rows.append((key, caller_id(job), job.get('job_type'), dumps(job.get('params')),
+                         dumps(job.get('inputs')), job.get('workflow'), state, now, now))
+            events.append((key, state, now, None))
+        self.write([
+            ("INSERT OR IGNORE INTO jobs (job_key, job_id, job_type, params, inputs, workflow, state, created_at,"
+             " updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows),
+            ("INSERT INTO job_events (job_key, state, at, detail) VALUES (?, ?, ?, ?)", events),
+        ])
+        return len(rows)
+
+    def record_decisions(self, decisions: Iterable[Dict[str, Any]]) -> int:
+        """Store routing decisions (select_target.py --batch output)"""
+        now = time.time()
+        upserts, events = [], []
+        for d in decisions:
+            key = ledger_key(d)
+            state = 'failed' if d.get('error') else 'routed'
+            detail = {k: v for k, v in d.items() if k not in ('id', 'job_key', 'job_type', 'inputs')}
+            upserts.append((key, caller_id(d), d.get('job_type'), dumps(d.get('inputs')), d.get('workflow'),
+                            d.get('runner'), dumps(detail), state, d.get('error'), now, now, now))
+            events.append((key, state, now, d.get('error')))
+        self.write([
+            ("INSERT INTO jobs (job_key, job_id, job_type, inputs, workflow, runner, decision, state, error,"
+             " created_at, routed_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+             " ON CONFLICT(job_key) DO UPDATE SET job_id = COALESCE(excluded.job_id, job_id), job_type = COALESCE(excluded.job_type, job_type),"
+             " inputs = COALESCE(excluded.inputs, inputs), workflow = excluded.workflow,"
+             " runner = excluded.runner, decision = excluded.decision,"
+             # Recorded after the dispatch (e.g. from a tee'd decisions file): keep the later state
+             " state = CASE WHEN state IN ('queued', 'routed') THEN excluded.state ELSE state END,"
+             " error = CASE WHEN state IN ('queued', 'routed') THEN excluded.error ELSE error END,"
+             " routed_at = excluded.routed_at, updated_at = excluded.updated_at",
+             upserts),
+            ("INSERT INTO job_events (job_key, state, at, detail) VALUES (?, ?, ?, ?)", events),
+        ])
+        return len(upserts)
+
+    def record_dispatches(self, results: Iterable[Dict[str, Any]]) -> int:
+        """Store dispatcher.py results (and run IDs, if already resolved)"""
+        now = time.time()
+        upserts, events = [], []
+        for r in results:
+            key = ledger_key(r)
+            state = 'dispatched' if r.get('status') == 'dispatched' else 'failed'
+            dispatched_at = to_epoch(r.get('dispatched_at')) if state == 'dispatched' else None
+            upserts.append((key, caller_id(r), r.get('job_type'), r.get('workflow'), r.get('runner'), r.get('relayq_id'),
+                            r.get('run_id'), r.get('run_url'), state, r.get('error'), r.get('attempts', 0),
+                            now, dispatched_at, now))
+            events.append((key, state, dispatched_at or now, r.get('error')))
+        self.write([
+            ("INSERT INTO jobs (job_key, job_id, job_type, workflow, runner, relayq_id, run_id, run_url, state,"
+             " error, attempts, created_at, dispatched_at, updated_at)"
+             " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+             " ON CONFLICT(job_key) DO UPDATE SET job_id = COALESCE(excluded.job_id, job_id), job_type = COALESCE(excluded.job_type, job_type),"
+             " workflow = COALESCE(excluded.workflow, workflow), runner = COALESCE(excluded.runner, runner),"
+             " relayq_id = COALESCE(excluded.relayq_id, relayq_id), run_id = COALESCE(excluded.run_id, run_id),"
+             " run_url = COALESCE(excluded.run_url, run_url), state = excluded.state, error = excluded.error,"
+             " attempts = attempts + excluded.attempts, dispatched_at = excluded.dispatched_at,"
+             " updated_at = excluded.updated_at",
+             upserts),
+            ("INSERT INTO job_events (job_key, state, at, detail) VALUES (?, ?, ?, ?)", events),
+        ])
+        return len(upserts)
+
+    def record_runs(self, runs: Iterable[Dict[str, Any]]) -> int:
+        """Apply GitHub run status to jobs, matched by run_id or relayq_id"""
+        now = time.time()
+        conn = self.conn()
+        updates, events = [], []
+        for run in runs:
+            status, conclusion = run.get('status'), run.get('conclusion')
+            if status == 'completed':
+                state = 'completed' if conclusion == 'success' else 'failed'
+            elif status == 'in_progress':
+                state = 'running'
+            else:
+                state = 'dispatched'
+
+            row = conn.execute("SELECT job_key, state FROM jobs WHERE run_id = ? OR relayq_id = ?",
+                               (run.get('id'), run.get('relayq_id'))).fetchone()
+            if row is None or row['state'] == state:
+                continue
+
+            started_at = to_epoch(run.get('run_started_at')) if state != 'dispatched' else None
+            finished_at = to_epoch(run.get('updated_at')) if state in TERMINAL_STATES else None
+            error = f"conclusion: {conclusion}" if state == 'failed' else None
+            updates.append((run.get('id'), run.get('html_url'), state, started_at, finished_at, error, now,
+                            row['job_key']))
+            events.append((row['job_key'], state, finished_at or started_at or now, error))
+
+        self.write([
+            ("UPDATE jobs SET run_id = ?, run_url = COALESCE(?, run_url), state = ?,"
+             " started_at = COALESCE(started_at, ?), finished_at = COALESCE(?, finished_at),"
+             " error = COALESCE(?, error), updated_at = ? WHERE job_key = ?",
+             updates),
+            ("INSERT INTO job_events (job_key, state, at, detail) VALUES (?, ?, ?, ?)", events),
+        ])
+        return len(updates)
+
+    def transition(self, job_key: str, state: str, error: Optional[str] = None):
+        """Move one job to a new state (e.g. from a workflow step)"""
+        now = time.time()
+        column = {'running': 'started_at', 'completed': 'finished_at', 'failed': 'finished_at'}.get(state)
+        stamp = f", {column} = COALESCE({column}, ?)" if column else ""
+        params = [state, error, now] + ([now] if column else []) + [str(job_key)]
+        self.write([
+            (f"UPDATE jobs SET state = ?, error = COALESCE(?, error), updated_at = ?{stamp} WHERE job_key = ?",
+             [tuple(params)]),
+            ("INSERT INTO job_events (job_key, state, at, detail) VALUES (?, ?, ?, ?)",
+             [(str(job_key), state, now, error)]),
+        ])
+
+    def claim_queued(self, limit: int, lease_s: float = CLAIM_LEASE_S) -> List[Dict[str, Any]]:
+        """Atomically move the oldest queued jobs (and expired claims) to 'dispatching'"""
+        now = time.time()
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = [dict(row) for row in conn.execute(
+                "SELECT * FROM jobs WHERE state = 'queued' OR (state = 'dispatching' AND updated_at < ?)"
+                " ORDER BY created_at LIMIT ?", (now - lease_s, limit))]
+            conn.executemany("UPDATE jobs SET state = 'dispatching', updated_at = ? WHERE job_key = ?",
+                             [(now, row['job_key']) for row in rows])
+            conn.executemany("INSERT INTO job_events (job_key, state, at, detail) VALUES (?, ?, ?, ?)",
+                             [(row['job_key'], 'dispatching', now, None) for row in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def release(self, job_keys: Iterable[str], error: Optional[str] = None):
+        """Return claimed jobs to the queue (the drain could not dispatch them)"""
+        now = time.time()
+        keys = [str(k) for k in job_keys]
+        self.write([
+            ("UPDATE jobs SET state = 'queued', updated_at = ? WHERE job_key = ? AND state = 'dispatching'",
+             [(now, k) for k in keys]),
+            ("INSERT INTO job_events (job_key, state, at, detail) VALUES (?, ?, ?, ?)",
+             [(k, 'queued', now, error) for k in keys]),
+        ])
+
+    def get(self, job_key: str) -> Optional[Dict[str, Any]]:
+        row = self.conn().execute("SELECT * FROM jobs WHERE job_key = ?", (str(job_key),)).fetchone()
+        return dict(row) if row else None
+
+    def recent(self, limit: int = 10) -> List[Dict[str, Any]]:
+        rows = self.conn().execute("SELECT * FROM jobs ORDER BY updated_at DESC LIMIT ?", (limit,))
+        return [dict(row) for row in rows]
+
+    def counts_by_state(self) -> Dict[str, int]:
+        rows = self.conn().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+        return {state: count for state, count in rows}
+
+    def in_flight_by_runner(self) -> Dict[str, Dict[str, int]]:
+        """Active jobs per runner and job_type, for seeding the scheduler (stale ones excluded)"""
+        placeholders = ', '.join('?' for _ in ACTIVE_STATES)
+        rows = self.conn().execute(
+            f"SELECT runner, job_type, COUNT(*) FROM jobs WHERE state IN ({placeholders})"
+            f" AND runner IS NOT NULL AND NOT {STALE_WHERE} GROUP BY runner, job_type",
+            ACTIVE_STATES + stale_cutoffs(time.time()))
+        counts = {}
+        for runner, job_type, count in rows:
+            counts.setdefault(runner, {})[job_type] = count
+        return counts
+
+    def active(self) -> List[Dict[str, Any]]:
+        """Jobs dispatched but not yet finished"""
+        placeholders = ', '.join('?' for _ in ACTIVE_STATES)
+        rows = self.conn().execute(
+            f"SELECT * FROM jobs WHERE state IN ({placeholders}) ORDER BY dispatched_at", ACTIVE_STATES)
+        return [dict(row) for row in rows]
+
+    def expire_stale(self) -> int:
+        """Move active jobs matching STALE_WHERE to 'expired'; returns how many"""
+        now = time.time()
+        placeholders = ', '.join('?' for _ in ACTIVE_STATES)
+        keys = [row[0] for row in self.conn().execute(
+            f"SELECT job_key FROM jobs WHERE state IN ({placeholders}) AND {STALE_WHERE}",
+            ACTIVE_STATES + stale_cutoffs(now))]
+        error = "no run update seen; expired"
+        self.write([
+            (f"UPDATE jobs SET state = 'expired', error = COALESCE(error, ?), finished_at = ?, updated_at = ?"
+             f" WHERE job_key = ? AND state IN ({placeholders})",
+             [(error, now, now, key) + ACTIVE_STATES for key in keys]),
+            ("INSERT INTO job_events (job_key, state, at, detail) VALUES (?, ?, ?, ?)",
+             [(key, 'expired', now, error) for key in keys]),
+        ])
+        return len(keys)
+
+def open_ledger(path: str = DEFAULT_LEDGER_PATH) -> Optional[JobLedger]:
+    """Existing ledger for readers, or None if nothing has been recorded yet"""
+    if not os.path.exists(path):
+        return None
+    return JobLedger(path)
+
+def sync_runs(ledger: JobLedger, api: GitHubAPI, repo: str = DEFAULT_REPO) -> int:
+    """Refresh active jobs from one created>= listing of workflow_dispatch runs"""
+    active = ledger.active()
+    if not active:
+        return 0
+    since = datetime.fromtimestamp(min(job['dispatched_at'] or job['created_at'] for job in active), timezone.utc)
+    since_iso = (since - CLOCK_SKEW).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    wanted_ids = {job['run_id'] for job in active if job['run_id']}
+    wanted_tokens = {job['relayq_id'] for job in active if job['relayq_id']}
+    runs = []
+    for page in range(1, MAX_PAGES + 1):
+        response = api.get(f"/repos/{repo}/actions/runs?event=workflow_dispatch"
+                           f"&created=%3E%3D{since_iso}&per_page={PER_PAGE}&page={page}")
+        if not response.ok:
+            raise RuntimeError(f"GitHub API returned {response.status} listing runs")
+        batch = (response.json() or {}).get('workflow_runs', [])
+        for run in batch:
+            tokens = [t for t in TOKEN_PATTERN.findall(run.get('display_title') or '') if t in wanted_tokens]
+            if run.get('id') in wanted_ids or tokens:
+                runs.append(dict(run, relayq_id=tokens[0] if tokens else None))
+        if len(batch) < PER_PAGE:
+            break
+    return ledger.record_runs(runs)
+
+class LedgerSync:
+    """Keeps the ledger's active jobs current from GitHub, at most once per interval"""
+
+    def __init__(self, path: str = DEFAULT_LEDGER_PATH, repo: str = DEFAULT_REPO,
+                 interval: float = SYNC_INTERVAL_S, api: Optional[GitHubAPI] = None):
+        self.path = path
+        self.repo = repo
+        self.interval = interval
+        self.api = api
+        self.ledger = None
+        self.next_sync = 0.0
+
+    def maybe_sync(self) -> int:
+        """Sync and expire stale jobs if the interval has passed; returns runs updated"""
+        now = time.monotonic()
+        if now < self.next_sync:
+            return 0
+        self.next_sync = now + self.interval
+        if self.ledger is None:
+            self.ledger = open_ledger(self.path)
+            if self.ledger is None:
+                return 0
+        count = 0
+        try:
+            if self.api is None:
+                self.api = GitHubAPI()
+            count = sync_runs(self.ledger, self.api, self.repo)
+        except (OSError, http.client.HTTPException, RuntimeError, ValueError) as e:
+            print(f"Warning: ledger sync failed: {e}", file=sys.stderr)
+            if self.api is not None:
+                self.api.close()
+        try:
+            self.ledger.expire_stale()
+        except sqlite3.Error as e:
+            print(f"Warning: cannot expire stale jobs: {e}", file=sys.stderr)
+        return count
+
+    def run(self):
+        """Sync forever (routerd runs this in a background thread)"""
+        while True:
+            self.maybe_sync()
+            time.sleep(max(self.next_sync - time.monotonic(), 0.0))
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="RelayQ job ledger")
+    parser.add_argument('--ledger', default=DEFAULT_LEDGER_PATH, help="Ledger database path")
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('record-decisions', help="Record select_target.py --batch output from stdin")
+    sub.add_parser('record-dispatches', help="Record dispatcher.py output from stdin")
+    sync = sub.add_parser('sync', help="Refresh active jobs from GitHub")
+    sync.add_argument('--repo', default=DEFAULT_REPO)
+    sync.add_argument('--api-url', help="GitHub API base URL (e.g. a local fake server)")
+    sub.add_parser('stats', help="Job counts by state")
+    recent = sub.add_parser('recent', help="Most recently updated jobs")
+    recent.add_argument('limit', nargs='?', type=int, default=10)
+    args = parser.parse_args()
+
+    ledger = JobLedger(args.ledger)
+
+    if args.command in ('record-decisions', 'record-dispatches'):
+        rows = [json.loads(line) for line in sys.stdin if line.strip()]
+        if args.command == 'record-decisions':
+            count = ledger.record_decisions(rows)
+        else:
+            count = ledger.record_dispatches(rows)
+        print(f"Recorded {count} jobs", file=sys.stderr)
+    elif args.command == 'sync':
+        try:
+            count = sync_runs(ledger, GitHubAPI(base_url=args.api_url), args.repo)
+        except (OSError, http.client.HTTPException, RuntimeError, ValueError) as e:
+            print(f"Error: sync failed: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Updated {count} runs, expired {ledger.expire_stale()} stale jobs", file=sys.stderr)
+    elif args.command == 'stats':
+        print(json.dumps({'states': ledger.counts_by_state(), 'in_flight': ledger.in_flight_by_runner()}, indent=2))
+    elif args.command == 'recent':
+        print(json.dumps(ledger.recent(args.limit), indent=2))
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
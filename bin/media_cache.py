@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+RelayQ Media Cache
+
+Per-runner, content-addressed cache for transcribe.sh. Blobs are stored once
+under their sha256; an SQLite (WAL) index maps keys to blobs:
+
+    download     URL + ETag (or Content-Length/Last-Modified)  -> media file
+    audio        media hash + conversion                       -> 16 kHz WAV
+    transcript   media hash (or URL key, when streamed) + model + backend -> transcript
+
+The cache is bounded by RELAYQ_CACHE_MAX_MB and evicts least recently used
+entries. Concurrent jobs are safe: every change to the blob directory
+happens inside a BEGIN IMMEDIATE transaction, new blobs are renamed into
+place atomically, and `get --link` hands out hard links that survive a
+later eviction.
+
+Usage:
+    media_cache.py url-key <url>                     # exit 1 if the URL has no validators
+    media_cache.py hash <file>
+    media_cache.py lookup <kind> <key>               # prints blob hash
+    media_cache.py get <kind> <key> <dest> [--link]  # prints blob hash, exit 1 on miss
+    media_cache.py put <kind> <key> <file>           # prints blob hash
+    media_cache.py stats
+    media_cache.py evict [--max-mb N]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, Optional
+
+DEFAULT_CACHE_DIR = os.path.expanduser(os.environ.get('RELAYQ_CACHE_DIR') or '~/.cache/relayq')
+DEFAULT_MAX_MB = int(os.environ.get('RELAYQ_CACHE_MAX_MB', '20480'))
+
+KINDS = ('download', 'audio', 'transcript')
+HASH_BLOCK = 1024 * 1024
+PROBE_TIMEOUT = 10
+
+# yt-dlp pages have no stable validators, but the video behind the URL is immutable
+STREAMING_SITES = re.compile(r'soundcloud\.com|youtube\.com|youtu\.be')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    hash TEXT NOT NULL REFERENCES blobs(hash),
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries(last_used);
+CREATE INDEX IF NOT EXISTS idx_entries_hash ON entries(hash);
+
+CREATE TABLE IF NOT EXISTS stats (
+    kind TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0,
+    stores INTEGER NOT NULL DEFAULT 0,
+    evictions INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+class _HeadRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """urllib turns redirected HEADs into GETs; keep them HEAD"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        new = super().redirect_request(req, fp, code, msg, headers, newurl)
+        if new is not None:
+            new.method = req.get_method()
+        return new
+
+def url_key(url: str, timeout: float = PROBE_TIMEOUT) -> Optional[str]:
+    """Cache key from the URL and its validators; None if the server gives none"""
+    if STREAMING_SITES.search(url):
+        return f"{url}|ytdlp"
+    opener = urllib.request.build_opener(_HeadRedirectHandler)
+    try:
+        with opener.open(urllib.request.Request(url, method='HEAD'), timeout=timeout) as response:
+            headers = response.headers
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+    if headers.get('ETag'):
+        return f"{url}|etag:{headers['ETag']}"
+    if headers.get('Content-Length'):
+        return f"{url}|length:{headers['Content-Length']}|modified:{headers.get('Last-Modified', '')}"
+    return None
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class MediaCache:
+    """Blob store plus SQLite index; one connection per thread"""
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        os.makedirs(os.path.join(root, 'blobs'), exist_ok=True)
+        os.makedirs(os.path.join(root, 'tmp'), exist_ok=True)
+        self.conn().executescript(SCHEMA)
+
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.root, 'index.db'), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self.local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, 'blobs', digest[:2], digest)
+
+    def _count(self, kind: str, column: str, amount: int = 1):
+        self.conn().execute(
+            f"INSERT INTO stats (kind, {column}) VALUES (?, ?)"
+            f" ON CONFLICT(kind) DO UPDATE SET {column} = {column} + excluded.{column}", (kind, amount))
+
+    def lookup(self, kind: str, key: str) -> Optional[str]:
+        """Blob hash for a key, without touching LRU order or stats"""
+        row = self.conn().execute("SELECT hash FROM entries WHERE key = ?", (f"{kind}:{key}",)).fetchone()
+        return row['hash'] if row else None
+
+    def get(self, kind: str, key: str, dest: str, link: bool = False) -> Optional[str]:
+        """Copy (or hard-link) the cached blob to dest; returns its hash, None on a miss.
+
+        Only link into scratch files nobody rewrites in place: the link
+        shares the blob's inode.
+        """
+        digest = self.lookup(kind, key)
+        if digest is not None:
+            try:
+                if os.path.lexists(dest):
+                    os.remove(dest)
+                self._materialize(self.blob_path(digest), dest, link)
+            except FileNotFoundError:
+                # Evicted between the lookup and the copy
+                digest = None
+        if digest is None:
+            self._count(kind, 'misses')
+            return None
+        self.conn().execute("UPDATE entries SET hits = hits + 1, last_used = ? WHERE key = ?",
+                            (time.time(), f"{kind}:{key}"))
+        self._count(kind, 'hits')
+        return digest
+
+    @staticmethod
+    def _materialize(blob: str, dest: str, link: bool):
+        if link:
+            try:
+                os.link(blob, dest)
+                return
+            except FileNotFoundError:
+                raise
+            except OSError:
+                # Different filesystem: fall back to a copy
+                pass
+        shutil.copyfile(blob, dest)
+
+    def put(self, kind: str, key: str, path: str) -> str:
+        """Store a file (copied and hashed in one pass) under key; returns its hash"""
+        digest = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        try:
+            with open(path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                for block in iter(lambda: src.read(HASH_BLOCK), b''):
+                    digest.update(block)
+                    dst.write(block)
+            digest = digest.hexdigest()
+            size = os.path.getsize(tmp)
+            now = time.time()
+            conn = self.conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                blob = self.blob_path(digest)
+                if not os.path.exists(blob):
+                    os.makedirs(os.path.dirname(blob), exist_ok=True)
+                    os.chmod(tmp, 0o444)
+                    os.replace(tmp, blob)
+                conn.execute("INSERT OR IGNORE INTO blobs (hash, size, created_at) VALUES (?, ?, ?)",
+                             (digest, size, now))
+                conn.execute("INSERT INTO entries (key, kind, hash, created_at, last_used) VALUES (?, ?, ?, ?, ?)"
+                             " ON CONFLICT(key) DO UPDATE SET hash = excluded.hash, last_used = excluded.last_used",
+                             (f"{kind}:{key}", kind, digest, now, now))
+                self._count(kind, 'stores')
+                self._evict(self.max_bytes, keep=digest)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return digest
+
+    def _evict(self, max_bytes: int, keep: Optional[str] = None) -> int:
+        """Drop least recently used entries until blobs fit in max_bytes (caller holds the write lock)"""
+        conn = self.conn()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        evicted = 0
+        while total > max_bytes:
+            row = conn.execute("SELECT key, kind, hash FROM entries WHERE hash != ? ORDER BY last_used LIMIT 1",
+                               (keep or '',)).fetchone()
+            if row is None:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (row['key'],))
+            self._count(row['kind'], 'evictions')
+            evicted += 1
+            if conn.execute("SELECT 1 FROM entries WHERE hash = ? LIMIT 1", (row['hash'],)).fetchone():
+                continue
+            size = conn.execute("SELECT size FROM blobs WHERE hash = ?", (row['hash'],)).fetchone()[0]
+            conn.execute("DELETE FROM blobs WHERE hash = ?", (row['hash'],))
+            try:
+                os.remove(self.blob_path(row['hash']))
+            except FileNotFoundError:
+                pass
+            total -= size
+        return evicted
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            evicted = self._evict(self.max_bytes if max_bytes is None else max_bytes)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self.conn()
+        blobs, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        entries = dict(conn.execute("SELECT kind, COUNT(*) FROM entries GROUP BY kind").fetchall())
+        kinds = {}
+        for row in conn.execute("SELECT * FROM stats ORDER BY kind"):
+            lookups = row['hits'] + row['misses']
+            kinds[row['kind']] = {
+                'entries': entries.get(row['kind'], 0),
+                'hits': row['hits'],
+                'misses': row['misses'],
+                'hit_rate': round(row['hits'] / lookups, 3) if lookups else None,
+                'stores': row['stores'],
+                'evictions': row['evictions'],
+            }
+        return {'blobs': blobs, 'bytes': size, 'max_bytes': self.max_bytes, 'kinds': kinds}
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="RelayQ content-addressed media cache")
+    parser.add_argument('--dir', default=DEFAULT_CACHE_DIR, help="Cache directory")
+    parser.add_argument('--max-mb', type=int, default=DEFAULT_MAX_MB, help="Size bound for stored blobs")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('url-key', help="Key for a URL from its ETag/Content-Length")
+    p.add_argument('url')
+    p = sub.add_parser('hash', help="sha256 of a file")
+    p.add_argument('file')
+    p = sub.add_parser('lookup', help="Blob hash for a key (no copy, no stats)")
+    p.add_argument('kind', choices=KINDS)
+    p.add_argument('key')
+    p = sub.add_parser('get', help="Copy a cached blob to dest")
+    p.add_argument('kind', choices=KINDS)
+    p.add_argument('key')
+    p.add_argument('dest')
+    p.add_argument('--link', action='store_true', help="Hard-link instead of copying (scratch files only)")
+    p = sub.add_parser('put', help="Store a file under a key")
+    p.add_argument('kind', choices=KINDS)
+    p.add_argument('key')
+    p.add_argument('file')
+    sub.add_parser('stats', help="Hit/miss counts and size")
+    sub.add_parser('evict', help="Evict down to --max-mb")
+    args = parser.parse_args()
+
+    if args.command == 'url-key':
+        key = url_key(args.url)
+        if key is None:
+            sys.exit(1)
+        print(key)
+        return
+    if args.command == 'hash':
+        print(file_hash(args.file))
+        return
+
+    try:
+        cache = MediaCache(args.dir, args.max_mb * 1024 * 1024)
+        if args.command == 'lookup':
+            digest = cache.lookup(args.kind, args.key)
+        elif args.command == 'get':
+            digest = cache.get(args.kind, args.key, args.dest, args.link)
+        elif args.command == 'put':
+            digest = cache.put(args.kind, args.key, args.file)
+        elif args.command == 'stats':
+            print(json.dumps(cache.stats(), indent=2))
+            return
+        else:
+            print(json.dumps({'evicted': cache.evict()}))
+            return
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error: media cache: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if digest is None:
+        sys.exit(1)
+    print(digest)
+
+if __name__ == "__main__":
+    main()
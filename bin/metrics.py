@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+RelayQ Metrics
+
+Prometheus text-format metrics, served by the dashboard at /metrics:
+
+    relayq_queue_wait_seconds          histogram: dispatch -> run start, by workflow and runner
+    relayq_run_duration_seconds        histogram: run start -> finish, by workflow, runner and state
+    relayq_stage_duration_seconds      histogram: transcribe.sh stages (see stage_timings.py),
+                                       by stage, runner and status
+    relayq_jobs                        gauge: ledger jobs by state
+    relayq_runner_busy_ratio           gauge: busy share of online time over the last hour
+    relayq_runner_busy_seconds_total   counters behind the ratio (use rate() for other windows)
+    relayq_runner_online_seconds_total
+    relayq_github_rate_limit_*         gauges: limit, remaining, seconds until reset
+
+Collection is incremental: each update reads only ledger events after the
+last event id seen and timing log lines after the last offset, and takes
+one runner sample. A scrape formats what has already been collected.
+
+Stage timings come from the JSONL log transcribe.sh appends to
+(RELAYQ_TIMINGS, see stage_timings.py), so they cover jobs that ran on, or were collected onto,
+this host.
+
+Usage:
+    metrics.py show [--ledger PATH] [--timings PATH]   # one collection pass, printed
+"""
+
+import argparse
+import collections
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from job_ledger import DEFAULT_LEDGER_PATH, JobLedger, open_ledger
+from runner_state import DEFAULT_MAX_AGE, read_runner_state
+from stage_timings import DEFAULT_TIMINGS_PATH
+
+QUEUE_WAIT_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+RUN_DURATION_BUCKETS = (30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400)
+STAGE_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# Ledger events read per query while catching up
+EVENT_BATCH = 5000
+BUSY_WINDOW_S = 3600
+# A gap between runner samples longer than this (refresher idle) is not counted
+MAX_SAMPLE_GAP_S = 120
+
+def escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def label_text(names: Sequence[str], values: Sequence[Any], extra: str = '') -> str:
+    pairs = [f'{n}="{escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Histogram:
+    """Cumulative-bucket histogram per label set"""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, values: Tuple[Any, ...], amount: float):
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+        for index, bound in enumerate(self.buckets):
+            if amount <= bound:
+                series['buckets'][index] += 1
+        series['sum'] += amount
+        series['count'] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, series in sorted(self.series.items()):
+            bounds = [number(b) for b in self.buckets] + ['+Inf']
+            for bound, count in zip(bounds, series['buckets'] + [series['count']]):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{label_text(self.labels, values, le)} {count}")
+            plain = label_text(self.labels, values)
+            lines.append(f"{self.name}_sum{plain} {round(series['sum'], 3)}")
+            lines.append(f"{self.name}_count{plain} {series['count']}")
+        return lines
+
+def gauge_lines(name: str, help_text: str, kind: str, labels: Sequence[str],
+                samples: Dict[Tuple[Any, ...], float]) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for values, value in sorted(samples.items()):
+        lines.append(f"{name}{label_text(labels, values)} {number(round(value, 3))}")
+    return lines
+
+class MetricsCollector:
+    """Incrementally updated metrics; update() from one thread, render() from any"""
+
+    def __init__(self, timings_path: str = DEFAULT_TIMINGS_PATH):
+        self.timings_path = timings_path
+        self.lock = threading.Lock()
+        self.queue_wait = Histogram('relayq_queue_wait_seconds', "Time from dispatch to run start",
+                                    ('workflow', 'runner'), QUEUE_WAIT_BUCKETS)
+        self.run_duration = Histogram('relayq_run_duration_seconds', "Time from run start to finish",
+                                      ('workflow', 'runner', 'state'), RUN_DURATION_BUCKETS)
+        self.stage_duration = Histogram('relayq_stage_duration_seconds', "transcribe.sh stage durations",
+                                        ('stage', 'runner', 'status'), STAGE_BUCKETS)
+        self.last_event_id = 0
+        self.timings_offset = 0
+        self.job_states = {}
+        self.busy_seconds = collections.Counter()
+        self.online_seconds = collections.Counter()
+        self.samples = collections.defaultdict(collections.deque)
+        self.last_sample = None
+        self.rate_limit = {}
+
+    def update(self, ledger: Optional[JobLedger] = None, runners: Optional[List[Dict[str, Any]]] = None,
+               rate_limit: Optional[Dict[str, Any]] = None, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        with self.lock:
+            if ledger is not None:
+                self.collect_ledger(ledger)
+            self.collect_timings()
+            if runners is not None:
+                self.sample_runners(runners, now)
+            if rate_limit and rate_limit.get('observed_at', 0) >= self.rate_limit.get('observed_at', 0):
+                self.rate_limit = dict(rate_limit)
+
+    def collect_ledger(self, ledger: JobLedger):
+        """Observe run starts and finishes recorded since the last update"""
+        conn = ledger.conn()
+        while True:
+            rows = conn.execute(
+                "SELECT e.id, e.state, j.workflow, j.runner, j.dispatched_at, j.started_at, j.finished_at,"
+                " EXISTS(SELECT 1 FROM job_events p WHERE p.job_key = e.job_key AND p.state = 'running'"
+                " AND p.id < e.id) AS seen_running"
+                " FROM job_events e JOIN jobs j ON j.job_key = e.job_key"
+                " WHERE e.id > ? AND e.state IN ('running', 'completed', 'failed') ORDER BY e.id LIMIT ?",
+                (self.last_event_id, EVENT_BATCH)).fetchall()
+            for row in rows:
+                workflow = os.path.basename(row['workflow'] or 'unknown')
+                runner = row['runner'] or 'unknown'
+                # Queue wait once per job: at 'running', or at the finish if the start was never seen
+                if (row['state'] == 'running' or not row['seen_running']) \
+                        and row['dispatched_at'] and row['started_at']:
+                    self.queue_wait.observe((workflow, runner), max(row['started_at'] - row['dispatched_at'], 0))
+                if row['state'] != 'running' and row['started_at'] and row['finished_at']:
+                    self.run_duration.observe((workflow, runner, row['state']),
+                                              max(row['finished_at'] - row['started_at'], 0))
+                self.last_event_id = row['id']
+            if len(rows) < EVENT_BATCH:
+                break
+        self.job_states = ledger.counts_by_state()
+
+    def collect_timings(self):
+        """Observe stage events appended to the timings log since the last offset"""
+        try:
+            size = os.path.getsize(self.timings_path)
+        except OSError:
+            return
+        if size < self.timings_offset:
+            # Rotated or truncated: start over
+            self.timings_offset = 0
+        if size == self.timings_offset:
+            return
+        with open(self.timings_path, 'rb') as f:
+            f.seek(self.timings_offset)
+            data = f.read(size - self.timings_offset)
+        # Leave a partially written last line for the next pass
+        complete = data.rfind(b'\n') + 1
+        self.timings_offset += complete
+        for line in data[:complete].splitlines():
+            try:
+                event = json.loads(line)
+                seconds = float(event['seconds'])
+            except (ValueError, KeyError, TypeError):
+                continue
+            self.stage_duration.observe((event.get('stage', 'unknown'), event.get('runner', 'unknown'),
+                                         event.get('status', 'ok')), seconds)
+
+    def sample_runners(self, runners: List[Dict[str, Any]], now: float):
+        """Add the time since the last sample to each runner's online/busy totals"""
+        elapsed = 0.0 if self.last_sample is None else now - self.last_sample
+        self.last_sample = now
+        if elapsed > MAX_SAMPLE_GAP_S:
+            elapsed = 0.0
+        for runner in runners:
+            name = runner.get('name', 'unknown')
+            online = runner.get('status') == 'online'
+            busy = online and bool(runner.get('busy'))
+            if online:
+                self.online_seconds[name] += elapsed
+            if busy:
+                self.busy_seconds[name] += elapsed
+            window = self.samples[name]
+            window.append((now, elapsed if online else 0.0, elapsed if busy else 0.0))
+            while window and window[0][0] < now - BUSY_WINDOW_S:
+                window.popleft()
+
+    def busy_ratios(self) -> Dict[Tuple[str], float]:
+        ratios = {}
+        for name, window in self.samples.items():
+            online = sum(s[1] for s in window)
+            if online > 0:
+                ratios[(name,)] = sum(s[2] for s in window) / online
+        return ratios
+
+    def render(self) -> str:
+        with self.lock:
+            lines = []
+            for histogram in (self.queue_wait, self.run_duration, self.stage_duration):
+                lines += histogram.render()
+            lines += gauge_lines('relayq_jobs', "Ledger jobs by state", 'gauge', ('state',),
+                                 {(state,): count for state, count in self.job_states.items()})
+            lines += gauge_lines('relayq_runner_busy_ratio', "Busy share of online time over the last hour",
+                                 'gauge', ('runner',), self.busy_ratios())
+            lines += gauge_lines('relayq_runner_busy_seconds_total', "Seconds runners were seen busy",
+                                 'counter', ('runner',), {(k,): v for k, v in self.busy_seconds.items()})
+            lines += gauge_lines('relayq_runner_online_seconds_total', "Seconds runners were seen online",
+                                 'counter', ('runner',), {(k,): v for k, v in self.online_seconds.items()})
+            if self.rate_limit:
+                limits = self.rate_limit
+                lines += gauge_lines('relayq_github_rate_limit_limit', "GitHub API requests allowed per hour",
+                                     'gauge', (), {(): limits.get('limit', 0)})
+                lines += gauge_lines('relayq_github_rate_limit_remaining', "GitHub API requests left this hour",
+                                     'gauge', (), {(): limits.get('remaining', 0)})
+                lines += gauge_lines('relayq_github_rate_limit_reset_seconds', "Seconds until the limit resets",
+                                     'gauge', (), {(): max(limits.get('reset', 0) - time.time(), 0)})
+        return '\n'.join(lines) + '\n'
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="RelayQ metrics in Prometheus text format")
+    sub = parser.add_subparsers(dest='command', required=True)
+    show = sub.add_parser('show', help="Collect once and print")
+    show.add_argument('--ledger', default=DEFAULT_LEDGER_PATH)
+    show.add_argument('--timings', default=DEFAULT_TIMINGS_PATH)
+    args = parser.parse_args()
+
+    collector = MetricsCollector(args.timings)
+    state = read_runner_state(max_age=DEFAULT_MAX_AGE) or {}
+    collector.update(open_ledger(args.ledger), state.get('runners'), state.get('rate_limit'))
+    sys.stdout.write(collector.render())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+RelayQ Ranged Downloader
+
+Downloads large media over several parallel HTTP Range requests and
+survives dropped connections. Each segment retries from the last byte it
+wrote; progress is checkpointed to a state file next to the partial file,
+so a later run (another job on the same runner) resumes instead of
+starting over. A changed ETag/Last-Modified/size discards the partial.
+
+The result is checked against the server's size (and --sha256 when given)
+before it is renamed into place. Servers that ignore Range get a single
+stream.
+
+Usage:
+    ranged_download.py <url> <dest> [--segments N] [--partial-dir DIR]
+                       [--sha256 HEX] [--retries N] [--timeout SECONDS]
+"""
+
+import argparse
+import fcntl
+import hashlib
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+DEFAULT_SEGMENTS = int(os.environ.get('RELAYQ_DOWNLOAD_SEGMENTS', '4'))
+DEFAULT_RETRIES = int(os.environ.get('RELAYQ_DOWNLOAD_RETRIES', '8'))
+DEFAULT_TIMEOUT = 30
+
+# Segments smaller than this are not worth a separate connection
+MIN_SEGMENT_BYTES = 8 * 1024 * 1024
+READ_BYTES = 256 * 1024
+CHECKPOINT_S = 1.0
+BACKOFF_S = 0.5
+MAX_BACKOFF_S = 15.0
+
+# Partials nobody resumed within a week are deleted
+PARTIAL_MAX_AGE_S = 7 * 24 * 3600
+
+USER_AGENT = 'relayq-downloader/1.0'
+
+class DownloadError(Exception):
+    """The download cannot complete (resource changed, size or hash mismatch, retries exhausted)"""
+
+def open_url(url: str, timeout: float, headers: Optional[Dict[str, str]] = None):
+    request = urllib.request.Request(url, headers=dict({'User-Agent': USER_AGENT}, **(headers or {})))
+    return urllib.request.urlopen(request, timeout=timeout)
+
+def probe(url: str, timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    """Size, validators and Range support from a one-byte ranged GET"""
+    with open_url(url, timeout, {'Range': 'bytes=0-0'}) as response:
+        headers = response.headers
+        info = {
+            'url': response.geturl(),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'ranges': response.status == 206,
+            'total': None,
+        }
+        if response.status == 206:
+            # Content-Range: bytes 0-0/12345 ('*' when the size is unknown)
+            total = (headers.get('Content-Range') or '').rpartition('/')[2]
+            info['total'] = int(total) if total.isdigit() else None
+            info['ranges'] = info['total'] is not None
+        elif headers.get('Content-Length', '').isdigit():
+            info['total'] = int(headers['Content-Length'])
+    return info
+
+def plan_segments(total: int, segments: int) -> List[Dict[str, int]]:
+    """Split [0, total) into up to `segments` ranges of at least MIN_SEGMENT_BYTES"""
+    count = max(1, min(segments, total // MIN_SEGMENT_BYTES))
+    size = -(-total // count)
+    return [{'start': start, 'end': min(start + size, total), 'done': 0}
+            for start in range(0, total, size)]
+
+class RangedDownload:
+    """One download: partial file + JSON state, filled by parallel segment workers"""
+
+    def __init__(self, url: str, dest: str, segments: int = DEFAULT_SEGMENTS, partial_dir: Optional[str] = None,
+                 retries: int = DEFAULT_RETRIES, timeout: float = DEFAULT_TIMEOUT, sha256: Optional[str] = None):
+        self.url = url
+        self.dest = dest
+        self.segments = segments
+        self.retries = retries
+        self.timeout = timeout
+        self.sha256 = sha256.lower() if sha256 else None
+        self.partial_dir = partial_dir or os.path.dirname(os.path.abspath(dest))
+        self.lock = threading.Lock()
+        self.state = None
+        self.fd = None
+        self.last_checkpoint = 0.0
+        self.stats = {'bytes': 0, 'resumed_bytes': 0, 'retries': 0, 'segments': 1, 'mode': 'single'}
+
+    def partial_path(self) -> str:
+        name = hashlib.sha256(self.url.encode()).hexdigest()[:24]
+        return os.path.join(self.partial_dir, f"{name}.part")
+
+    def run(self) -> Dict[str, Any]:
+        started = time.monotonic()
+        os.makedirs(self.partial_dir, exist_ok=True)
+        self.clean_stale()
+        part = self.partial_path()
+        lock = open(part + '.lock', 'w')
+        try:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another job on this runner owns the shared partial; use a private one
+                part = os.path.join(os.path.dirname(os.path.abspath(self.dest)),
+                                    os.path.basename(self.dest) + '.part')
+            self.download(part)
+        finally:
+            lock.close()
+        os.replace(part, self.dest)
+        for path in (part + '.json', part + '.lock'):
+            if os.path.exists(path):
+                os.remove(path)
+
+        elapsed = time.monotonic() - started
+        self.stats['wall_s'] = round(elapsed, 2)
+        self.stats['mb_per_s'] = round(self.stats['bytes'] / 1048576.0 / elapsed, 2) if elapsed else None
+        return self.stats
+
+    def clean_stale(self):
+        cutoff = time.time() - PARTIAL_MAX_AGE_S
+        for name in os.listdir(self.partial_dir):
+            path = os.path.join(self.partial_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def download(self, part: str):
+        info = probe(self.url, self.timeout)
+        state_path = part + '.json'
+        if not info['ranges'] or not info['total']:
+            self.single_stream(part)
+        else:
+            self.state = self.load_state(state_path, info)
+            if self.state is None:
+                self.state = dict(info, segments=plan_segments(info['total'], self.segments))
+                with open(part, 'wb') as f:
+                    f.truncate(info['total'])
+            self.stats['mode'] = 'ranged'
+            self.stats['segments'] = len(self.state['segments'])
+            self.stats['resumed_bytes'] = sum(s['done'] for s in self.state['segments'])
+            self.fd = os.open(part, os.O_RDWR)
+            try:
+                with ThreadPoolExecutor(max_workers=len(self.state['segments'])) as pool:
+                    for future in [pool.submit(self.fetch_segment, s, state_path)
+                                   for s in self.state['segments']]:
+                        future.result()
+                os.fsync(self.fd)
+            finally:
+                os.close(self.fd)
+                self.fd = None
+        self.verify(part, info['total'])
+
+    def load_state(self, state_path: str, info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Saved progress, if it belongs to the same version of the same resource"""
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        same = all(state.get(k) == info[k] for k in ('total', 'etag', 'last_modified'))
+        if not same or not os.path.exists(state_path[:-len('.json')]):
+            return None
+        return state
+
+    def save_state(self, state_path: str, force: bool = False):
+        """Checkpoint progress; data is fsynced first so `done` never runs ahead of the disk"""
+        with self.lock:
+            now = time.monotonic()
+            if not force and now - self.last_checkpoint < CHECKPOINT_S:
+                return
+            self.last_checkpoint = now
+            os.fsync(self.fd)
+            tmp = state_path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self.state, f)
+            os.replace(tmp, state_path)
+
+    def fetch_segment(self, segment: Dict[str, int], state_path: str):
+        failures, failed_at = 0, -1
+        while segment['start'] + segment['done'] < segment['end']:
+            offset = segment['start'] + segment['done']
+            if offset > failed_at:
+                # Made progress since the last failure: reset the backoff
+                failures = 0
+            headers = {'Range': f"bytes={offset}-{segment['end'] - 1}"}
+            # If-Range: a changed resource answers 200 with the full body instead of mixing versions
+            validator = self.state.get('etag') or self.state.get('last_modified')
+            if validator and not validator.startswith('W/'):
+                headers['If-Range'] = validator
+            try:
+                with open_url(self.state['url'], self.timeout, headers) as response:
+                    if response.status != 206:
+                        raise DownloadError(f"{self.url} changed during download (HTTP {response.status} to a range request)")
+                    while True:
+                        block = response.read(min(READ_BYTES, segment['end'] - segment['start'] - segment['done']))
+                        if not block:
+                            break
+                        os.pwrite(self.fd, block, segment['start'] + segment['done'])
+                        segment['done'] += len(block)
+                        with self.lock:
+                            self.stats['bytes'] += len(block)
+                        self.save_state(state_path)
+                if segment['start'] + segment['done'] < segment['end']:
+                    raise http.client.IncompleteRead(b'')
+            except (OSError, http.client.HTTPException) as e:
+                if isinstance(e, urllib.error.HTTPError) and e.code < 500 and e.code != 429:
+                    raise DownloadError(f"{self.url}: HTTP {e.code} for bytes {offset}-")
+                failures += 1
+                failed_at = segment['start'] + segment['done']
+                with self.lock:
+                    self.stats['retries'] += 1
+                self.save_state(state_path, force=True)
+                if failures > self.retries:
+                    raise DownloadError(f"{self.url}: segment at {offset} failed {failures} times: {e!r}")
+                time.sleep(min(BACKOFF_S * 2 ** (failures - 1), MAX_BACKOFF_S))
+        self.save_state(state_path, force=True)
+
+    def single_stream(self, part: str):
+        """No Range support: one GET, restarted from zero on failure"""
+        failures = 0
+        while True:
+            try:
+                with open_url(self.url, self.timeout) as response, open(part, 'wb') as f:
+                    expected = response.headers.get('Content-Length')
+                    written = 0
+                    for block in iter(lambda: response.read(READ_BYTES), b''):
+                        f.write(block)
+                        written += len(block)
+                    if expected and expected.isdigit() and written != int(expected):
+                        raise http.client.IncompleteRead(b'', int(expected) - written)
+                self.stats['bytes'] += written
+                return
+            except (OSError, http.client.HTTPException) as e:
+                if isinstance(e, urllib.error.HTTPError) and e.code < 500 and e.code != 429:
+                    raise DownloadError(f"{self.url}: HTTP {e.code}")
+                failures += 1
+                self.stats['retries'] += 1
+                if failures > self.retries:
+                    raise DownloadError(f"{self.url}: failed {failures} times: {e!r}")
+                time.sleep(min(BACKOFF_S * 2 ** (failures - 1), MAX_BACKOFF_S))
+
+    def verify(self, part: str, total: Optional[int]):
+        size = os.path.getsize(part)
+        if total is not None and size != total:
+            raise DownloadError(f"{self.url}: got {size} bytes, server reported {total}")
+        if self.sha256:
+            digest = hashlib.sha256()
+            with open(part, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+            if digest.hexdigest() != self.sha256:
+                for path in (part, part + '.json'):
+                    if os.path.exists(path):
+                        os.remove(path)
+                raise DownloadError(f"{self.url}: sha256 {digest.hexdigest()} does not match {self.sha256}")
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="Parallel, resumable HTTP Range downloader")
+    parser.add_argument('url')
+    parser.add_argument('dest')
+    parser.add_argument('--segments', type=int, default=DEFAULT_SEGMENTS, help="Parallel range requests")
+    parser.add_argument('--partial-dir', help="Where partial files and resume state live (default: dest's directory)")
+    parser.add_argument('--sha256', help="Expected sha256 of the result")
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help="Retries per segment")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help="Socket timeout in seconds")
+    args = parser.parse_args()
+
+    download = RangedDownload(args.url, args.dest, args.segments, args.partial_dir,
+                              args.retries, args.timeout, args.sha256)
+    try:
+        stats = download.run()
+    except (OSError, http.client.HTTPException, DownloadError) as e:
+        print(f"Error: download failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(stats), file=sys.stderr)
+    print(args.dest)
+
+if __name__ == "__main__":
+    main()
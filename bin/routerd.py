@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+RelayQ Routing Daemon
+
+Keeps policy.yaml compiled in memory and answers routing queries over a
+Unix socket (or localhost TCP port), so dispatching thousands of jobs does
+not pay interpreter startup and YAML parsing per job.
+
+Protocol: one JSON object per line in each direction.
+    -> {"job_type": "transcribe", "params": {"size_mb": 50}}
+    <- {"workflow": ".github/workflows/transcribe_mac.yml", "runner": "macmini", ...}
+
+A plain query is answered like select_target.py's select_live: placed by
+the capacity scheduler (runner state, ledger, in-flight counts) without
+counting the job, or routed by policy alone when no runner state exists.
+
+Capacity-aware placement (see scheduler.py) counts the job as in flight
+until it is released:
+    -> {"op": "place", "job_type": "transcribe", "params": {"size_mb": 50}}
+    <- {"workflow": "...", "runner": "macmini", "in_flight": 1, "saturated": false}
+    -> {"op": "release", "runner": "macmini", "job_type": "transcribe"}
+    <- {"released": true}
+
+While serving, a background thread syncs the job ledger's active jobs
+from GitHub every --sync-interval seconds (job_ledger.LedgerSync), so
+finished jobs stop counting as in flight. Another collects the runners'
+stage timings every --collect-interval seconds (stage_timings.TimingsCollector)
+and learns from them; the scheduler picks up the rewritten throughput table
+on its next policy check.
+
+Usage:
+    routerd.py serve [--socket PATH | --port PORT] [--policy PATH] [--sync-interval S]
+                     [--collect-interval S]
+    routerd.py query <job_type> [job_params_json]
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from job_ledger import SYNC_INTERVAL_S, LedgerSync, open_ledger
+from runner_state import DEFAULT_MAX_AGE, read_runner_state
+from scheduler import CapacityScheduler
+from select_target import DEFAULT_POLICY_PATH, compile_policy, job_error, load_policy, route_job
+from socket_address import parse_address
+from stage_timings import COLLECT_INTERVAL_S, TimingsCollector
+
+DEFAULT_SOCKET = os.environ.get('RELAYQ_ROUTER_SOCKET') or '/tmp/relayq-router.sock'
+
+class CompiledPolicy:
+    """Compiled routing policy that reloads itself when the file changes"""
+
+    def __init__(self, policy_path: str = DEFAULT_POLICY_PATH, check_interval: float = 1.0):
+        self.policy_path = policy_path
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.next_check = 0.0
+        self.reloads = 0
+        self.policy = {}
+        self.compiled = {}
+        self.scheduler = None
+        self.ledger = None
+        self.has_runner_state = False
+        self.reload()
+
+    def reload(self):
+        """Re-read and compile the policy file"""
+        mtime = os.stat(self.policy_path).st_mtime_ns
+        policy = load_policy(self.policy_path) or {}
+        compiled = compile_policy(policy)
+        with self.lock:
+            self.policy = policy
+            self.compiled = compiled
+            self.mtime = mtime
+            self.reloads += 1
+            if self.scheduler is None:
+                self.scheduler = CapacityScheduler(policy)
+            else:
+                self.scheduler.update_policy(policy)
+
+    def maybe_reload(self):
+        """Reload if policy.yaml or the throughput table changed; stat() at most once per check_interval"""
+        now = time.monotonic()
+        if now < self.next_check:
+            return
+        self.next_check = now + self.check_interval
+        state = read_runner_state(max_age=DEFAULT_MAX_AGE)
+        self.has_runner_state = state is not None
+        self.scheduler.apply_runner_state(state)
+        self.apply_ledger()
+        self.scheduler.throughput.maybe_reload()
+        try:
+            if os.stat(self.policy_path).st_mtime_ns != self.mtime:
+                self.reload()
+        except (OSError, SystemExit) as e:
+            # Keep serving the last good policy if the new one is broken
+            print(f"Warning: policy reload failed, keeping previous policy: {e}", file=sys.stderr)
+
+    def apply_ledger(self):
+        """Count jobs the ledger has as dispatched or running towards runner load"""
+        if self.ledger is None:
+            self.ledger = open_ledger()
+            if self.ledger is None:
+                return
+        try:
+            self.scheduler.apply_ledger(self.ledger.in_flight_by_runner())
+        except sqlite3.Error as e:
+            print(f"Warning: cannot read job ledger: {e}", file=sys.stderr)
+
+    def select(self, job_type: str, job_params: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer one routing query, as select_target.select_live would"""
+        self.maybe_reload()
+        if self.has_runner_state:
+            return self.scheduler.place(job_type, job_params, acquire=False)
+        workflow, error = route_job(job_type, job_params, self.compiled)
+        if workflow:
+            return {'workflow': workflow}
+        return {'error': error or 'no workflow selected'}
+
+    def place(self, job_type: str, job_params: Dict[str, Any]) -> Dict[str, Any]:
+        """Capacity-aware placement; the job stays in flight until released"""
+        self.maybe_reload()
+        return self.scheduler.place(job_type, job_params)
+
+def handle_request(policy: CompiledPolicy, line: bytes) -> Dict[str, Any]:
+    """Decode one request line and route it"""
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return {'error': f"invalid request: {e}"}
+    if not isinstance(request, dict):
+        return {'error': "request must be a JSON object"}
+
+    op = request.get('op', 'select')
+    if op == 'status':
+        return {'runners': policy.scheduler.snapshot(), 'reloads': policy.reloads}
+    if op == 'release':
+        if not isinstance(request.get('runner'), str) or not isinstance(request.get('job_type'), str):
+            return {'error': "release needs runner and job_type"}
+        policy.scheduler.release(request['runner'], request['job_type'])
+        return {'released': True}
+
+    if 'job_type' not in request:
+        return {'error': "request must be an object with a job_type"}
+    params = request.get('params')
+    if params is None:
+        params = {}
+    # Same per-job checks as batch routing, so a bad request gets an error reply
+    error = job_error(request, params)
+    if error:
+        return {'error': error}
+    if op == 'place':
+        return policy.place(request['job_type'], params)
+    if op == 'select':
+        return policy.select(request['job_type'], params)
+    return {'error': f"unknown op: {op}"}
+
+class RouterHandler(socketserver.StreamRequestHandler):
+    """Serve newline-delimited JSON queries for the lifetime of a connection"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            reply = handle_request(self.server.policy, line)
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+            self.wfile.flush()
+
+class UnixRouterServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class TCPRouterServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def make_server(address: Union[str, Tuple[str, int]], policy: CompiledPolicy) -> socketserver.BaseServer:
+    """Create (but do not start) a routing server bound to address"""
+    if isinstance(address, tuple):
+        server = TCPRouterServer(address, RouterHandler)
+    else:
+        if os.path.exists(address):
+            os.unlink(address)
+        server = UnixRouterServer(address, RouterHandler)
+        os.chmod(address, 0o600)
+    server.policy = policy
+    return server
+
+class RouterClient:
+    """Thin client that keeps one connection to routerd open"""
+
+    def __init__(self, address: str = DEFAULT_SOCKET, timeout: float = 5.0):
+        target = parse_address(address)
+        if isinstance(target, tuple):
+            self.sock = socket.create_connection(target, timeout=timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            try:
+                self.sock.connect(target)
+            except OSError:
+                self.sock.close()
+                raise
+        self.reader = self.sock.makefile('rb')
+
+    def request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Send one request object and wait for its reply"""
+        self.sock.sendall(json.dumps(request).encode() + b'\n')
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("routerd closed the connection")
+        return json.loads(line)
+
+    def query(self, job_type: str, job_params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Send one query and wait for its reply"""
+        return self.request({'job_type': job_type, 'params': job_params or {}})
+
+    def place(self, job_type: str, job_params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Capacity-aware placement; call release() when the job finishes"""
+        return self.request({'op': 'place', 'job_type': job_type, 'params': job_params or {}})
+
+    def release(self, runner: str, job_type: str) -> Dict[str, Any]:
+        """Tell the daemon a placed job has finished"""
+        return self.request({'op': 'release', 'runner': runner, 'job_type': job_type})
+
+    def select_workflow(self, job_type: str, job_params: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Same contract as select_target.select_workflow, answered by the daemon"""
+        return self.query(job_type, job_params).get('workflow')
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="RelayQ routing daemon")
+    sub = parser.add_subparsers(dest='command')
+
+    serve = sub.add_parser('serve', help="Run the routing daemon")
+    serve.add_argument('--socket', default=DEFAULT_SOCKET, help="Unix socket path or host:port")
+    serve.add_argument('--port', type=int, help="Listen on 127.0.0.1:PORT instead of a Unix socket")
+    serve.add_argument('--policy', default=DEFAULT_POLICY_PATH, help="Path to policy.yaml")
+    serve.add_argument('--check-interval', type=float, default=1.0, help="Seconds between policy mtime checks")
+    serve.add_argument('--sync-interval', type=float, default=SYNC_INTERVAL_S,
+                       help="Seconds between job ledger syncs with GitHub (0 disables)")
+    serve.add_argument('--collect-interval', type=float, default=COLLECT_INTERVAL_S,
+                       help="Seconds between collecting runners' stage timings and learning throughput (0 disables)")
+
+    query = sub.add_parser('query', help="Query a running daemon")
+    query.add_argument('--socket', default=DEFAULT_SOCKET, help="Unix socket path or host:port")
+    query.add_argument('job_type')
+    query.add_argument('job_params', nargs='?', default='{}')
+
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        address = ('127.0.0.1', args.port) if args.port else parse_address(args.socket)
+        policy = CompiledPolicy(args.policy, args.check_interval)
+        server = make_server(address, policy)
+        if args.sync_interval > 0:
+            sync = LedgerSync(interval=args.sync_interval)
+            threading.Thread(target=sync.run, name='ledger-sync', daemon=True).start()
+        if args.collect_interval > 0:
+            collector = TimingsCollector(interval=args.collect_interval)
+            threading.Thread(target=collector.run, name='timings-collect', daemon=True).start()
+        print(f"routerd listening on {address} (policy: {args.policy})", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if isinstance(address, str) and os.path.exists(address):
+                os.unlink(address)
+
+    elif args.command == 'query':
+        try:
+            job_params = json.loads(args.job_params)
+        except json.JSONDecodeError as e:
+            print(f"Error parsing job parameters: {e}", file=sys.stderr)
+            sys.exit(1)
+        try:
+            with RouterClient(args.socket) as client:
+                reply = client.query(args.job_type, job_params)
+        except OSError as e:
+            print(f"Error: cannot reach routerd at {args.socket}: {e}", file=sys.stderr)
+            sys.exit(1)
+        if reply.get('workflow'):
+            print(reply['workflow'])
+            sys.exit(0)
+        print(f"Error: {reply.get('error')}", file=sys.stderr)
+        sys.exit(1)
+
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+RelayQ Run Resolver
+
+Maps dispatcher correlation tokens (the `relayq_id` workflow input, which
+the transcribe workflows put in their run name) to GitHub run IDs.
+
+All outstanding tokens are resolved together: each poll is one
+`created>=` filtered listing of workflow_dispatch runs, paged only until
+every token is found or the listing runs out, rather than one lookup per
+job.
+
+Usage:
+    dispatcher.py < jobs.jsonl | run_resolver.py [--timeout SECONDS] > resolved.jsonl
+"""
+
+import argparse
+import http.client
+import json
+import os
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from github_api import DEFAULT_REPO, GitHubAPI
+
+# Runs may show up with a created_at slightly before our local dispatch time
+CLOCK_SKEW = timedelta(minutes=2)
+PER_PAGE = 100
+MAX_PAGES = 10
+TOKEN_PATTERN = re.compile(r'rq-[0-9a-f]{16}')
+
+def new_token() -> str:
+    """Unique correlation token for one dispatch"""
+    return f"rq-{uuid.uuid4().hex[:16]}"
+
+def parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+class RunResolver:
+    """Resolves batches of correlation tokens to workflow runs"""
+
+    def __init__(self, repo: str = DEFAULT_REPO, api: Optional[GitHubAPI] = None):
+        self.repo = repo
+        self.api = api or GitHubAPI()
+        self.pending = {}
+        self.resolved = {}
+        self.since = None
+        self.queries = 0
+
+    def add(self, token: str, dispatched_at: Optional[str] = None):
+        """Track a token; the oldest dispatch time bounds the created>= filter"""
+        if token in self.resolved:
+            return
+        when = parse_time(dispatched_at) if dispatched_at else datetime.now(timezone.utc)
+        self.pending[token] = when
+        if self.since is None or when < self.since:
+            self.since = when
+
+    def poll(self) -> Dict[str, Dict[str, Any]]:
+        """One pass over runs created since the oldest pending dispatch; returns newly resolved"""
+        if not self.pending:
+            return {}
+
+        since = (self.since - CLOCK_SKEW).strftime('%Y-%m-%dT%H:%M:%SZ')
+        found = {}
+        for page in range(1, MAX_PAGES + 1):
+            response = self.api.get(f"/repos/{self.repo}/actions/runs?event=workflow_dispatch"
+                                    f"&created=%3E%3D{since}&per_page={PER_PAGE}&page={page}")
+            self.queries += 1
+            if not response.ok:
+                raise RuntimeError(f"GitHub API returned {response.status} listing runs")
+
+            runs = (response.json() or {}).get('workflow_runs', [])
+            for run in runs:
+                title = run.get('display_title') or run.get('name') or ''
+                for token in TOKEN_PATTERN.findall(title):
+                    if token in self.pending:
+                        found[token] = {
+                            'run_id': run.get('id'),
+                            'run_url': run.get('html_url'),
+                            'run_status': run.get('status'),
+                            'run_created_at': run.get('created_at'),
+                        }
+                        del self.pending[token]
+
+            if not self.pending or len(runs) < PER_PAGE:
+                break
+
+        self.resolved.update(found)
+        # Move the watermark forward so the next poll scans fewer runs
+        self.since = min(self.pending.values()) if self.pending else None
+        return found
+
+    def resolve(self, timeout: float = 60.0, interval: float = 5.0) -> Dict[str, Dict[str, Any]]:
+        """Poll until every token is resolved or timeout expires"""
+        deadline = time.monotonic() + timeout
+        while self.pending:
+            self.poll()
+            if not self.pending or time.monotonic() >= deadline:
+                break
+            time.sleep(interval)
+        return self.resolved
+
+def resolve_results(results: Iterable[Dict[str, Any]], resolver: RunResolver,
+                    timeout: float = 60.0, interval: float = 5.0) -> List[Dict[str, Any]]:
+    """Attach run_id/run_url to dispatcher results that carry a relayq_id"""
+    results = list(results)
+    for result in results:
+        if result.get('status') == 'dispatched' and result.get('relayq_id'):
+            resolver.add(result['relayq_id'], result.get('dispatched_at'))
+
+    try:
+        resolved = resolver.resolve(timeout, interval)
+    except (OSError, http.client.HTTPException, RuntimeError, ValueError) as e:
+        print(f"Warning: run resolution stopped early: {e}", file=sys.stderr)
+        resolved = resolver.resolved
+
+    for result in results:
+        run = resolved.get(result.get('relayq_id'))
+        if run:
+            result.update(run)
+    return results
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="Resolve RelayQ correlation tokens to run IDs")
+    parser.add_argument('--repo', default=DEFAULT_REPO)
+    parser.add_argument('--api-url', help="GitHub API base URL (e.g. a local fake server)")
+    parser.add_argument('--timeout', type=float, default=60.0, help="Give up after this many seconds")
+    parser.add_argument('--interval', type=float, default=5.0, help="Seconds between polls")
+    args = parser.parse_args()
+
+    results = []
+    for line in sys.stdin:
+        if line.strip():
+            results.append(json.loads(line))
+
+    resolver = RunResolver(args.repo, GitHubAPI(base_url=args.api_url))
+    results = resolve_results(results, resolver, args.timeout, args.interval)
+    for result in results:
+        print(json.dumps(result))
+
+    unresolved = len(resolver.pending)
+    print(f"Resolved {len(resolver.resolved)} runs with {resolver.queries} API queries"
+          f"{f', {unresolved} unresolved' if unresolved else ''}", file=sys.stderr)
+    sys.exit(1 if unresolved else 0)
+
+if __name__ == "__main__":
+    main()
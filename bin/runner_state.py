@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+RelayQ Runner State Cache
+
+Polls the GitHub self-hosted runners endpoint on an interval and keeps the
+latest snapshot in a local JSON file. select_target.py, routerd and the
+dashboard read that file instead of calling GitHub themselves.
+
+Polling uses conditional requests (If-None-Match), so an unchanged runner
+list costs a 304 and no rate limit.
+
+Usage:
+    runner_state.py poll [--interval SECONDS] [--once] [--api-url URL]
+    runner_state.py show
+"""
+
+import argparse
+import http.client
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from github_api import DEFAULT_REPO, GitHubAPI
+
+DEFAULT_STATE_PATH = os.path.expanduser(
+    os.environ.get('RELAYQ_RUNNER_STATE') or '~/.cache/relayq/runners.json')
+DEFAULT_INTERVAL = int(os.environ.get('RELAYQ_RUNNER_POLL_INTERVAL', 30))
+# Snapshots older than this are ignored by routing (poller presumably down)
+DEFAULT_MAX_AGE = int(os.environ.get('RELAYQ_RUNNER_STATE_MAX_AGE', 300))
+# A failed poll: network errors, truncated responses (IncompleteRead is no OSError), bad status or JSON
+POLL_ERRORS = (OSError, http.client.HTTPException, RuntimeError, ValueError)
+
+def summarize_runners(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Reduce the API payload to what routing and the dashboard need"""
+    return [
+        {
+            "name": r.get('name', 'Unknown'),
+            "status": "online" if r.get('status') == 'online' else "offline",
+            "busy": r.get('busy', False),
+            "labels": [l['name'] for l in r.get('labels', [])]
+        }
+        for r in payload.get('runners', [])
+    ]
+
+def write_state(path: str, state: Dict[str, Any]):
+    """Atomically replace the snapshot file so readers never see a partial write"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+class RunnerStatePoller:
+    """Fetches the runner list with ETag revalidation and publishes snapshots"""
+
+    def __init__(self, repo: str = DEFAULT_REPO, state_path: str = DEFAULT_STATE_PATH,
+                 api: Optional[GitHubAPI] = None):
+        self.repo = repo
+        self.state_path = state_path
+        self.api = api or GitHubAPI()
+        self.state = read_runner_state(state_path) or {}
+
+    def poll_once(self) -> Dict[str, Any]:
+        """One conditional fetch; returns the current snapshot"""
+        response = self.api.get(f"/repos/{self.repo}/actions/runners?per_page=100",
+                                etag=self.state.get('etag'))
+
+        now = time.time()
+        if response.status == 304:
+            self.state['checked_at'] = now
+            self.state['not_modified'] = self.state.get('not_modified', 0) + 1
+        elif response.ok:
+            self.state = {
+                'repo': self.repo,
+                'etag': response.headers.get('etag'),
+                'fetched_at': now,
+                'checked_at': now,
+                'not_modified': 0,
+                'runners': summarize_runners(response.json() or {}),
+            }
+        else:
+            raise RuntimeError(f"GitHub API returned {response.status} for runners: {response.data[:200]!r}")
+
+        self.state['rate_limit'] = self.api.rate_limit
+        write_state(self.state_path, self.state)
+        return self.state
+
+    def try_poll(self) -> Optional[Dict[str, Any]]:
+        """poll_once, but warn and keep the last good snapshot on errors; None if it failed"""
+        try:
+            return self.poll_once()
+        except POLL_ERRORS as e:
+            print(f"Warning: runner poll failed: {e}", file=sys.stderr)
+            self.api.close()
+            return None
+
+    def run(self, interval: float = DEFAULT_INTERVAL):
+        """Poll forever, keeping the last good snapshot on errors"""
+        while True:
+            self.try_poll()
+            time.sleep(interval)
+
+_read_cache = {}
+
+def read_runner_state(path: str = DEFAULT_STATE_PATH, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Latest snapshot, or None if missing or older than max_age seconds.
+
+    Parsed snapshots are memoized by file mtime, so long-lived readers
+    (routerd, the dashboard) only re-parse after the poller writes.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    cached = _read_cache.get(path)
+    if cached and cached[0] == mtime:
+        state = cached[1]
+    else:
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        _read_cache[path] = (mtime, state)
+
+    if max_age is not None and time.time() - state.get('checked_at', 0) > max_age:
+        return None
+    return state
+
+def runner_availability(state: Dict[str, Any], labels: List[str]) -> Dict[str, Dict[str, int]]:
+    """Online/busy runner counts for each policy label (e.g. macmini, rpi4)"""
+    availability = {label: {'online': 0, 'busy': 0} for label in labels}
+    for runner in state.get('runners', []):
+        if runner.get('status') != 'online':
+            continue
+        for label in runner.get('labels', []):
+            if label in availability:
+                availability[label]['online'] += 1
+                if runner.get('busy'):
+                    availability[label]['busy'] += 1
+    return availability
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="RelayQ runner state cache")
+    sub = parser.add_subparsers(dest='command')
+
+    poll = sub.add_parser('poll', help="Poll GitHub and keep the snapshot fresh")
+    poll.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help="Seconds between polls")
+    poll.add_argument('--once', action='store_true', help="Poll once and exit")
+    poll.add_argument('--repo', default=DEFAULT_REPO)
+    poll.add_argument('--api-url', help="GitHub API base URL (e.g. a local stub server)")
+    poll.add_argument('--state', default=DEFAULT_STATE_PATH, help="Snapshot file path")
+
+    show = sub.add_parser('show', help="Print the cached snapshot")
+    show.add_argument('--state', default=DEFAULT_STATE_PATH, help="Snapshot file path")
+
+    args = parser.parse_args()
+
+    if args.command == 'poll':
+        poller = RunnerStatePoller(args.repo, args.state, GitHubAPI(base_url=args.api_url))
+        if args.once:
+            try:
+                state = poller.poll_once()
+            except POLL_ERRORS as e:
+                print(f"Error: runner poll failed: {e}", file=sys.stderr)
+                sys.exit(1)
+            print(json.dumps(state, indent=2))
+        else:
+            try:
+                poller.run(args.interval)
+            except KeyboardInterrupt:
+                pass
+
+    elif args.command == 'show':
+        state = read_runner_state(args.state)
+        if state is None:
+            print(f"Error: no runner state at {args.state}", file=sys.stderr)
+            sys.exit(1)
+        age = time.time() - state.get('checked_at', 0)
+        print(json.dumps(dict(state, age_seconds=round(age, 1),
+                              checked=datetime.fromtimestamp(state.get('checked_at', 0)).isoformat()), indent=2))
+
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+RelayQ Capacity Scheduler
+
+Places jobs on runners using the capacities declared in policy.yaml:
+`runner_capabilities.<runner>.max_concurrent_jobs`, per-route
+`constraints.max_concurrent`, `min_memory_gb` and `needs_ffmpeg`.
+
+In-flight jobs are counted per runner; once the preferred runner is
+saturated, jobs spill over to the route's fallback runners. When every
+eligible runner is full, the job goes to the least-loaded one (relative to
+its declared capacity) and is marked saturated, since GitHub will queue it.
+
+A runner_state.py snapshot can be folded in with apply_runner_state():
+runners with no online registration are skipped and busy registrations
+count towards in-flight load. Likewise apply_ledger() folds in the jobs
+job_ledger.py records as dispatched or running, so placements made by
+earlier processes still count.
+
+Jobs that carry a size_mb are placed on the runner with the earliest
+expected finish time: queue wait plus size_mb divided by the runner's
+throughput (see throughput.py). The per-runner estimates are returned with
+the decision so placements can be audited.
+"""
+
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from runner_state import runner_availability
+from select_target import RUNNER_WORKFLOWS, compile_policy, evaluate_constraints
+from throughput import DEFAULT_BACKEND, DEFAULT_MODEL, ThroughputTable
+
+# Assumed remaining seconds for a busy runner slot we did not place ourselves
+DEFAULT_BUSY_SECONDS = 300.0
+
+class CapacityScheduler:
+    """Tracks in-flight jobs per runner and enforces declared limits"""
+
+    def __init__(self, policy: Dict[str, Any], throughput: Optional[ThroughputTable] = None):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.in_flight_by_route = {}
+        self.backlog = {}
+        self.availability = {}
+        self.recorded = {}
+        self.throughput = throughput or ThroughputTable.from_policy(policy)
+        self.update_policy(policy)
+
+    def update_policy(self, policy: Dict[str, Any]):
+        """Swap in a new policy, keeping the current in-flight counts"""
+        compiled = compile_policy(policy)
+        capabilities = policy.get('runner_capabilities', {}) or {}
+        with self.lock:
+            self.compiled = compiled
+            self.capabilities = capabilities
+            self.throughput.load_priors(policy)
+
+    def apply_runner_state(self, state: Optional[Dict[str, Any]]):
+        """Use a runner_state snapshot for online/busy information (None clears it)"""
+        availability = {}
+        if state:
+            labels = sorted(set(self.capabilities) | set(RUNNER_WORKFLOWS))
+            availability = runner_availability(state, labels)
+        with self.lock:
+            self.availability = availability
+
+    def apply_ledger(self, counts: Optional[Dict[str, Dict[str, int]]]):
+        """Use job_ledger in-flight counts ({runner: {job_type: n}}) as a load floor"""
+        with self.lock:
+            self.recorded = counts or {}
+
+    def is_online(self, runner: str) -> bool:
+        """Unknown runners are assumed online"""
+        info = self.availability.get(runner)
+        return info is None or info['online'] > 0
+
+    def load(self, runner: str) -> int:
+        """In-flight jobs: our own placements, GitHub's busy count or the ledger, whichever is highest"""
+        observed = self.availability.get(runner, {}).get('busy', 0)
+        recorded = sum(self.recorded.get(runner, {}).values())
+        return max(self.in_flight.get(runner, 0), observed, recorded)
+
+    def runner_limit(self, runner: str) -> int:
+        """Maximum concurrent jobs a runner accepts across all routes"""
+        return int(self.capabilities.get(runner, {}).get('max_concurrent_jobs', 1))
+
+    def eligible_runners(self, job_type: str, job_params: Dict[str, Any]) -> Tuple[List[Tuple[str, str]], Optional[str]]:
+        """Candidates (runner, workflow) that satisfy the route's constraints, in preference order"""
+        route = self.compiled.get(job_type)
+        if route is None:
+            return [], f"Unknown job type: {job_type}"
+
+        constraints = route['constraints']
+        if not evaluate_constraints(constraints, job_params):
+            return [], f"Job does not meet route constraints for {job_type}"
+
+        candidates = [
+            (runner, workflow) for runner, workflow in route['candidates']
+            if evaluate_constraints(constraints, job_params, self.capabilities.get(runner))
+        ]
+        if route['candidates'] and not candidates:
+            return [], f"No runner satisfies the constraints for {job_type}"
+        return candidates, None
+
+    def route_slots(self, runner: str, job_type: str) -> int:
+        """Slots this job type can use on runner: the runner's, capped by the route's max_concurrent"""
+        route_limit = self.compiled[job_type]['constraints'].get('max_concurrent')
+        limit = self.runner_limit(runner)
+        return min(limit, int(route_limit)) if route_limit is not None else limit
+
+    def has_capacity(self, runner: str, job_type: str) -> bool:
+        """True if the runner can start another job of this type right now"""
+        if self.load(runner) >= self.runner_limit(runner):
+            return False
+        route_limit = self.compiled[job_type]['constraints'].get('max_concurrent')
+        route_load = max(self.in_flight_by_route.get((runner, job_type), 0),
+                         self.recorded.get(runner, {}).get(job_type, 0))
+        if route_limit is not None and route_load >= route_limit:
+            return False
+        return True
+
+    def load_ratio(self, runner: str) -> float:
+        """In-flight jobs relative to the runner's declared capacity"""
+        return self.load(runner) / max(self.runner_limit(runner), 1)
+
+    def queue_wait(self, runner: str, job_type: str) -> float:
+        """Seconds until a slot this job type may use frees up.
+
+        Outstanding work is spread over the runner's slots; when the route
+        caps the job type below that, its own outstanding work is spread
+        over the route's slots too, and the longer wait wins.
+        """
+        now = time.monotonic()
+        entries = self.backlog.get(runner, [])
+
+        def remaining(items):
+            return sum(max(seconds - (now - placed_at), 0.0) for placed_at, seconds, _ in items)
+
+        unplaced_busy = max(self.load(runner) - self.in_flight.get(runner, 0), 0)
+        wait = (remaining(entries) + unplaced_busy * DEFAULT_BUSY_SECONDS) / max(self.runner_limit(runner), 1)
+
+        slots = self.route_slots(runner, job_type)
+        if slots < self.runner_limit(runner):
+            own = [e for e in entries if e[2] == job_type]
+            unplaced_own = max(self.recorded.get(runner, {}).get(job_type, 0) -
+                               self.in_flight_by_route.get((runner, job_type), 0), 0)
+            wait = max(wait, (remaining(own) + unplaced_own * DEFAULT_BUSY_SECONDS) / max(slots, 1))
+        return wait
+
+    def estimate(self, runner: str, job_type: str, job_params: Dict[str, Any]) -> Dict[str, float]:
+        """Expected wait, run and finish seconds for this job on runner"""
+        run_s = self.throughput.estimate_seconds(
+            runner, float(job_params.get('size_mb') or 0),
+            job_params.get('backend') or DEFAULT_BACKEND, job_params.get('model') or DEFAULT_MODEL)
+        wait_s = 0.0 if self.has_capacity(runner, job_type) else self.queue_wait(runner, job_type)
+        return {'wait_s': round(wait_s, 1), 'run_s': round(run_s, 1), 'finish_s': round(wait_s + run_s, 1)}
+
+    def place(self, job_type: str, job_params: Dict[str, Any], acquire: bool = True) -> Dict[str, Any]:
+        """Choose a runner for one job; with acquire, count it as in flight"""
+        with self.lock:
+            candidates, error = self.eligible_runners(job_type, job_params)
+            if error:
+                return {'error': error}
+
+            route = self.compiled[job_type]
+            if not candidates:
+                # Route without runner preferences goes to the pooled workflow
+                return {'workflow': route['workflow'], 'runner': None, 'saturated': False}
+
+            offline = False
+            online = [c for c in candidates if self.is_online(c[0])]
+            if online:
+                candidates = online
+            else:
+                # Nothing online: keep preference order, GitHub queues the job
+                offline = True
+
+            estimates = {runner: self.estimate(runner, job_type, job_params) for runner, _ in candidates}
+
+            if job_params.get('size_mb'):
+                # Earliest expected finish; preference order breaks ties
+                order = {c[0]: i for i, c in enumerate(candidates)}
+                choice = min(candidates, key=lambda c: (estimates[c[0]]['finish_s'], order[c[0]]))
+            else:
+                choice = next((c for c in candidates if self.has_capacity(c[0], job_type)), None)
+                if choice is None:
+                    choice = min(candidates, key=lambda c: self.load_ratio(c[0]))
+
+            runner, workflow = choice
+            saturated = not self.has_capacity(runner, job_type)
+            if acquire:
+                self.acquire(runner, job_type, estimates[runner]['run_s'])
+
+            return {
+                'workflow': workflow,
+                'runner': runner,
+                'in_flight': self.load(runner),
+                'saturated': saturated,
+                'offline': offline,
+                'estimates': estimates,
+            }
+
+    def acquire(self, runner: str, job_type: str, seconds: float = 0.0):
+        """Count one more in-flight job (caller holds the lock or owns the scheduler)"""
+        self.in_flight[runner] = self.in_flight.get(runner, 0) + 1
+        self.backlog.setdefault(runner, []).append((time.monotonic(), seconds, job_type))
+        key = (runner, job_type)
+        self.in_flight_by_route[key] = self.in_flight_by_route.get(key, 0) + 1
+
+    def release(self, runner: str, job_type: str):
+        """Mark one in-flight job on runner as finished"""
+        with self.lock:
+            if self.in_flight.get(runner, 0) > 0:
+                self.in_flight[runner] -= 1
+            entries = self.backlog.get(runner)
+            if entries:
+                # Oldest placement of this job type, else the oldest overall
+                index = next((i for i, e in enumerate(entries) if e[2] == job_type), 0)
+                entries.pop(index)
+            key = (runner, job_type)
+            if self.in_flight_by_route.get(key, 0) > 0:
+                self.in_flight_by_route[key] -= 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Current load per runner, for status output"""
+        with self.lock:
+            return {
+                runner: {
+                    'in_flight': self.load(runner),
+                    'max_concurrent_jobs': self.runner_limit(runner),
+                    'online': self.is_online(runner),
+                }
+                for runner in set(self.capabilities) | set(self.in_flight)
+            }
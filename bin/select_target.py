@@ -7,12 +7,26 @@ Selects the appropriate workflow file based on policy.yaml and job parameters.
 
 import sys
 import json
-import yaml
 import os
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple, Iterable, Iterator, TextIO
+
+DEFAULT_POLICY_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'policy', 'policy.yaml')
+
+POOLED_WORKFLOW = ".github/workflows/transcribe_audio.yml"
+
+# Runner label -> runner-specific workflow
+RUNNER_WORKFLOWS = {
+    'macmini': ".github/workflows/transcribe_mac.yml",
+    'rpi4': ".github/workflows/transcribe_rpi.yml",
+    # RPi3 would use a very light workflow if we had one
+    'rpi3': ".github/workflows/transcribe_rpi.yml",
+}
 
 def load_policy(policy_path: str = "policy/policy.yaml") -> Dict[str, Any]:
     """Load routing policy from YAML file"""
+    # Imported lazily so daemon clients never pay the PyYAML import
+    import yaml
+
     try:
         with open(policy_path, 'r') as f:
             return yaml.safe_load(f)
@@ -23,8 +37,9 @@ def load_policy(policy_path: str = "policy/policy.yaml") -> Dict[str, Any]:
         print(f"Error parsing policy file: {e}", file=sys.stderr)
         sys.exit(1)
 
-def evaluate_constraints(constraints: Dict[str, Any], job_params: Dict[str, Any]) -> bool:
-    """Check if job meets all constraints"""
+def evaluate_constraints(constraints: Dict[str, Any], job_params: Dict[str, Any],
+                         runner_caps: Optional[Dict[str, Any]] = None) -> bool:
+    """Check if job meets all constraints (and, given runner_caps, fits that runner)"""
 
     # Check file size constraint
     if 'max_size_mb' in constraints:
@@ -32,18 +47,75 @@ def evaluate_constraints(constraints: Dict[str, Any], job_params: Dict[str, Any]
         if job_size > constraints['max_size_mb']:
             return False
 
-    # Check memory constraint (would need runner info in real implementation)
-    if 'min_memory_gb' in constraints:
-        # For now, assume we meet memory requirements
-        pass
+    # Check memory constraint against the runner's declared memory
+    if 'min_memory_gb' in constraints and runner_caps is not None:
+        if runner_caps.get('memory_gb', 0) < constraints['min_memory_gb']:
+            return False
 
-    # Check FFmpeg requirement
+    # Check FFmpeg requirement (runners without a capabilities entry are
+    # assumed to have FFmpeg installed per setup docs)
     if 'needs_ffmpeg' in constraints and constraints['needs_ffmpeg']:
-        # Assume runners have FFmpeg installed per setup docs
-        pass
+        if runner_caps is not None and not runner_caps.get('supports_ffmpeg', True):
+            return False
 
     return True
 
+def compile_route(route: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a policy route into the lookup table used at query time"""
+
+    constraints = route.get('constraints', {}) or {}
+    prefer = route.get('prefer', []) or []
+    fallback = route.get('fallback', []) or []
+
+    # Preferred runners first, then fallbacks; unknown labels are skipped
+    candidates = []
+    for runner in list(prefer) + list(fallback):
+        if runner in RUNNER_WORKFLOWS and runner not in [c[0] for c in candidates]:
+            candidates.append((runner, RUNNER_WORKFLOWS[runner]))
+
+    if not prefer and not fallback:
+        # If no specific preferences, use pooled workflow
+        workflow = POOLED_WORKFLOW
+    elif candidates:
+        workflow = candidates[0][1]
+    else:
+        # Default to pooled workflow
+        workflow = POOLED_WORKFLOW
+
+    return {
+        'constraints': constraints,
+        'candidates': candidates,
+        'workflow': workflow,
+    }
+
+def compile_policy(policy: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Compile every route in the policy once, keyed by job type"""
+    return {
+        job_type: compile_route(route or {})
+        for job_type, route in (policy.get('routes', {}) or {}).items()
+    }
+
+def route_job(job_type: str, job_params: Dict[str, Any], compiled: Dict[str, Dict[str, Any]]) -> Tuple[Optional[str], Optional[str]]:
+    """Route one job against a compiled policy, returning (workflow, error)"""
+
+    route = compiled.get(job_type)
+    if route is None:
+        return None, f"Unknown job type: {job_type}"
+
+    # First, check if job meets constraints
+    if not evaluate_constraints(route['constraints'], job_params):
+        return None, f"Job does not meet route constraints for {job_type}"
+
+    return route['workflow'], None
+
+def select_compiled(job_type: str, job_params: Dict[str, Any], compiled: Dict[str, Dict[str, Any]]) -> Optional[str]:
+    """Select workflow from a compiled policy (see compile_policy)"""
+
+    workflow, error = route_job(job_type, job_params, compiled)
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+    return workflow
+
 def select_workflow(job_type: str, job_params: Dict[str, Any], policy: Dict[str, Any]) -> Optional[str]:
     """Select appropriate workflow based on policy"""
 
@@ -51,51 +123,192 @@ def select_workflow(job_type: str, job_params: Dict[str, Any], policy: Dict[str,
         print(f"Error: Unknown job type: {job_type}", file=sys.stderr)
         return None
 
-    route = policy['routes'][job_type]
+    compiled = {job_type: compile_route(policy['routes'][job_type] or {})}
+    return select_compiled(job_type, job_params, compiled)
 
-    # First, check if job meets constraints
-    if not evaluate_constraints(route.get('constraints', {}), job_params):
-        print(f"Error: Job does not meet route constraints for {job_type}", file=sys.stderr)
+def job_error(job: Dict[str, Any], params: Any) -> Optional[str]:
+    """Per-job error for a job that cannot be routed at all, else None"""
+    if 'parse_error' in job:
+        return f"Error parsing job: {job['parse_error']}"
+    if not isinstance(job.get('job_type'), str):
+        return f"Invalid job_type: {json.dumps(job.get('job_type'))} (must be a string)"
+    if not isinstance(params, dict):
+        return "Invalid params: must be a JSON object"
+    size_mb = params.get('size_mb', 0)
+    # bool is an int subclass, but true/false is no size
+    if isinstance(size_mb, bool) or not isinstance(size_mb, (int, float)):
+        return f"Invalid size_mb: {json.dumps(size_mb)} (must be a number)"
+    return None
+
+def new_decision(job: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """Decision skeleton for one batch job.
+
+    job_key is the job's ledger key: dispatcher.py passes it through to its
+    result, so job_ledger.py record-decisions and record-dispatches update
+    the same row.
+    """
+    from job_ledger import ledger_key
+
+    decision = {'id': job.get('id', index), 'job_type': job.get('job_type'), 'job_key': ledger_key(job)}
+    if job.get('relayq_id'):
+        decision['relayq_id'] = job['relayq_id']
+    if 'inputs' in job:
+        # Workflow inputs ride along so decisions can be piped to dispatcher.py
+        decision['inputs'] = job['inputs']
+    return decision
+
+def route_batch(jobs: Iterable[Dict[str, Any]], compiled: Dict[str, Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Route a stream of jobs, yielding one decision per job in input order.
+
+    Route lookup and the job-independent constraints are evaluated once per
+    job_type group; each job then only pays its own size check.
+    """
+
+    groups = {}
+    for index, job in enumerate(jobs):
+        job_type = job.get('job_type')
+        params = job.get('params')
+        if params is None:
+            params = {k: v for k, v in job.items() if k not in ('id', 'job_type', 'inputs', 'job_key', 'relayq_id')}
+
+        decision = new_decision(job, index)
+        error = job_error(job, params)
+        if error:
+            # Before the group lookup: an unhashable job_type must not abort the stream
+            decision['error'] = error
+            yield decision
+            continue
+
+        group = groups.get(job_type)
+        if group is None:
+            route = compiled.get(job_type)
+            if route is None:
+                group = (None, f"Unknown job type: {job_type}", None)
+            else:
+                static = {k: v for k, v in route['constraints'].items() if k != 'max_size_mb'}
+                if evaluate_constraints(static, {}):
+                    group = (route['workflow'], None, route['constraints'].get('max_size_mb'))
+                else:
+                    group = (None, f"Job does not meet route constraints for {job_type}", None)
+            groups[job_type] = group
+
+        workflow, error, max_size_mb = group
+        if not error and max_size_mb is not None and params.get('size_mb', 0) > max_size_mb:
+            workflow, error = None, f"Job does not meet route constraints for {job_type}"
+
+        if error:
+            decision['error'] = error
+        else:
+            decision['workflow'] = workflow
+        yield decision
+
+def read_jobs(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    """Parse JSONL jobs, turning malformed lines into jobs that fail routing"""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except json.JSONDecodeError as e:
+            job = {'job_type': None, 'params': {}, 'parse_error': str(e)}
+        if not isinstance(job, dict):
+            job = {'job_type': None, 'params': {}, 'parse_error': "job must be a JSON object"}
+        yield job
+
+def place_batch(jobs: Iterable[Dict[str, Any]], policy: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Like route_batch, but spreads jobs across runners by declared capacity"""
+
+    from job_ledger import open_ledger
+    from runner_state import DEFAULT_MAX_AGE, read_runner_state
+    from scheduler import CapacityScheduler
+
+    scheduler = CapacityScheduler(policy)
+    scheduler.apply_runner_state(read_runner_state(max_age=DEFAULT_MAX_AGE))
+    ledger = open_ledger()
+    if ledger:
+        scheduler.apply_ledger(ledger.in_flight_by_runner())
+    for index, job in enumerate(jobs):
+        params = job.get('params')
+        if params is None:
+            params = {k: v for k, v in job.items() if k not in ('id', 'job_type', 'inputs', 'job_key', 'relayq_id')}
+        decision = new_decision(job, index)
+        error = job_error(job, params)
+        if error:
+            decision['error'] = error
+        else:
+            decision.update(scheduler.place(job.get('job_type'), params))
+        yield decision
+
+def run_batch(policy: Dict[str, Any], stream_in: TextIO, stream_out: TextIO, capacity: bool = False) -> int:
+    """Route JSONL jobs from stream_in to JSONL decisions on stream_out"""
+
+    if capacity:
+        decisions = place_batch(read_jobs(stream_in), policy)
+    else:
+        decisions = route_batch(read_jobs(stream_in), compile_policy(policy))
+
+    failed = 0
+    for decision in decisions:
+        if 'error' in decision:
+            failed += 1
+        stream_out.write(json.dumps(decision) + '\n')
+    stream_out.flush()
+    return failed
+
+def select_live(job_type: str, job_params: Dict[str, Any], policy: Dict[str, Any]) -> Optional[str]:
+    """Select workflow using the cached runner state, if a fresh snapshot exists"""
+
+    from job_ledger import open_ledger
+    from runner_state import DEFAULT_MAX_AGE, read_runner_state
+    from scheduler import CapacityScheduler
+
+    state = read_runner_state(max_age=DEFAULT_MAX_AGE)
+    if state is None:
+        return select_workflow(job_type, job_params, policy)
+
+    # Same inputs as routerd's select, so the daemon and this path agree
+    scheduler = CapacityScheduler(policy)
+    scheduler.apply_runner_state(state)
+    ledger = open_ledger()
+    if ledger:
+        scheduler.apply_ledger(ledger.in_flight_by_runner())
+    decision = scheduler.place(job_type, job_params, acquire=False)
+    if 'error' in decision:
+        print(f"Error: {decision['error']}", file=sys.stderr)
         return None
+    return decision['workflow']
 
-    # Determine workflow based on preferences and fallbacks
-    prefer = route.get('prefer', [])
-    fallback = route.get('fallback', [])
+def query_daemon(job_type: str, job_params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Ask a running routerd for a decision; None if no daemon is listening"""
 
-    # If no specific preferences, use pooled workflow
-    if not prefer and not fallback:
-        return ".github/workflows/transcribe_audio.yml"
-
-    # Check preferences for specific runner targeting
-    if prefer:
-        for runner in prefer:
-            if runner == 'macmini':
-                return ".github/workflows/transcribe_mac.yml"
-            elif runner == 'rpi4':
-                return ".github/workflows/transcribe_rpi.yml"
-            elif runner == 'rpi3':
-                # RPi3 would use a very light workflow if we had one
-                return ".github/workflows/transcribe_rpi.yml"  # Fallback to RPi4 workflow
-
-    # Check fallbacks
-    if fallback:
-        for runner in fallback:
-            if runner == 'rpi4':
-                return ".github/workflows/transcribe_rpi.yml"
-            elif runner == 'macmini':
-                return ".github/workflows/transcribe_mac.yml"
-
-    # Default to pooled workflow
-    return ".github/workflows/transcribe_audio.yml"
+    address = os.environ.get('RELAYQ_ROUTER_SOCKET', '')
+    if not address:
+        return None
+
+    from routerd import RouterClient
+
+    try:
+        with RouterClient(address) as client:
+            return client.query(job_type, job_params)
+    except OSError:
+        return None
 
 def main():
     """Main entry point"""
 
     if len(sys.argv) < 2:
         print("Usage: select_target.py <job_type> [job_params_json]", file=sys.stderr)
+        print("       select_target.py --batch [--capacity] < jobs.jsonl > decisions.jsonl", file=sys.stderr)
         print("Example: select_target.py transcribe '{\"url\": \"https://example.com/file.mp3\", \"size_mb\": 50}'", file=sys.stderr)
         sys.exit(1)
 
+    # Batch mode: one process routes the whole JSONL stream
+    if sys.argv[1] == '--batch':
+        policy = load_policy(DEFAULT_POLICY_PATH)
+        failed = run_batch(policy, sys.stdin, sys.stdout, capacity='--capacity' in sys.argv[2:])
+        sys.exit(1 if failed else 0)
+
     job_type = sys.argv[1]
     job_params = {}
 
@@ -107,12 +320,20 @@ def main():
             print(f"Error parsing job parameters: {e}", file=sys.stderr)
             sys.exit(1)
 
+    # Use the resident routing daemon when one is configured
+    reply = query_daemon(job_type, job_params)
+    if reply is not None:
+        if reply.get('workflow'):
+            print(reply['workflow'])
+            sys.exit(0)
+        print(f"Error: {reply.get('error', 'no workflow selected')}", file=sys.stderr)
+        sys.exit(1)
+
     # Load policy
-    policy_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'policy', 'policy.yaml')
-    policy = load_policy(policy_path)
+    policy = load_policy(DEFAULT_POLICY_PATH)
 
     # Select workflow
-    workflow = select_workflow(job_type, job_params, policy)
+    workflow = select_live(job_type, job_params, policy)
 
     if workflow:
         print(workflow)
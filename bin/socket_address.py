@@ -0,0 +1,15 @@
+"""
+RelayQ Socket Addresses
+
+Address parsing shared by the resident daemons (routerd, whisperd) and
+their clients, kept separate so importing it loads nothing else.
+"""
+
+from typing import Tuple, Union
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """'host:port' or ':port' -> TCP address, anything else is a socket path"""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and '/' not in address:
+        return (host or '127.0.0.1', int(port))
+    return address
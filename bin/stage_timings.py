@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+RelayQ Stage Timings
+
+transcribe.sh appends one JSON event per stage to RELAYQ_TIMINGS:
+
+    {"event": "stage", "stage": "download", "status": "ok", "seconds": 12.4,
+     "runner": "macmini", "at": 1760000000.0, "bytes": 52428800,
+     "audio_s": 3600.0, "rtf": 0.0034, "mb_per_s": 4.03, "run_id": "..."}
+
+Stages: download, convert, model_download, inference (one event per backend
+attempt, with backend/engine/model), stream, and total (the whole job, with
+the size of the original input).
+
+The report aggregates events per runner and stage, names the stage each
+runner spends most of its time in, and gives its capacity in audio hours per
+wall-clock hour. `learn` feeds finished jobs into the throughput table
+(throughput.py) that the scheduler's completion-time estimates come from.
+
+Logs from several runners can be merged by passing each file; events are
+de-duplicated. The transcribe workflows upload each run's events as a
+relayq-timings-* artifact; `collect` appends new ones to the collected log
+on the dispatch host and learns from them (routerd runs it every
+--collect-interval seconds, and reloads the throughput table it writes).
+
+Usage:
+    stage_timings.py emit --stage S --started T --status ok|failed [--bytes-of FILE] [--audio FILE]
+                          [--stats-json FILE] [--backend B] [--engine E] [--model M]
+    stage_timings.py report [--json] [FILE ...]
+    stage_timings.py learn [FILE ...]
+    stage_timings.py collect [--repo OWNER/REPO]
+"""
+
+import argparse
+import http.client
+import io
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import wave
+import zipfile
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_TIMINGS_PATH = os.path.expanduser(
+    os.environ.get('RELAYQ_TIMINGS') or '~/.cache/relayq/timings.jsonl')
+# Last event time learned per runner, so re-running `learn` adds nothing twice
+DEFAULT_CURSOR_PATH = os.path.expanduser(
+    os.environ.get('RELAYQ_TIMINGS_CURSOR') or '~/.cache/relayq/timings_learned.json')
+# Events collected from other runners' workflow artifacts, and the artifacts already read
+DEFAULT_COLLECTED_PATH = os.path.expanduser(
+    os.environ.get('RELAYQ_TIMINGS_COLLECTED') or '~/.cache/relayq/timings_collected.jsonl')
+DEFAULT_ARTIFACTS_PATH = os.path.expanduser(
+    os.environ.get('RELAYQ_TIMINGS_ARTIFACTS') or '~/.cache/relayq/timings_artifacts.json')
+COLLECT_INTERVAL_S = float(os.environ.get('RELAYQ_TIMINGS_COLLECT', '900'))
+ARTIFACT_PREFIX = 'relayq-timings-'
+# Artifact listing pages (100 each, newest first) read per collect, and artifact IDs remembered
+COLLECT_PAGES = 3
+KEEP_ARTIFACTS = 2000
+FFMPEG = os.environ.get('RELAYQ_FFMPEG', 'ffmpeg')
+FFPROBE = os.environ.get('RELAYQ_FFPROBE', 'ffprobe')
+
+STAGES = ('download', 'model_download', 'convert', 'stream', 'inference', 'total')
+
+def default_runner() -> str:
+    return os.environ.get('RELAYQ_RUNNER') or os.environ.get('RUNNER_NAME') or socket.gethostname()
+
+def audio_seconds(path: str) -> Optional[float]:
+    """Duration from the WAV header, else ffprobe; None if unknown"""
+    try:
+        with wave.open(path, 'rb') as f:
+            return f.getnframes() / float(f.getframerate())
+    except (OSError, EOFError, wave.Error):
+        pass
+    try:
+        result = subprocess.run([FFPROBE, '-v', 'error', '-show_entries', 'format=duration',
+                                 '-of', 'default=noprint_wrappers=1:nokey=1', path],
+                                capture_output=True, text=True, timeout=30)
+        return float(result.stdout.strip())
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        pass
+    # Some ffmpeg builds ship without ffprobe; the input banner has the duration too
+    try:
+        result = subprocess.run([FFMPEG, '-hide_banner', '-i', path], capture_output=True, text=True, timeout=30)
+        match = re.search(r'Duration: (\d+):(\d+):([\d.]+)', result.stderr)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def make_event(stage: str, started: float, status: str, bytes_of: Optional[str] = None,
+               audio: Optional[str] = None, runner: Optional[str] = None,
+               stats: Optional[Dict[str, Any]] = None, **labels: Optional[str]) -> Dict[str, Any]:
+    """One stage event; bytes, audio_s and the derived rates only when known.
+
+    Streamed jobs have no files to measure, so `stats` (stream_transcribe.py
+    --stats-json) can supply bytes and audio_s instead.
+    """
+    now = time.time()
+    seconds = max(now - started, 0.0)
+    stats = stats or {}
+    event = {'event': 'stage', 'stage': stage, 'status': status, 'seconds': round(seconds, 3),
+             'runner': runner or default_runner(), 'at': round(now, 3)}
+    event.update({k: v for k, v in labels.items() if v})
+    if bytes_of and os.path.isfile(bytes_of):
+        event['bytes'] = os.path.getsize(bytes_of)
+    elif stats.get('bytes'):
+        event['bytes'] = int(stats['bytes'])
+    # Rates only for stages that finished: a failed attempt's time says little
+    if event.get('bytes') and status == 'ok' and seconds > 0:
+        event['mb_per_s'] = round(event['bytes'] / 1048576.0 / seconds, 3)
+    duration = audio_seconds(audio) if audio and os.path.isfile(audio) else stats.get('audio_s')
+    if duration:
+        event['audio_s'] = round(float(duration), 1)
+        if status == 'ok':
+            event['rtf'] = round(seconds / float(duration), 4)
+    if os.environ.get('GITHUB_RUN_ID'):
+        event['run_id'] = os.environ['GITHUB_RUN_ID']
+    return event
+
+def append_event(path: str, event: Dict[str, Any]):
+    """One line per write, so concurrent jobs on a runner don't interleave"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(json.dumps(event) + '\n')
+
+def default_logs() -> List[str]:
+    """This host's log and the collected one, whichever exist"""
+    return [p for p in (DEFAULT_TIMINGS_PATH, DEFAULT_COLLECTED_PATH) if os.path.exists(p)] or [DEFAULT_TIMINGS_PATH]
+
+def read_events(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Stage events from JSONL files ('-' for stdin), skipping bad lines and duplicates"""
+    seen = set()
+    for path in paths:
+        try:
+            f = sys.stdin if path == '-' else open(path)
+        except OSError as e:
+            print(f"Warning: skipping {path}: {e}", file=sys.stderr)
+            continue
+        with f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                    float(event['seconds'])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                key = (event.get('runner'), event.get('at'), event.get('stage'), event.get('engine'))
+                if key in seen:
+                    continue
+                seen.add(key)
+                yield event
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+def build_report(events: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-runner, per-stage aggregates plus each runner's bottleneck and capacity"""
+    groups = defaultdict(list)
+    for event in events:
+        groups[(event.get('runner', 'unknown'), event.get('stage', 'unknown'))].append(event)
+
+    runners = defaultdict(lambda: {'stages': {}})
+    for (runner, stage), items in groups.items():
+        ok = [e for e in items if e.get('status') == 'ok']
+        seconds = [float(e['seconds']) for e in ok]
+        sized = [e for e in ok if e.get('bytes')]
+        rtfs = [e['rtf'] for e in ok if e.get('rtf') is not None]
+        runners[runner]['stages'][stage] = {
+            'count': len(items),
+            'failed': len(items) - len(ok),
+            'p50_s': percentile(seconds, 0.5),
+            'p95_s': percentile(seconds, 0.95),
+            'total_s': round(sum(seconds), 1),
+            'mb_per_s': round(sum(e['bytes'] for e in sized) / 1048576.0 /
+                              max(sum(float(e['seconds']) for e in sized), 1e-6), 3) if sized else None,
+            'rtf_p50': percentile(rtfs, 0.5),
+        }
+
+    for runner, entry in runners.items():
+        stages = entry['stages']
+        # Where the time goes, excluding the job total and failed attempts
+        busiest = {s: v['total_s'] for s, v in stages.items() if s != 'total' and v['total_s'] > 0}
+        entry['bottleneck'] = max(busiest, key=busiest.get) if busiest else None
+        # Audio hours per wall-clock hour for one job at a time
+        timed = [e for e in groups.get((runner, 'total'), []) if e.get('status') == 'ok' and e.get('audio_s')]
+        wall = sum(float(e['seconds']) for e in timed)
+        entry['jobs'] = len(timed)
+        entry['audio_h'] = round(sum(e['audio_s'] for e in timed) / 3600.0, 2)
+        entry['audio_h_per_h'] = round(sum(e['audio_s'] for e in timed) / wall, 2) if wall > 0 else None
+    return dict(runners)
+
+def learn(events: Iterable[Dict[str, Any]], table, cursors: Dict[str, float]) -> int:
+    """Record finished jobs newer than each runner's cursor into a ThroughputTable"""
+    used = 0
+    for event in sorted(events, key=lambda e: e.get('at', 0)):
+        runner, at = event.get('runner'), event.get('at', 0)
+        if event.get('stage') != 'total' or event.get('status') != 'ok' or not event.get('bytes'):
+            continue
+        if at <= cursors.get(runner, 0):
+            continue
+        table.record(runner, event['bytes'] / 1048576.0, float(event['seconds']),
+                     event.get('backend') or 'local', event.get('model') or 'base')
+        cursors[runner] = at
+        used += 1
+    return used
+
+def learn_files(paths: Iterable[str], cursor_path: str = DEFAULT_CURSOR_PATH) -> int:
+    """Learn from event logs into the throughput table file, advancing the cursors"""
+    # Imported here to keep emit, which runs once per stage, quick to start
+    from runner_state import write_state
+    from select_target import DEFAULT_POLICY_PATH, load_policy
+    from throughput import ThroughputTable
+
+    table = ThroughputTable.from_policy(load_policy(DEFAULT_POLICY_PATH))
+    cursors = {}
+    if os.path.exists(cursor_path):
+        with open(cursor_path) as f:
+            cursors = json.load(f)
+    used = learn(read_events(paths), table, cursors)
+    table.save()
+    write_state(cursor_path, cursors)
+    return used
+
+def download_artifact(api, repo: str, artifact_id: int) -> bytes:
+    """An artifact's zip; GitHub redirects to a short-lived storage URL"""
+    response = api.get(f"/repos/{repo}/actions/artifacts/{artifact_id}/zip")
+    if response.status in (301, 302, 303, 307) and response.headers.get('location'):
+        with urllib.request.urlopen(response.headers['location'], timeout=api.timeout) as f:
+            return f.read()
+    if not response.ok:
+        raise RuntimeError(f"artifact {artifact_id} download failed: HTTP {response.status}")
+    return response.data
+
+def artifact_lines(data: bytes) -> List[str]:
+    """Event lines from every file in an artifact zip, skipping bad lines"""
+    lines = []
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for name in archive.namelist():
+            for line in archive.read(name).decode('utf-8', 'replace').splitlines():
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(event, dict) and event.get('event') == 'stage':
+                    lines.append(json.dumps(event))
+    return lines
+
+def collect(api, repo: str, log_path: str, seen: List[int]) -> int:
+    """Append events from relayq-timings-* artifacts not in `seen` to log_path; returns events added"""
+    known = set(seen)
+    added = 0
+    for page in range(1, COLLECT_PAGES + 1):
+        response = api.get(f"/repos/{repo}/actions/artifacts?per_page=100&page={page}")
+        if not response.ok:
+            raise RuntimeError(f"listing artifacts failed: HTTP {response.status}")
+        artifacts = (response.json() or {}).get('artifacts') or []
+        timings = [a for a in artifacts if a.get('name', '').startswith(ARTIFACT_PREFIX) and not a.get('expired')]
+        for artifact in timings:
+            if artifact['id'] in known:
+                continue
+            lines = artifact_lines(download_artifact(api, repo, artifact['id']))
+            if lines:
+                os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+                with open(log_path, 'a') as f:
+                    f.write(''.join(line + '\n' for line in lines))
+            seen.append(artifact['id'])
+            added += len(lines)
+        # Listed newest first: once a page reaches artifacts read before, the rest are older
+        if len(artifacts) < 100 or any(a['id'] in known for a in timings):
+            break
+    return added
+
+class TimingsCollector:
+    """Collects runners' stage timings from workflow artifacts and learns from them, at most once per interval"""
+
+    def __init__(self, repo: Optional[str] = None, interval: float = COLLECT_INTERVAL_S,
+                 log_path: str = DEFAULT_COLLECTED_PATH, artifacts_path: str = DEFAULT_ARTIFACTS_PATH, api=None):
+        self.repo = repo
+        self.interval = interval
+        self.log_path = log_path
+        self.artifacts_path = artifacts_path
+        self.api = api
+        self.next_collect = 0.0
+
+    def maybe_collect(self) -> int:
+        """Collect and learn if the interval has passed; returns events added"""
+        now = time.monotonic()
+        if now < self.next_collect:
+            return 0
+        self.next_collect = now + self.interval
+        return self.collect()
+
+    def collect(self) -> int:
+        from github_api import DEFAULT_REPO, GitHubAPI
+        from runner_state import write_state
+
+        seen = []
+        if os.path.exists(self.artifacts_path):
+            try:
+                with open(self.artifacts_path) as f:
+                    seen = json.load(f).get('artifacts', [])
+            except (OSError, ValueError) as e:
+                print(f"Warning: ignoring unreadable {self.artifacts_path}: {e}", file=sys.stderr)
+        added = 0
+        try:
+            if self.api is None:
+                self.api = GitHubAPI()
+            added = collect(self.api, self.repo or DEFAULT_REPO, self.log_path, seen)
+        except (OSError, http.client.HTTPException, RuntimeError, ValueError, zipfile.BadZipFile) as e:
+            print(f"Warning: collecting stage timings failed: {e}", file=sys.stderr)
+            if self.api is not None:
+                self.api.close()
+        write_state(self.artifacts_path, {'artifacts': seen[-KEEP_ARTIFACTS:]})
+        try:
+            # This host's own log too, in case it also runs jobs
+            learn_files([p for p in (DEFAULT_TIMINGS_PATH, self.log_path) if os.path.exists(p)])
+        except (OSError, ValueError) as e:
+            print(f"Warning: learning from stage timings failed: {e}", file=sys.stderr)
+        return added
+
+    def run(self):
+        """Collect forever (routerd runs this in a background thread)"""
+        while True:
+            self.maybe_collect()
+            time.sleep(max(self.next_collect - time.monotonic(), 0.0))
+
+def print_report(report: Dict[str, Any]):
+    def fmt(value, width, precision):
+        return f"{value:>{width}.{precision}f}" if value is not None else f"{'-':>{width}}"
+
+    for runner, entry in sorted(report.items()):
+        print(f"{runner}: {entry['jobs']} jobs, {entry['audio_h']} audio h, "
+              f"{fmt(entry['audio_h_per_h'], 0, 1)} audio h/h, bottleneck: {entry['bottleneck'] or '-'}")
+        print(f"  {'stage':<15} {'n':>5} {'fail':>5} {'p50 s':>8} {'p95 s':>8} {'MB/s':>8} {'RTF':>7}")
+        ordered = sorted(entry['stages'], key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES))
+        for stage in ordered:
+            s = entry['stages'][stage]
+            print(f"  {stage:<15} {s['count']:>5} {s['failed']:>5} {fmt(s['p50_s'], 8, 1)} "
+                  f"{fmt(s['p95_s'], 8, 1)} {fmt(s['mb_per_s'], 8, 2)} {fmt(s['rtf_p50'], 7, 3)}")
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="RelayQ per-stage timing events and runner performance report")
+    sub = parser.add_subparsers(dest='command', required=True)
+    emit = sub.add_parser('emit', help="Append one stage event (used by transcribe.sh)")
+    emit.add_argument('--log', default=DEFAULT_TIMINGS_PATH)
+    emit.add_argument('--stage', required=True)
+    emit.add_argument('--started', type=float, required=True, help="Stage start, epoch seconds")
+    emit.add_argument('--status', default='ok')
+    emit.add_argument('--bytes-of', help="File whose size is the bytes processed")
+    emit.add_argument('--audio', help="Audio file whose duration gives the real-time factor")
+    emit.add_argument('--stats-json', help="stream_transcribe.py stats giving bytes and audio_s")
+    emit.add_argument('--runner')
+    emit.add_argument('--backend')
+    emit.add_argument('--engine')
+    emit.add_argument('--model')
+    report = sub.add_parser('report', help="Per-runner stage report")
+    report.add_argument('--json', action='store_true')
+    report.add_argument('files', nargs='*', help="Event logs (default: this host's and the collected one)")
+    learn_cmd = sub.add_parser('learn', help="Feed finished jobs into the throughput table")
+    learn_cmd.add_argument('--cursor', default=DEFAULT_CURSOR_PATH)
+    learn_cmd.add_argument('files', nargs='*', help="Event logs (default: this host's and the collected one)")
+    collect_cmd = sub.add_parser('collect', help="Fetch runners' timings from workflow artifacts, then learn")
+    collect_cmd.add_argument('--repo', help="owner/repo (default: github_api.DEFAULT_REPO)")
+    collect_cmd.add_argument('--log', default=DEFAULT_COLLECTED_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'emit':
+        stats = None
+        if args.stats_json:
+            try:
+                with open(args.stats_json) as f:
+                    stats = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: ignoring {args.stats_json}: {e}", file=sys.stderr)
+        event = make_event(args.stage, args.started, args.status, args.bytes_of, args.audio, args.runner,
+                           stats, backend=args.backend, engine=args.engine, model=args.model)
+        try:
+            append_event(args.log, event)
+        except OSError as e:
+            print(f"Error: cannot write {args.log}: {e}", file=sys.stderr)
+            sys.exit(1)
+    elif args.command == 'report':
+        result = build_report(read_events(args.files or default_logs()))
+        if args.json:
+            print(json.dumps(result, indent=2))
+        else:
+            print_report(result)
+    elif args.command == 'learn':
+        used = learn_files(args.files or default_logs(), args.cursor)
+        print(f"Learned from {used} jobs", file=sys.stderr)
+    elif args.command == 'collect':
+        added = TimingsCollector(args.repo, log_path=args.log).collect()
+        print(f"Collected {added} events", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
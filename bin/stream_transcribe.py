@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+RelayQ Streaming Transcription
+
+Transcribes a URL without staging the audio on disk: the HTTP body (curl,
+or yt-dlp for streaming platforms) is piped straight into ffmpeg, ffmpeg's
+16 kHz mono PCM goes into a bounded ring buffer, and chunks cut at silences
+(same VAD and chunk lengths as chunked_transcribe.py) are handed to the
+transcription workers while the rest is still downloading and decoding.
+
+Everything is bounded: the ring buffer holds --buffer-s seconds of PCM and
+at most workers + 1 chunks are queued for inference. When inference falls
+behind, the ring fills, ffmpeg blocks on its stdout and the download
+stalls on TCP backpressure instead of growing memory or disk.
+
+Usage:
+    stream_transcribe.py <url> <output.txt> [--model NAME] [--device DEVICE]
+                         [--runner LABEL] [--workers N] [--buffer-s SECONDS]
+                         [--segments-json PATH] [--stats-json PATH]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from chunked_transcribe import (
+    DEFAULT_RUNNER, FRAME_MS, MAX_CHUNK_S, MIN_CHUNK_S, TARGET_CHUNK_S,
+    frame_energy_db, init_worker, merge_results, plan_chunks, resolve_workers,
+    silence_midpoints, transcribe_chunk,
+)
+from whisperd import DEFAULT_DEVICE, DEFAULT_MODEL
+
+FFMPEG = os.environ.get('RELAYQ_FFMPEG', 'ffmpeg')
+SAMPLE_RATE = 16000
+BYTES_PER_SECOND = SAMPLE_RATE * 2
+
+# PCM held between ffmpeg and the segmenter (30 s = ~1 MB)
+DEFAULT_BUFFER_S = float(os.environ.get('RELAYQ_STREAM_BUFFER_S', '30'))
+READ_BYTES = 64 * 1024
+
+STREAMING_SITES = re.compile(r'soundcloud\.com|youtube\.com|youtu\.be')
+
+class StreamError(Exception):
+    """The download or decode stage exited with an error"""
+
+class PcmRingBuffer:
+    """Fixed-size byte ring between one producer and one consumer.
+
+    write() blocks while the ring is full, read() blocks until data arrives
+    or the producer closes it.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.data = bytearray(capacity)
+        self.head = 0
+        self.size = 0
+        self.closed = False
+        self.high_water = 0
+        self.cond = threading.Condition()
+
+    def write(self, chunk: bytes):
+        view = memoryview(chunk)
+        while view:
+            with self.cond:
+                while self.size == self.capacity and not self.closed:
+                    self.cond.wait()
+                if self.closed:
+                    return
+                tail = (self.head + self.size) % self.capacity
+                count = min(len(view), self.capacity - self.size, self.capacity - tail)
+                self.data[tail:tail + count] = view[:count]
+                self.size += count
+                self.high_water = max(self.high_water, self.size)
+                self.cond.notify_all()
+            view = view[count:]
+
+    def read(self, max_bytes: int) -> bytes:
+        """Up to max_bytes; b'' once closed and drained"""
+        with self.cond:
+            while self.size == 0 and not self.closed:
+                self.cond.wait()
+            count = min(max_bytes, self.size, self.capacity - self.head)
+            out = bytes(self.data[self.head:self.head + count])
+            self.head = (self.head + count) % self.capacity
+            self.size -= count
+            self.cond.notify_all()
+            return out
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+def source_command(url: str) -> List[str]:
+    """Command that writes the raw media body to stdout"""
+    if STREAMING_SITES.search(url):
+        return ['yt-dlp', '-f', 'bestaudio', '--no-playlist', '-q', '-o', '-', url]
+    return ['curl', '-L', '--fail', '--silent', '--show-error', url]
+
+def decode_command() -> List[str]:
+    """ffmpeg reading any container on stdin, writing 16 kHz mono s16le on stdout"""
+    return [FFMPEG, '-nostdin', '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0',
+            '-f', 's16le', '-ac', '1', '-ar', str(SAMPLE_RATE), 'pipe:1']
+
+def relay(source, sink, counted: Dict[str, int]):
+    """Copy the media body into ffmpeg's stdin, counting bytes for the timing stats"""
+    try:
+        while True:
+            block = source.read1(READ_BYTES)
+            if not block:
+                break
+            counted['bytes'] += len(block)
+            sink.write(block)
+    except (BrokenPipeError, ValueError):
+        # ffmpeg exited (or was killed); its exit status tells the caller why
+        pass
+    finally:
+        # The source gets SIGPIPE and ffmpeg sees EOF
+        source.close()
+        try:
+            sink.close()
+        except BrokenPipeError:
+            pass
+
+def pump(stream, ring: PcmRingBuffer):
+    """Copy ffmpeg's stdout into the ring until EOF"""
+    try:
+        while True:
+            block = stream.read(READ_BYTES)
+            if not block:
+                break
+            ring.write(block)
+    finally:
+        ring.close()
+
+class StreamSegmenter:
+    """Cuts a growing PCM stream into chunks at silences.
+
+    A chunk is only emitted once MAX_CHUNK_S + MIN_CHUNK_S of audio is
+    buffered past its start, so a cut never depends on how much of the
+    stream happened to have arrived.
+    """
+
+    def __init__(self, rate: int = SAMPLE_RATE):
+        self.rate = rate
+        self.pending = bytearray()
+        self.offset = 0.0
+        self.index = 0
+
+    def feed(self, pcm: bytes) -> List[Dict[str, Any]]:
+        self.pending += pcm
+        chunks = []
+        while len(self.pending) >= (MAX_CHUNK_S + MIN_CHUNK_S) * self.rate * 2:
+            start, end = self._plan()[0]
+            chunks.append(self._take(end))
+        return chunks
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Remaining audio (an odd trailing byte is dropped)"""
+        if len(self.pending) < 2:
+            return []
+        return [self._take(end) for _, end in self._plan()]
+
+    def _samples(self):
+        import numpy as np
+        return np.frombuffer(self.pending, dtype=np.int16, count=len(self.pending) // 2)
+
+    def _plan(self):
+        samples = self._samples()
+        pauses = silence_midpoints(frame_energy_db(samples, self.rate), FRAME_MS / 1000.0)
+        return plan_chunks(len(samples) / float(self.rate), pauses, TARGET_CHUNK_S, MIN_CHUNK_S, MAX_CHUNK_S)
+
+    def _take(self, end: float) -> Dict[str, Any]:
+        """Detach pending audio up to `end` seconds (relative) as a chunk"""
+        import numpy as np
+
+        count = min(int(end * self.rate), len(self.pending) // 2)
+        samples = np.frombuffer(bytes(self.pending[:count * 2]), dtype=np.int16)
+        del self.pending[:count * 2]
+        chunk = {'index': self.index, 'samples': samples, 'offset': self.offset,
+                 'duration': count / float(self.rate)}
+        self.index += 1
+        self.offset += count / float(self.rate)
+        return chunk
+
+def stream_transcribe(url: str, model: str = DEFAULT_MODEL, device: str = DEFAULT_DEVICE,
+                      workers: int = 1, buffer_s: float = DEFAULT_BUFFER_S) -> Dict[str, Any]:
+    """Download, decode and transcribe concurrently; returns text, segments and timing stats"""
+    started = time.monotonic()
+    ring = PcmRingBuffer(max(int(buffer_s * BYTES_PER_SECOND), READ_BYTES))
+    counted = {'bytes': 0}
+    source = subprocess.Popen(source_command(url), stdout=subprocess.PIPE)
+    decoder = subprocess.Popen(decode_command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    relayer = threading.Thread(target=relay, args=(source.stdout, decoder.stdin, counted), daemon=True)
+    relayer.start()
+    reader = threading.Thread(target=pump, args=(decoder.stdout, ring), daemon=True)
+    reader.start()
+
+    segmenter = StreamSegmenter()
+    threads = max((os.cpu_count() or 1) // workers, 1)
+    in_flight, results = [], []
+    first_chunk_s = None
+    max_in_flight = workers + 1
+    try:
+        # Workers start at the first submit, after the Popens above: forked
+        # from here they would inherit the write end of ffmpeg's stdin, and
+        # ffmpeg would never see EOF. The forkserver hands them no pipes.
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(model, device, threads),
+                                 mp_context=multiprocessing.get_context('forkserver')) as pool:
+            def submit(chunks):
+                nonlocal first_chunk_s
+                for chunk in chunks:
+                    # Backpressure: wait for the oldest chunk rather than queueing audio
+                    while len(in_flight) >= max_in_flight:
+                        results.append(in_flight.pop(0).result())
+                    if first_chunk_s is None:
+                        first_chunk_s = time.monotonic() - started
+                    in_flight.append(pool.submit(transcribe_chunk, chunk))
+
+            while True:
+                pcm = ring.read(READ_BYTES)
+                if not pcm:
+                    break
+                submit(segmenter.feed(pcm))
+            reader.join()
+            relayer.join()
+            if decoder.wait() != 0 or source.wait() != 0:
+                raise StreamError(f"download/decode failed (source exit {source.wait()}, ffmpeg exit {decoder.wait()})")
+            submit(segmenter.finish())
+            results.extend(future.result() for future in in_flight)
+    finally:
+        # Unblock the pump and stop both stages if inference failed mid-stream
+        ring.close()
+        for proc in (source, decoder):
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+    if not results:
+        raise StreamError(f"no audio decoded from {url}")
+    merged = merge_results(results)
+    duration = segmenter.offset
+    elapsed = time.monotonic() - started
+    merged['stats'] = {
+        'chunks': len(results),
+        'bytes': counted['bytes'],
+        'workers': workers,
+        'audio_s': round(duration, 1),
+        'wall_s': round(elapsed, 2),
+        'rtf': round(elapsed / duration, 4) if duration else None,
+        'first_chunk_s': round(first_chunk_s, 2) if first_chunk_s is not None else None,
+        'ring_high_water_kb': ring.high_water // 1024,
+    }
+    return merged
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="Streaming download-decode-transcribe pipeline")
+    parser.add_argument('url', help="Audio URL (direct link, or a yt-dlp supported page)")
+    parser.add_argument('output', help="Transcript text file")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--device', default=DEFAULT_DEVICE)
+    parser.add_argument('--runner', default=DEFAULT_RUNNER, help="Runner label for cpu_cores/memory_gb (policy.yaml)")
+    parser.add_argument('--workers', type=int, help="Override the worker count")
+    parser.add_argument('--buffer-s', type=float, default=DEFAULT_BUFFER_S, help="Seconds of PCM the ring buffer holds")
+    parser.add_argument('--segments-json', help="Also write merged segments to this file")
+    parser.add_argument('--stats-json', help="Also write the timing stats (bytes, audio_s, ...) to this file")
+    args = parser.parse_args()
+
+    workers = args.workers or resolve_workers(args.runner, args.model)
+    try:
+        result = stream_transcribe(args.url, args.model, args.device, workers, args.buffer_s)
+    except (OSError, StreamError) as e:
+        print(f"Error: streaming transcription failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    with open(args.output, 'w') as f:
+        f.write(result['text'])
+    if args.segments_json:
+        with open(args.segments_json, 'w') as f:
+            json.dump(result['segments'], f)
+    if args.stats_json:
+        with open(args.stats_json, 'w') as f:
+            json.dump(result['stats'], f)
+    print(json.dumps(result['stats']), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+RelayQ Throughput Model
+
+Keeps a table of observed processing throughput (MB of input per second)
+per runner, backend and model, learned from past runs as an exponentially
+weighted moving average. The scheduler uses it to estimate how long a job
+would take on each candidate runner.
+
+Until a runner has history, estimates fall back to the
+`runner_capabilities.<runner>.throughput_mb_per_s` prior in policy.yaml.
+
+Usage:
+    throughput.py learn < runs.jsonl     # {"runner", "backend", "model", "size_mb", "seconds"}
+    throughput.py show
+    throughput.py estimate <runner> <size_mb> [backend] [model]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from runner_state import write_state
+from select_target import DEFAULT_POLICY_PATH, load_policy
+
+DEFAULT_TABLE_PATH = os.path.expanduser(
+    os.environ.get('RELAYQ_THROUGHPUT') or '~/.cache/relayq/throughput.json')
+DEFAULT_BACKEND = 'local'
+DEFAULT_MODEL = 'base'
+# Used when neither history nor a policy prior exists for a runner
+FALLBACK_MB_PER_S = 0.05
+# Weight of each new observation in the moving average
+ALPHA = 0.3
+
+def table_key(runner: str, backend: str = '*', model: str = '*') -> str:
+    return f"{runner}/{backend}/{model}"
+
+class ThroughputTable:
+    """MB/s per (runner, backend, model) with coarser-grained fallbacks"""
+
+    def __init__(self, priors: Optional[Dict[str, float]] = None, path: Optional[str] = DEFAULT_TABLE_PATH):
+        self.path = path
+        self.priors = dict(priors or {})
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.mtime = None
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        """Read the learned entries from path, keeping the current ones if it is unreadable"""
+        try:
+            self.mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path) as f:
+                entries = json.load(f).get('entries', {})
+        except (OSError, ValueError) as e:
+            print(f"Warning: ignoring unreadable throughput table {self.path}: {e}", file=sys.stderr)
+            return
+        with self.lock:
+            self.entries = entries
+
+    def maybe_reload(self) -> bool:
+        """Re-read the table if another process (stage_timings.py learn) rewrote it"""
+        if not self.path:
+            return False
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self.mtime:
+            return False
+        self.load()
+        return True
+
+    @classmethod
+    def from_policy(cls, policy: Dict[str, Any], path: Optional[str] = DEFAULT_TABLE_PATH) -> 'ThroughputTable':
+        """Table seeded with the throughput_mb_per_s priors from policy.yaml"""
+        table = cls(None, path)
+        table.load_priors(policy)
+        return table
+
+    def load_priors(self, policy: Dict[str, Any]):
+        """Replace priors with runner_capabilities.<runner>.throughput_mb_per_s"""
+        self.priors = {
+            runner: float(caps['throughput_mb_per_s'])
+            for runner, caps in (policy.get('runner_capabilities', {}) or {}).items()
+            if caps and caps.get('throughput_mb_per_s')
+        }
+
+    def mb_per_s(self, runner: str, backend: str = DEFAULT_BACKEND, model: str = DEFAULT_MODEL) -> float:
+        """Best available throughput estimate, most specific key first"""
+        for key in (table_key(runner, backend, model), table_key(runner, backend), table_key(runner)):
+            entry = self.entries.get(key)
+            if entry:
+                return entry['mb_per_s']
+        return self.priors.get(runner, FALLBACK_MB_PER_S)
+
+    def estimate_seconds(self, runner: str, size_mb: float,
+                         backend: str = DEFAULT_BACKEND, model: str = DEFAULT_MODEL) -> float:
+        """Expected processing time for size_mb of input on runner"""
+        return size_mb / max(self.mb_per_s(runner, backend, model), 1e-6)
+
+    def record(self, runner: str, size_mb: float, seconds: float,
+               backend: str = DEFAULT_BACKEND, model: str = DEFAULT_MODEL):
+        """Fold one finished run into the averages at every granularity"""
+        if size_mb <= 0 or seconds <= 0:
+            return
+        observed = size_mb / seconds
+        with self.lock:
+            for key in (table_key(runner, backend, model), table_key(runner, backend), table_key(runner)):
+                entry = self.entries.get(key)
+                if entry is None:
+                    self.entries[key] = {'mb_per_s': observed, 'samples': 1}
+                else:
+                    entry['mb_per_s'] = (1 - ALPHA) * entry['mb_per_s'] + ALPHA * observed
+                    entry['samples'] += 1
+
+    def learn(self, runs: Iterable[Dict[str, Any]]) -> int:
+        """Record a batch of finished runs; returns how many were usable"""
+        used = 0
+        for run in runs:
+            try:
+                self.record(run['runner'], float(run['size_mb']), float(run['seconds']),
+                            run.get('backend') or DEFAULT_BACKEND, run.get('model') or DEFAULT_MODEL)
+                used += 1
+            except (KeyError, TypeError, ValueError):
+                continue
+        return used
+
+    def save(self):
+        if self.path:
+            with self.lock:
+                write_state(self.path, {'entries': self.entries})
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="RelayQ throughput model")
+    parser.add_argument('--table', default=DEFAULT_TABLE_PATH, help="Throughput table path")
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('learn', help="Learn from finished runs (JSONL on stdin)")
+    sub.add_parser('show', help="Print the learned table")
+    estimate = sub.add_parser('estimate', help="Estimate processing seconds")
+    estimate.add_argument('runner')
+    estimate.add_argument('size_mb', type=float)
+    estimate.add_argument('backend', nargs='?', default=DEFAULT_BACKEND)
+    estimate.add_argument('model', nargs='?', default=DEFAULT_MODEL)
+    args = parser.parse_args()
+
+    table = ThroughputTable.from_policy(load_policy(DEFAULT_POLICY_PATH), args.table)
+
+    if args.command == 'learn':
+        runs = (json.loads(line) for line in sys.stdin if line.strip())
+        used = table.learn(runs)
+        table.save()
+        print(f"Learned from {used} runs", file=sys.stderr)
+    elif args.command == 'show':
+        print(json.dumps({'priors': table.priors, 'entries': table.entries}, indent=2))
+    elif args.command == 'estimate':
+        seconds = table.estimate_seconds(args.runner, args.size_mb, args.backend, args.model)
+        print(json.dumps({
+            'runner': args.runner,
+            'mb_per_s': table.mb_per_s(args.runner, args.backend, args.model),
+            'seconds': round(seconds, 1),
+        }))
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
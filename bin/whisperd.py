@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+RelayQ Whisper Model Server
+
+Keeps Whisper models loaded between jobs so transcribe.sh does not pay the
+torch import and model load (tens of seconds, several GB for large) for
+every file. Models live in an LRU cache keyed by (model, device); the least
+recently used ones are evicted when loading another would exceed the
+memory budget.
+
+Protocol: one JSON object per line in each direction, over a Unix socket
+(or localhost TCP port).
+    -> {"audio": "/tmp/x/converted.wav", "output": "/tmp/out.txt", "model": "base", "device": "cpu"}
+    <- {"output": "/tmp/out.txt", "chars": 1234, "cached": true, "load_s": 0.0, "transcribe_s": 41.2}
+    -> {"op": "status"}
+    <- {"models": [...], "used_mb": 300, "budget_mb": 4096}
+
+The model name "stub" loads a tiny stand-in that only reads the WAV header,
+for testing the daemon and transcribe.sh integration without torch.
+
+Usage:
+    whisperd.py serve [--socket PATH | --port PORT] [--memory-mb MB] [--preload MODEL[@DEVICE]]
+    whisperd.py transcribe <audio> <output> [--model NAME] [--device DEVICE]
+    whisperd.py status
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import wave
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from asr_engines import QUANTIZED_ENGINES, load_engine_model, split_model
+from socket_address import parse_address
+
+DEFAULT_SOCKET = os.environ.get('RELAYQ_WHISPER_SOCKET') or '/tmp/relayq-whisper.sock'
+DEFAULT_MEMORY_MB = int(os.environ.get('RELAYQ_WHISPER_MEMORY_MB', 4096))
+DEFAULT_MODEL = os.environ.get('WHISPER_MODEL', 'base')
+DEFAULT_DEVICE = os.environ.get('WHISPER_DEVICE', 'cpu')
+
+# Approximate resident size once loaded (fp32 weights plus runtime overhead)
+MODEL_MEMORY_MB = {
+    'stub': 1,
+    'stub-cpu': 1,
+    'tiny': 150,
+    'base': 300,
+    'small': 1000,
+    'medium': 3000,
+    'large': 6000,
+    'large-v2': 6000,
+    'large-v3': 6000,
+    'turbo': 3000,
+}
+UNKNOWN_MODEL_MB = 3000
+
+# int8/q8_0 weights under ggml or CTranslate2, relative to the fp32 figures above
+QUANTIZED_MEMORY_FACTOR = 0.35
+
+def model_memory_mb(name: str) -> int:
+    """Approximate resident size for a (possibly "engine:"-prefixed) model name"""
+    engine, model = split_model(name)
+    memory_mb = MODEL_MEMORY_MB.get(model, UNKNOWN_MODEL_MB)
+    if engine in QUANTIZED_ENGINES:
+        memory_mb = max(int(memory_mb * QUANTIZED_MEMORY_FACTOR), 1)
+    return memory_mb
+
+class StubModel:
+    """Stand-in with the whisper model interface; reports the audio length.
+
+    With cpu_rtf set it also burns that many CPU seconds per second of
+    audio, approximating real inference cost for parallelism benchmarks.
+    """
+
+    def __init__(self, cpu_rtf: float = 0.0):
+        self.cpu_rtf = cpu_rtf
+
+    def transcribe(self, audio, **options) -> Dict[str, Any]:
+        # Like whisper, accepts a path or 16 kHz float32 samples
+        if not isinstance(audio, str):
+            duration = len(audio) / 16000.0
+            audio = 'samples'
+        else:
+            try:
+                with wave.open(audio, 'rb') as f:
+                    duration = f.getnframes() / float(f.getframerate())
+            except (wave.Error, EOFError):
+                duration = os.path.getsize(audio) / 32000.0
+        if self.cpu_rtf:
+            deadline = time.process_time() + duration * self.cpu_rtf
+            while time.process_time() < deadline:
+                pass
+        text = f"[stub transcript of {os.path.basename(audio)}: {duration:.1f}s]"
+        return {'text': text, 'segments': [{'start': 0.0, 'end': duration, 'text': text}]}
+
+# CPU seconds per audio second for the "stub-cpu" model (~base on one core)
+STUB_CPU_RTF = 0.05
+
+def load_model(name: str, device: str, threads: Optional[int] = None):
+    """Load a model by name ("stub" and "stub-cpu" need no dependencies; "ggml:"/"ct2:" are quantized)"""
+    if name == 'stub':
+        return StubModel()
+    if name == 'stub-cpu':
+        return StubModel(STUB_CPU_RTF)
+    engine, model = split_model(name)
+    if engine in QUANTIZED_ENGINES:
+        return load_engine_model(engine, model, device, threads)
+    import whisper
+    return whisper.load_model(model, device=device)
+
+class ModelCache:
+    """LRU of loaded models keyed by (name, device), bounded by a memory budget"""
+
+    def __init__(self, memory_mb: int = DEFAULT_MEMORY_MB, loader=load_model):
+        self.memory_mb = memory_mb
+        self.loader = loader
+        self.lock = threading.Lock()
+        self.models = OrderedDict()
+        self.loading = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def used_mb(self) -> int:
+        return sum(entry['memory_mb'] for entry in self.models.values())
+
+    def evict_for(self, needed_mb: int):
+        """Drop least recently used models until needed_mb fits (caller holds the lock)"""
+        while self.models and self.used_mb() + needed_mb > self.memory_mb:
+            key, entry = self.models.popitem(last=False)
+            self.evictions += 1
+            print(f"whisperd: evicted {key[0]}@{key[1]} ({entry['memory_mb']} MB)", file=sys.stderr)
+
+    def get(self, name: str, device: str) -> Tuple[Dict[str, Any], Optional[float]]:
+        """Cached entry for (name, device), loading it if needed; returns (entry, load seconds or None if cached)"""
+        key = (name, device)
+        while True:
+            with self.lock:
+                entry = self.models.get(key)
+                if entry is not None:
+                    self.models.move_to_end(key)
+                    return entry, None
+                pending = self.loading.get(key)
+                if pending is None:
+                    # This thread loads; others wait for it rather than loading twice
+                    pending = self.loading[key] = threading.Event()
+                    break
+            pending.wait()
+
+        try:
+            memory_mb = model_memory_mb(name)
+            with self.lock:
+                self.evict_for(memory_mb)
+            started = time.monotonic()
+            model = self.loader(name, device)
+            load_s = time.monotonic() - started
+            entry = {'model': model, 'memory_mb': memory_mb, 'lock': threading.Lock(), 'uses': 0}
+            with self.lock:
+                self.evict_for(memory_mb)
+                self.models[key] = entry
+                self.loads += 1
+            return entry, load_s
+        finally:
+            with self.lock:
+                self.loading.pop(key).set()
+
+    def status(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'models': [
+                    {'model': name, 'device': device, 'memory_mb': entry['memory_mb'], 'uses': entry['uses']}
+                    for (name, device), entry in self.models.items()
+                ],
+                'used_mb': self.used_mb(),
+                'budget_mb': self.memory_mb,
+                'loads': self.loads,
+                'evictions': self.evictions,
+            }
+
+def transcribe(cache: ModelCache, request: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one transcription request against a cached model"""
+    audio = request.get('audio')
+    if not audio or not os.path.exists(audio):
+        return {'error': f"audio file not found: {audio}"}
+
+    name = request.get('model') or DEFAULT_MODEL
+    device = request.get('device') or DEFAULT_DEVICE
+    try:
+        entry, load_s = cache.get(name, device)
+    except Exception as e:
+        return {'error': f"cannot load model {name} on {device}: {e}"}
+
+    started = time.monotonic()
+    try:
+        # One inference per model at a time; different models run in parallel
+        with entry['lock']:
+            entry['uses'] += 1
+            result = entry['model'].transcribe(audio, **(request.get('options') or {}))
+    except Exception as e:
+        return {'error': f"transcription failed: {e}"}
+    transcribe_s = time.monotonic() - started
+
+    text = result.get('text', '')
+    reply = {'chars': len(text), 'cached': load_s is None,
+             'load_s': round(load_s or 0.0, 3), 'transcribe_s': round(transcribe_s, 3)}
+    output = request.get('output')
+    if output:
+        with open(output, 'w') as f:
+            f.write(text)
+        reply['output'] = output
+    else:
+        reply['text'] = text
+    if request.get('segments'):
+        reply['segments'] = result.get('segments', [])
+    return reply
+
+def handle_request(cache: ModelCache, line: bytes) -> Dict[str, Any]:
+    """Decode one request line and serve it"""
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return {'error': f"invalid request: {e}"}
+    if not isinstance(request, dict):
+        return {'error': "request must be a JSON object"}
+
+    op = request.get('op', 'transcribe')
+    if op == 'status':
+        return cache.status()
+    if op == 'transcribe':
+        return transcribe(cache, request)
+    return {'error': f"unknown op: {op}"}
+
+class WhisperHandler(socketserver.StreamRequestHandler):
+    """Serve newline-delimited JSON requests for the lifetime of a connection"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            reply = handle_request(self.server.cache, line)
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+            self.wfile.flush()
+
+class UnixWhisperServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class TCPWhisperServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def make_server(address: Union[str, Tuple[str, int]], cache: ModelCache) -> socketserver.BaseServer:
+    """Create (but do not start) a transcription server bound to address"""
+    if isinstance(address, tuple):
+        server = TCPWhisperServer(address, WhisperHandler)
+    else:
+        if os.path.exists(address):
+            os.unlink(address)
+        server = UnixWhisperServer(address, WhisperHandler)
+        os.chmod(address, 0o600)
+    server.cache = cache
+    return server
+
+class WhisperClient:
+    """Keeps one connection to whisperd open"""
+
+    def __init__(self, address: str = DEFAULT_SOCKET, timeout: Optional[float] = None):
+        target = parse_address(address)
+        if isinstance(target, tuple):
+            self.sock = socket.create_connection(target, timeout=5.0)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(5.0)
+            try:
+                self.sock.connect(target)
+            except OSError:
+                self.sock.close()
+                raise
+        # Transcription can take as long as the audio; no timeout by default
+        self.sock.settimeout(timeout)
+        self.reader = self.sock.makefile('rb')
+
+    def request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        self.sock.sendall(json.dumps(request).encode() + b'\n')
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("whisperd closed the connection")
+        return json.loads(line)
+
+    def transcribe(self, audio: str, output: Optional[str] = None, model: str = DEFAULT_MODEL,
+                   device: str = DEFAULT_DEVICE, **options) -> Dict[str, Any]:
+        return self.request({'audio': os.path.abspath(audio), 'output': output and os.path.abspath(output),
+                             'model': model, 'device': device, 'options': options})
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def parse_preload(values: List[str]) -> List[Tuple[str, str]]:
+    """MODEL[@DEVICE] -> (model, device)"""
+    return [tuple(v.split('@', 1)) if '@' in v else (v, DEFAULT_DEVICE) for v in values]
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="RelayQ Whisper model server")
+    sub = parser.add_subparsers(dest='command')
+
+    serve = sub.add_parser('serve', help="Run the model server")
+    serve.add_argument('--socket', default=DEFAULT_SOCKET, help="Unix socket path or host:port")
+    serve.add_argument('--port', type=int, help="Listen on 127.0.0.1:PORT instead of a Unix socket")
+    serve.add_argument('--memory-mb', type=int, default=DEFAULT_MEMORY_MB, help="Budget for loaded models")
+    serve.add_argument('--preload', action='append', default=[], help="Load MODEL[@DEVICE] at startup")
+
+    client = sub.add_parser('transcribe', help="Transcribe through a running server")
+    client.add_argument('--socket', default=DEFAULT_SOCKET, help="Unix socket path or host:port")
+    client.add_argument('--model', default=DEFAULT_MODEL)
+    client.add_argument('--device', default=DEFAULT_DEVICE)
+    client.add_argument('audio')
+    client.add_argument('output')
+
+    status = sub.add_parser('status', help="Show loaded models")
+    status.add_argument('--socket', default=DEFAULT_SOCKET, help="Unix socket path or host:port")
+
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        address = ('127.0.0.1', args.port) if args.port else parse_address(args.socket)
+        cache = ModelCache(args.memory_mb)
+        for name, device in parse_preload(args.preload):
+            _, load_s = cache.get(name, device)
+            print(f"whisperd: loaded {name}@{device} in {load_s or 0.0:.1f}s", file=sys.stderr)
+        server = make_server(address, cache)
+        print(f"whisperd listening on {address} (budget: {args.memory_mb} MB)", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if isinstance(address, str) and os.path.exists(address):
+                os.unlink(address)
+
+    elif args.command in ('transcribe', 'status'):
+        # Exit 2 when no server is reachable so callers can fall back
+        try:
+            with WhisperClient(args.socket) as client:
+                if args.command == 'status':
+                    reply = client.request({'op': 'status'})
+                else:
+                    reply = client.transcribe(args.audio, args.output, args.model, args.device)
+        except OSError as e:
+            print(f"Error: whisperd not reachable at {args.socket}: {e}", file=sys.stderr)
+            sys.exit(2)
+        print(json.dumps(reply, indent=2 if args.command == 'status' else None))
+        sys.exit(1 if 'error' in reply else 0)
+
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
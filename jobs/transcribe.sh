@@ -36,10 +36,32 @@ OPENAI_API_KEY="${OPENAI_API_KEY:-}"
 ROUTER_API_KEY="${ROUTER_API_KEY:-}"
 ROUTER_BASE_URL="${ROUTER_BASE_URL:-https://openrouter.ai/api/v1}"
 ROUTER_MODEL="${ROUTER_MODEL:-openai/whisper-1}"
+WHISPER_DEVICE="${WHISPER_DEVICE:-cpu}"
+# Local engine: auto (per runner, see bin/asr_engines.py), ggml, ct2 or torch
+WHISPER_ENGINE="${WHISPER_ENGINE:-auto}"
+WHISPER_QUANT="${WHISPER_QUANT:-q8_0}"
+ASR_ENGINES="${SCRIPT_DIR}/../bin/asr_engines.py"
+RELAYQ_WHISPER_SOCKET="${RELAYQ_WHISPER_SOCKET:-/tmp/relayq-whisper.sock}"
+WHISPERD="${SCRIPT_DIR}/../bin/whisperd.py"
+WHISPER_CHUNKED="${WHISPER_CHUNKED:-0}"
+CHUNKED_TRANSCRIBE="${SCRIPT_DIR}/../bin/chunked_transcribe.py"
+WHISPER_STREAMING="${WHISPER_STREAMING:-0}"
+STREAM_TRANSCRIBE="${SCRIPT_DIR}/../bin/stream_transcribe.py"
+RELAYQ_CACHE="${RELAYQ_CACHE:-1}"
+RELAYQ_CACHE_DIR="${RELAYQ_CACHE_DIR:-$HOME/.cache/relayq}"
+MEDIA_CACHE="${SCRIPT_DIR}/../bin/media_cache.py"
+RANGED_DOWNLOAD="${SCRIPT_DIR}/../bin/ranged_download.py"
+RELAYQ_DOWNLOAD_PARTIAL_DIR="${RELAYQ_DOWNLOAD_PARTIAL_DIR:-${RELAYQ_CACHE_DIR}/partial}"
+ASR_DISPATCH="${SCRIPT_DIR}/../bin/asr_dispatch.py"
+CHUNKED_UPLOAD="${SCRIPT_DIR}/../bin/chunked_upload.py"
+RELAYQ_ASR_HEDGE="${RELAYQ_ASR_HEDGE:-0}"
+# Stage timing events (JSONL, see bin/stage_timings.py), read by bin/metrics.py
+RELAYQ_TIMINGS="${RELAYQ_TIMINGS:-${RELAYQ_CACHE_DIR}/timings.jsonl}"
+STAGE_TIMINGS="${SCRIPT_DIR}/../bin/stage_timings.py"
 
 # Handle OpenRouter keys (comma-separated)
 if [[ -n "${OPENROUTER_KEYS:-}" ]]; then
-    # Use first key for this transcription
+    # asr_dispatch.py rotates across all keys; the curl fallback uses the first
     ROUTER_API_KEY="${OPENROUTER_KEYS%%,*}"
     log_info "Using OpenRouter API for transcription"
 fi
@@ -69,6 +91,21 @@ validate_url() {
     fi
 }
 
+# Fetch a URL to a file: parallel ranged download that resumes partials left
+# by earlier jobs, falling back to a plain curl
+fetch_url() {
+    local url="$1"
+    local dest_path="$2"
+
+    if [[ -f "$RANGED_DOWNLOAD" ]] && command -v python3 &> /dev/null; then
+        if python3 "$RANGED_DOWNLOAD" --partial-dir "$RELAYQ_DOWNLOAD_PARTIAL_DIR" "$url" "$dest_path" > /dev/null; then
+            return 0
+        fi
+        log_warn "Ranged download failed, retrying with curl"
+    fi
+    curl -L -o "$dest_path" --fail --show-error "$url"
+}
+
 # Function to download file
 download_file() {
     local url="$1"
@@ -91,14 +128,14 @@ download_file() {
         log_info "Using yt-dlp for streaming platform URL"
         if ! yt-dlp -f "bestaudio" -o "$dest_path" --no-playlist "$url" 2>/dev/null; then
             log_error "yt-dlp failed, falling back to direct download"
-            if ! curl -L -o "$dest_path" --fail --show-error "$url"; then
+            if ! fetch_url "$url" "$dest_path"; then
                 log_error "Failed to download file from: $url"
                 return 1
             fi
         fi
     else
         # Direct download
-        if ! curl -L -o "$dest_path" --fail --show-error "$url"; then
+        if ! fetch_url "$url" "$dest_path"; then
             log_error "Failed to download file from: $url"
             return 1
         fi
@@ -121,6 +158,24 @@ download_file() {
     echo "$dest_path"
 }
 
+# Per-runner media cache (bin/media_cache.py); fails like a miss when disabled
+media_cache() {
+    if [[ "$RELAYQ_CACHE" != "1" || ! -f "$MEDIA_CACHE" ]]; then
+        return 1
+    fi
+    RELAYQ_CACHE_DIR="$RELAYQ_CACHE_DIR" python3 "$MEDIA_CACHE" "$@"
+}
+
+# Model part of the transcript cache key
+transcript_model_id() {
+    case "$1" in
+        "local") echo "${LOCAL_WHISPER_MODEL:-$WHISPER_MODEL}" ;;
+        "openai") echo "whisper-1" ;;
+        "router") echo "$ROUTER_MODEL" ;;
+        *) echo "$1" ;;
+    esac
+}
+
 # Function to check FFmpeg availability
 check_ffmpeg() {
     if ! command -v ffmpeg &> /dev/null; then
@@ -146,23 +201,77 @@ convert_audio() {
 # Function to download Whisper model
 download_whisper_model() {
     local model="$1"
-    local model_file="${WHISPER_MODEL_PATH}/${model}.bin"
-
-    if [[ -f "$model_file" ]]; then
-        log_info "Model already exists: $model_file"
-        return 0
+    local names=("ggml-${model}.bin")
+    if [[ -n "$WHISPER_QUANT" ]]; then
+        names=("ggml-${model}-${WHISPER_QUANT}.bin" "${names[@]}")
     fi
 
+    local name
+    for name in "${names[@]}"; do
+        if [[ -f "${WHISPER_MODEL_PATH}/${name}" ]]; then
+            log_info "Model already exists: ${WHISPER_MODEL_PATH}/${name}"
+            return 0
+        fi
+    done
+
     log_info "Downloading Whisper model: $model"
     mkdir -p "$WHISPER_MODEL_PATH"
 
-    local model_url="https://huggingface.co/ggerganov/whisper.cpp/resolve/main/${model}.bin"
-    if ! curl -L -o "$model_file" --fail --show-error "$model_url"; then
-        log_error "Failed to download model: $model"
+    # Quantized build first; not every model has every quantization
+    local started
+    started=$(now_s)
+    for name in "${names[@]}"; do
+        local model_file="${WHISPER_MODEL_PATH}/${name}"
+        if fetch_url "https://huggingface.co/ggerganov/whisper.cpp/resolve/main/${name}" "$model_file"; then
+            log_info "Model downloaded: $model_file"
+            record_stage model_download "$started" ok --bytes-of "$model_file" --model "$name"
+            return 0
+        fi
+        rm -f "$model_file"
+    done
+    record_stage model_download "$started" failed --model "$model"
+
+    log_error "Failed to download model: $model"
+    return 1
+}
+
+# Pick the local engine for this runner and set LOCAL_WHISPER_MODEL to the
+# name whisperd.load_model expects ("ggml:base", "ct2:base" or "base")
+prepare_local_model() {
+    local engine="torch"
+    if [[ -f "$ASR_ENGINES" ]]; then
+        engine=$(python3 "$ASR_ENGINES" select --engine "$WHISPER_ENGINE" --device "$WHISPER_DEVICE" \
+            ${RELAYQ_RUNNER:+--runner "$RELAYQ_RUNNER"} 2>/dev/null) || engine="torch"
+    fi
+
+    LOCAL_WHISPER_MODEL="$WHISPER_MODEL"
+    if [[ "$engine" != "torch" && "$WHISPER_MODEL" != stub* ]]; then
+        if [[ "$engine" == "ggml" ]] && ! download_whisper_model "$WHISPER_MODEL"; then
+            log_warn "No ggml model for $WHISPER_MODEL, using PyTorch whisper"
+            return 0
+        fi
+        LOCAL_WHISPER_MODEL="${engine}:${WHISPER_MODEL}"
+    fi
+    log_info "Local ASR engine: $engine ($LOCAL_WHISPER_MODEL)"
+}
+
+# Function to transcribe through the resident model server (bin/whisperd.py), if running
+use_whisper_daemon() {
+    local input_file="$1"
+    local output_file="$2"
+    local model="$3"
+    local device="$4"
+
+    if [[ ! -S "$RELAYQ_WHISPER_SOCKET" || ! -f "$WHISPERD" ]]; then
         return 1
     fi
 
-    log_info "Model downloaded: $model_file"
+    log_info "Transcribing with whisperd ($model on $device)"
+    if ! python3 "$WHISPERD" transcribe --socket "$RELAYQ_WHISPER_SOCKET" \
+        --model "$model" --device "$device" "$input_file" "$output_file" >&2; then
+        log_warn "whisperd transcription failed, loading the model in-process"
+        return 1
+    fi
 }
 
 # Function for MacWhisper Pro transcription (preferred)
@@ -195,7 +304,11 @@ use_macwhisper_pro() {
             --format txt 2>/dev/null; then
             log_error "MacWhisper Pro CLI failed, trying Python with large model"
 
-            # Fallback to Python with large model
+            # Fallback to Python with large model (resident server first)
+            if use_whisper_daemon "$input_file" "$output_file" large mps; then
+                log_info "MacWhisper Pro transcription completed successfully"
+                return 0
+            fi
             if ! python3 -c "
 import whisper
 import sys
@@ -222,6 +335,10 @@ except Exception as e:
         log_warn "MacWhisper Pro CLI not found, using Python with large model"
 
         # Fallback to Python with large model (better than base model)
+        if use_whisper_daemon "$input_file" "$output_file" large mps; then
+            log_info "MacWhisper Pro transcription completed successfully"
+            return 0
+        fi
         if ! python3 -c "
 import whisper
 import sys
@@ -254,20 +371,33 @@ use_local_whisper() {
     local output_file="$2"
 
     log_info "Using local Whisper backend"
-
-    # Download model if needed
-    if ! download_whisper_model "$WHISPER_MODEL"; then
-        return 1
+    local model="${LOCAL_WHISPER_MODEL:-$WHISPER_MODEL}"
+
+    # Long files: split at silences and transcribe chunks on every core
+    if [[ "$WHISPER_CHUNKED" == "1" && -f "$CHUNKED_TRANSCRIBE" ]]; then
+        log_info "Transcribing in parallel chunks (runner: ${RELAYQ_RUNNER:-auto})"
+        if python3 "$CHUNKED_TRANSCRIBE" --model "$model" --device "$WHISPER_DEVICE" \
+            ${RELAYQ_RUNNER:+--runner "$RELAYQ_RUNNER"} "$input_file" "$output_file"; then
+            log_info "Local transcription completed"
+            return 0
+        fi
+        log_warn "Chunked transcription failed, transcribing the whole file"
     fi
 
-    local model_file="${WHISPER_MODEL_PATH}/${WHISPER_MODEL}.bin"
+    # A running whisperd already has the model loaded
+    if use_whisper_daemon "$input_file" "$output_file" "$model" "$WHISPER_DEVICE"; then
+        log_info "Local transcription completed"
+        return 0
+    fi
 
-    # Try Python whisper
+    # Load in-process (whisperd.load_model handles ggml:/ct2: names too)
     if command -v python3 &> /dev/null; then
-        log_info "Transcribing with Python whisper"
+        log_info "Transcribing with $model"
         if ! python3 -c "
-import whisper
-model = whisper.load_model('$WHISPER_MODEL')
+import sys
+sys.path.insert(0, '${SCRIPT_DIR}/../bin')
+from whisperd import load_model
+model = load_model('$model', '$WHISPER_DEVICE')
 result = model.transcribe('$input_file')
 with open('$output_file', 'w') as f:
     f.write(result['text'])
@@ -283,6 +413,33 @@ with open('$output_file', 'w') as f:
     log_info "Local transcription completed"
 }
 
+# Remote transcription through bin/asr_dispatch.py: every configured key is
+# an endpoint, ordered by health and latency, optionally hedged. With ffmpeg,
+# bin/chunked_upload.py first re-encodes to Opus and sends size-bounded
+# chunks concurrently, so files over the API upload limit work too
+remote_dispatch() {
+    local input_file="$1"
+    local output_file="$2"
+    local backend="$3"
+
+    local dispatch=("$ASR_DISPATCH" transcribe)
+    if [[ -f "$CHUNKED_UPLOAD" ]] && command -v ffmpeg &> /dev/null; then
+        dispatch=("$CHUNKED_UPLOAD")
+    fi
+
+    local hedge=""
+    if [[ "$RELAYQ_ASR_HEDGE" == "1" ]]; then
+        hedge="--hedge"
+    fi
+
+    # The node env file is sourced, not exported: pass the keys explicitly
+    ASR_BACKEND="$ASR_BACKEND" AI_API_KEY="$AI_API_KEY" OPENAI_API_KEY="$OPENAI_API_KEY" \
+    ROUTER_API_KEY="$ROUTER_API_KEY" OPENROUTER_KEYS="${OPENROUTER_KEYS:-}" \
+    OPENAI_BASE_URL="${OPENAI_BASE_URL:-https://api.openai.com/v1}" \
+    ROUTER_BASE_URL="$ROUTER_BASE_URL" ROUTER_MODEL="$ROUTER_MODEL" \
+        python3 "${dispatch[@]}" "$input_file" "$output_file" --backend "$backend" $hedge
+}
+
 # Function for OpenAI API transcription
 use_openai_api() {
     local input_file="$1"
@@ -297,6 +454,15 @@ use_openai_api() {
         return 1
     fi
 
+    if [[ -f "$ASR_DISPATCH" ]]; then
+        if ! remote_dispatch "$input_file" "$output_file" openai; then
+            log_error "OpenAI API transcription failed"
+            return 1
+        fi
+        log_info "OpenAI transcription completed"
+        return 0
+    fi
+
     log_info "Transcribing with OpenAI API"
     local response
     response=$(curl -X POST "https://api.openai.com/v1/audio/transcriptions" \
@@ -330,6 +496,15 @@ use_router_api() {
         return 1
     fi
 
+    if [[ -f "$ASR_DISPATCH" ]]; then
+        if ! remote_dispatch "$input_file" "$output_file" router; then
+            log_error "Router API transcription failed"
+            return 1
+        fi
+        log_info "Router transcription completed"
+        return 0
+    fi
+
     log_info "Transcribing with Router API: $ROUTER_MODEL"
     local response
     response=$(curl -X POST "${ROUTER_BASE_URL}/audio/transcriptions" \
@@ -351,6 +526,86 @@ use_router_api() {
     log_info "Router transcription completed"
 }
 
+# Epoch seconds with sub-second precision (EPOCHREALTIME is bash 5; macOS ships bash 3.2)
+now_s() {
+    if [[ -n "${EPOCHREALTIME:-}" ]]; then
+        echo "${EPOCHREALTIME/,/.}"
+    else
+        python3 -c 'import time; print(time.time())'
+    fi
+}
+
+# Append a stage timing event (best effort, never fails the job):
+#   record_stage <stage> <started (now_s)> <ok|failed> [--bytes-of FILE] [--audio FILE]
+#                [--backend B] [--engine E] [--model M]
+record_stage() {
+    local stage="$1"
+    local started="$2"
+    local status="$3"
+    shift 3
+    if [[ -f "$STAGE_TIMINGS" ]]; then
+        python3 "$STAGE_TIMINGS" emit --log "$RELAYQ_TIMINGS" --stage "$stage" --started "$started" \
+            --status "$status" ${RELAYQ_RUNNER:+--runner "$RELAYQ_RUNNER"} "$@" >/dev/null 2>&1 || true
+    fi
+}
+
+# One backend attempt, timed as an inference event:
+#   backend_attempt <engine> <backend> <model> <function> <audio> <output>
+backend_attempt() {
+    local engine="$1"
+    local backend="$2"
+    local model="$3"
+    local audio_file="$5"
+    local started status="ok"
+    started=$(now_s)
+    if ! "$4" "$audio_file" "$6"; then
+        status="failed"
+    fi
+    record_stage inference "$started" "$status" --bytes-of "$audio_file" --audio "$audio_file" \
+        --backend "$backend" --engine "$engine" --model "$model"
+    [[ "$status" == "ok" ]]
+}
+
+# Run the transcription backend on prepared audio
+run_backend() {
+    local backend="$1"
+    local audio_file="$2"
+    local output_file="$3"
+
+    case "$backend" in
+        "local")
+            # Try MacWhisper Pro first, then fallback to local Whisper
+            local model="${LOCAL_WHISPER_MODEL:-$WHISPER_MODEL}"
+            if [[ -d "/Applications/MacWhisper.app" ]]; then
+                if ! backend_attempt macwhisper local large-v3 use_macwhisper_pro "$audio_file" "$output_file"; then
+                    log_info "MacWhisper Pro failed, trying local Whisper"
+                    if ! backend_attempt whisper local "$model" use_local_whisper "$audio_file" "$output_file"; then
+                        return 1
+                    fi
+                fi
+            else
+                if ! backend_attempt whisper local "$model" use_local_whisper "$audio_file" "$output_file"; then
+                    return 1
+                fi
+            fi
+            ;;
+        "openai")
+            if ! backend_attempt openai openai whisper-1 use_openai_api "$audio_file" "$output_file"; then
+                return 1
+            fi
+            ;;
+        "router")
+            if ! backend_attempt router router "$ROUTER_MODEL" use_router_api "$audio_file" "$output_file"; then
+                return 1
+            fi
+            ;;
+        *)
+            log_error "Unknown backend: $backend"
+            return 1
+            ;;
+    esac
+}
+
 # Main transcription function
 transcribe_audio() {
     local url="$1"
@@ -364,40 +619,117 @@ transcribe_audio() {
 
     validate_url "$url"
 
-    # Create temporary directory
-    TEMP_DIR=$(mktemp -d -t relayq-transcribe-XXXXXX)
+    # Create temporary directory (next to the cache so hits can be hard links)
+    if [[ "$RELAYQ_CACHE" == "1" ]] && mkdir -p "${RELAYQ_CACHE_DIR}/tmp" 2>/dev/null; then
+        TEMP_DIR=$(mktemp -d -p "${RELAYQ_CACHE_DIR}/tmp" relayq-transcribe-XXXXXX)
+    else
+        TEMP_DIR=$(mktemp -d -t relayq-transcribe-XXXXXX)
+    fi
     chmod 700 "$TEMP_DIR"
+    # Command substitution runs this in a subshell that doesn't inherit the EXIT trap
+    trap cleanup EXIT
 
     log_info "Starting transcription for: $url"
     log_info "Using backend: $backend"
+    local job_started
+    job_started=$(now_s)
 
-    # Download audio file
-    local audio_file
-    if ! audio_file=$(download_file "$url" "$TEMP_DIR"); then
-        return 1
-    fi
+    # Generate output filename
+    local input_basename=$(basename "$url")
+    input_basename="${input_basename%.*}"  # Remove extension
+    local output_file="${OUTPUT_DIR}/${input_basename}-transcript.txt"
 
-    # Convert to required format (WAV for local, MP3 for APIs)
-    local converted_file="${TEMP_DIR}/converted.wav"
     if [[ "$backend" == "local" ]]; then
-        if ! convert_audio "$audio_file" "$converted_file"; then
+        prepare_local_model
+    fi
+
+    # Cache: an unchanged URL (same ETag/length) maps to the media hash, and
+    # media hash x model x backend to a finished transcript. Streamed jobs
+    # never see the media, so their transcripts are keyed by the URL key.
+    local url_key="" media_hash=""
+    local transcript_key_suffix="$(transcript_model_id "$backend"):${backend}"
+    if url_key=$(media_cache url-key "$url"); then
+        media_hash=$(media_cache lookup download "$url_key") || media_hash=""
+    fi
+    if [[ -n "$media_hash" ]] && media_cache get transcript "${media_hash}:${transcript_key_suffix}" "$output_file" >/dev/null; then
+        log_info "Transcript cache hit (${media_hash:0:12})"
+        echo "$output_file"
+        return 0
+    fi
+    if [[ -n "$url_key" ]] && media_cache get transcript "${url_key}:${transcript_key_suffix}" "$output_file" >/dev/null; then
+        log_info "Transcript cache hit (streamed earlier)"
+        echo "$output_file"
+        return 0
+    fi
+
+    # Stream download -> ffmpeg -> whisper without staging audio on disk
+    if [[ "$backend" == "local" && "$WHISPER_STREAMING" == "1" && -f "$STREAM_TRANSCRIBE" && -z "$media_hash" ]]; then
+        log_info "Streaming download, decode and transcription"
+        local stream_started stream_stats="${TEMP_DIR}/stream_stats.json"
+        stream_started=$(now_s)
+        if python3 "$STREAM_TRANSCRIBE" --model "${LOCAL_WHISPER_MODEL:-$WHISPER_MODEL}" --device "$WHISPER_DEVICE" \
+            ${RELAYQ_RUNNER:+--runner "$RELAYQ_RUNNER"} --stats-json "$stream_stats" "$url" "$output_file"; then
+            record_stage stream "$stream_started" ok --stats-json "$stream_stats" \
+                --backend local --model "${LOCAL_WHISPER_MODEL:-$WHISPER_MODEL}"
+            # Streamed bytes stand in for the input file's size, so learn sees streamed jobs too
+            record_stage total "$job_started" ok --stats-json "$stream_stats" \
+                --backend "$backend" --model "$(transcript_model_id "$backend")"
+            if [[ -n "$url_key" ]]; then
+                media_cache put transcript "${url_key}:${transcript_key_suffix}" "$output_file" >/dev/null || true
+            fi
+            log_info "Transcription completed successfully"
+            echo "$output_file"
+            return 0
+        fi
+        record_stage stream "$stream_started" failed
+        log_warn "Streaming transcription failed, downloading the file first"
+    fi
+
+    # Download audio file
+    local audio_file="${TEMP_DIR}/$(basename "$url")"
+    if [[ -n "$media_hash" ]] && media_cache get download "$url_key" "$audio_file" --link >/dev/null; then
+        log_info "Download cache hit: $audio_file"
+    else
+        local download_started
+        download_started=$(now_s)
+        if ! audio_file=$(download_file "$url" "$TEMP_DIR"); then
+            record_stage download "$download_started" failed
             return 1
         fi
-        audio_file="$converted_file"
+        record_stage download "$download_started" ok --bytes-of "$audio_file"
+        if [[ -n "$url_key" ]]; then
+            media_hash=$(media_cache put download "$url_key" "$audio_file") || media_hash=""
+        else
+            media_hash=$(media_cache hash "$audio_file") || media_hash=""
+        fi
+        # Same audio already transcribed under another URL
+        if [[ -n "$media_hash" ]] && media_cache get transcript "${media_hash}:${transcript_key_suffix}" "$output_file" >/dev/null; then
+            log_info "Transcript cache hit (${media_hash:0:12})"
+            echo "$output_file"
+            return 0
+        fi
     fi
 
-    # Generate output filename
-    local input_basename=$(basename "$url")
-    input_basename="${input_basename%.*}"  # Remove extension
-    local output_file="${OUTPUT_DIR}/${input_basename}-transcript.txt"
+    local source_file="$audio_file"
 
     # Convert to required format (skip conversion for MacWhisper Pro)
     if [[ "$backend" == "local" ]]; then
         if [[ ! -d "/Applications/MacWhisper.app" ]]; then
             # Only convert if MacWhisper is NOT available
             local converted_file="${TEMP_DIR}/converted.wav"
-            if ! convert_audio "$audio_file" "$converted_file"; then
-                return 1
+            if [[ -n "$media_hash" ]] && media_cache get audio "${media_hash}:pcm16k" "$converted_file" --link >/dev/null; then
+                log_info "Converted audio cache hit"
+            else
+                local convert_started
+                convert_started=$(now_s)
+                if ! convert_audio "$audio_file" "$converted_file"; then
+                    record_stage convert "$convert_started" failed --bytes-of "$audio_file"
+                    return 1
+                fi
+                record_stage convert "$convert_started" ok --bytes-of "$audio_file" --audio "$converted_file"
+                if [[ -n "$media_hash" ]]; then
+                    media_cache put audio "${media_hash}:pcm16k" "$converted_file" >/dev/null || true
+                fi
             fi
             audio_file="$converted_file"
         else
@@ -405,38 +737,10 @@ transcribe_audio() {
         fi
     fi
 
-    # Transcribe based on backend
-    case "$backend" in
-        "local")
-            # Try MacWhisper Pro first, then fallback to local Whisper
-            if [[ -d "/Applications/MacWhisper.app" ]]; then
-                if ! use_macwhisper_pro "$audio_file" "$output_file"; then
-                    log_info "MacWhisper Pro failed, trying local Whisper"
-                    if ! use_local_whisper "$audio_file" "$output_file"; then
-                        return 1
-                    fi
-                fi
-            else
-                if ! use_local_whisper "$audio_file" "$output_file"; then
-                    return 1
-                fi
-            fi
-            ;;
-        "openai")
-            if ! use_openai_api "$audio_file" "$output_file"; then
-                return 1
-            fi
-            ;;
-        "router")
-            if ! use_router_api "$audio_file" "$output_file"; then
-                return 1
-            fi
-            ;;
-        *)
-            log_error "Unknown backend: $backend"
-            return 1
-            ;;
-    esac
+    # Transcribe based on backend (each attempt records its own timing)
+    if ! run_backend "$backend" "$audio_file" "$output_file"; then
+        return 1
+    fi
 
     # Verify output file was created
     if [[ ! -f "$output_file" || ! -s "$output_file" ]]; then
@@ -444,6 +748,14 @@ transcribe_audio() {
         return 1
     fi
 
+    if [[ -n "$media_hash" ]]; then
+        media_cache put transcript "${media_hash}:${transcript_key_suffix}" "$output_file" >/dev/null || true
+    fi
+
+    # Whole job against the original input: what bin/stage_timings.py learn feeds the scheduler
+    record_stage total "$job_started" ok --bytes-of "$source_file" --audio "$audio_file" \
+        --backend "$backend" --model "$(transcript_model_id "$backend")"
+
     log_info "Transcription completed successfully"
     echo "$output_file"
 }
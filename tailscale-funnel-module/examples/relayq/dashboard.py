@@ -12,10 +12,15 @@ Access:
 """
 
 import os
+import sys
 import subprocess
 import json
+import threading
+import time
+import uuid
 from datetime import datetime
-from flask import Flask, jsonify, render_template_string
+from urllib.parse import urlsplit
+from flask import Flask, Response, jsonify, render_template_string, request, stream_with_context
 from dotenv import load_dotenv
 
 # Load environment variables from unified RelayQ config
@@ -25,6 +30,184 @@ load_dotenv(ENV_FILE)
 app = Flask(__name__)
 BASE_URL = os.getenv('TAILSCALE_FUNNEL_BASE_URL', 'http://localhost:8000')
 PORT = int(os.getenv('RELAYQ_DASHBOARD_PORT', 8000))
+RELAYQ_HOME = os.path.expanduser(os.getenv('RELAYQ_HOME', '~/relayq'))
+
+# GitHub is queried by one background refresher every REFRESH_S, however many
+# viewers are connected; it goes idle after IDLE_S without viewers or API calls
+REFRESH_S = float(os.getenv('RELAYQ_DASHBOARD_REFRESH', 15))
+IDLE_S = float(os.getenv('RELAYQ_DASHBOARD_IDLE', 300))
+KEEPALIVE_S = 15
+
+# Intake queue: submissions per request, and GitHub dispatches per minute for the drain
+SUBMIT_MAX_BATCH = int(os.getenv('RELAYQ_SUBMIT_MAX_BATCH', 10000))
+SUBMIT_RATE_PER_MIN = float(os.getenv('RELAYQ_SUBMIT_RATE', 60))
+BACKENDS = ('local', 'openai', 'router')
+
+# Shared runner state cache (bin/runner_state.py), if the RelayQ checkout is present
+sys.path.insert(0, os.path.join(RELAYQ_HOME, 'bin'))
+try:
+    from runner_state import DEFAULT_MAX_AGE, read_runner_state
+except ImportError:
+    read_runner_state = None
+
+# Job ledger (bin/job_ledger.py), written by the batch dispatcher; the
+# refresher keeps its active jobs current from GitHub
+try:
+    from job_ledger import LedgerSync, open_ledger
+    ledger_sync = LedgerSync()
+except ImportError:
+    open_ledger = None
+    ledger_sync = None
+_ledger = None
+
+# Intake queue (queued jobs in the ledger, dispatched by bin/dispatcher.py's QueueDrain)
+try:
+    from dispatcher import Dispatcher, QueueDrain
+    from job_ledger import JobLedger
+    from select_target import POOLED_WORKFLOW, RUNNER_WORKFLOWS
+    SUBMIT_WORKFLOWS = {POOLED_WORKFLOW} | set(RUNNER_WORKFLOWS.values())
+except ImportError:
+    QueueDrain = None
+_drain = None
+_drain_lock = threading.Lock()
+
+# Prometheus metrics (bin/metrics.py), updated on each refresher tick
+try:
+    from metrics import MetricsCollector
+    metrics = MetricsCollector()
+except ImportError:
+    metrics = None
+
+def job_ledger():
+    """Shared ledger handle (one SQLite connection per request thread), or None"""
+    global _ledger
+    if _ledger is None and open_ledger is not None:
+        _ledger = open_ledger()
+    return _ledger
+
+def queue_drain():
+    """Background drain of the intake queue (started on first use), or None without bin/"""
+    global _drain, _ledger
+    with _drain_lock:
+        if _drain is None and QueueDrain is not None:
+            if _ledger is None:
+                _ledger = JobLedger()
+            _drain = QueueDrain(_ledger, Dispatcher(rate_per_min=SUBMIT_RATE_PER_MIN))
+            threading.Thread(target=_drain.run, name='queue-drain', daemon=True).start()
+    return _drain
+
+def ledger_time(value):
+    """Ledger epoch seconds as ISO-8601, like the GitHub API timestamps"""
+    return datetime.fromtimestamp(value).isoformat() if value else None
+
+class TTLCache:
+    """TTL cache whose misses are single-flight: concurrent callers wait for one load"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.loading = {}
+
+    def get(self, key, loader, force=False):
+        while True:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry and not force and entry[0] > time.monotonic():
+                    return entry[1]
+                pending = self.loading.get(key)
+                if pending is None:
+                    pending = self.loading[key] = threading.Event()
+                    break
+            # Someone else is loading it: use their result
+            pending.wait()
+            force = False
+
+        try:
+            value = loader()
+            with self.lock:
+                self.entries[key] = (time.monotonic() + self.ttl, value)
+            return value
+        finally:
+            with self.lock:
+                del self.loading[key]
+            pending.set()
+
+def update_metrics(runners):
+    """Feed one refresher tick into the metrics collector"""
+    limits = []
+    if read_runner_state is not None:
+        limits.append((read_runner_state(max_age=DEFAULT_MAX_AGE) or {}).get('rate_limit'))
+    if _drain is not None:
+        limits.append(_drain.dispatcher.rate_limit)
+    limits = [l for l in limits if l]
+    metrics.update(job_ledger(), runners,
+                   max(limits, key=lambda l: l.get('observed_at', 0)) if limits else None)
+
+class Refresher:
+    """Background thread that reloads the dashboard data and wakes SSE streams on change"""
+
+    def __init__(self, cache, interval=REFRESH_S):
+        self.cache = cache
+        self.interval = interval
+        self.changed = threading.Condition()
+        self.version = 0
+        self.data = None
+        self.snapshot = None
+        self.subscribers = 0
+        self.last_demand = time.monotonic()
+        self.thread = None
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        """Start on first use (not at import, so the debug reloader's parent stays idle)"""
+        with self.start_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='dashboard-refresher', daemon=True)
+                self.thread.start()
+
+    def subscribe(self, delta):
+        with self.changed:
+            self.subscribers += delta
+        self.last_demand = time.monotonic()
+
+    def touch(self):
+        self.last_demand = time.monotonic()
+        self.start()
+
+    def idle(self):
+        return self.subscribers == 0 and time.monotonic() - self.last_demand > IDLE_S
+
+    def refresh(self):
+        if ledger_sync is not None:
+            ledger_sync.maybe_sync()
+        data = {
+            "runners": self.cache.get('runners', load_runners, force=True)[0],
+            "jobs": self.cache.get('jobs', load_jobs, force=True)[0],
+        }
+        with self.changed:
+            if data != self.data:
+                self.data = data
+                self.snapshot = dict(data, updated_at=datetime.now().isoformat())
+                self.version += 1
+                self.changed.notify_all()
+        if metrics is not None:
+            update_metrics(data['runners'].get('runners'))
+
+    def run(self):
+        while True:
+            if not self.idle():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Warning: dashboard refresh failed: {e}", file=sys.stderr)
+            time.sleep(self.interval)
+
+    def wait(self, version, timeout):
+        """(version, snapshot) once newer than `version`, or the current one after timeout"""
+        with self.changed:
+            self.changed.wait_for(lambda: self.version > version, timeout)
+            return self.version, self.snapshot
 
 # HTML Template
 HTML_TEMPLATE = """
@@ -108,7 +291,7 @@ HTML_TEMPLATE = """
     <div class="container">
         <h1>🚀 RelayQ Dashboard</h1>
         <p>Public URL: <strong>{{ base_url }}</strong></p>
-        <button class="refresh" onclick="location.reload()">Refresh</button>
+        <button class="refresh" onclick="loadAll()">Refresh</button>
 
         <div class="card">
             <h2>System Status</h2>
@@ -136,49 +319,74 @@ HTML_TEMPLATE = """
                 <li><a href="/api/health">/api/health</a> - Health check</li>
                 <li><a href="/api/runners">/api/runners</a> - Runner status (JSON)</li>
                 <li><a href="/api/jobs">/api/jobs</a> - Recent jobs (JSON)</li>
+                <li>/api/jobs/&lt;id&gt; - One submitted job (JSON)</li>
+                <li>POST /api/submit - Dispatch one job (?async=1 to queue it)</li>
+                <li>POST /api/submit/batch - Queue jobs (JSON array or NDJSON)</li>
+                <li>/api/events - Live updates (Server-Sent Events)</li>
+                <li><a href="/metrics">/metrics</a> - Prometheus metrics</li>
             </ul>
         </div>
     </div>
 
     <script>
-        // Auto-refresh every 30 seconds
-        setTimeout(() => location.reload(), 30000);
-
-        // Load runners
-        fetch('/api/runners')
-            .then(r => r.json())
-            .then(data => {
-                const html = data.runners.map(r =>
-                    `<div class="runner-item runner-${r.status}">
-                        ${r.name} - ${r.status}
-                    </div>`
-                ).join('');
-                document.getElementById('runners').innerHTML = html || '<p>No runners found</p>';
-            })
-            .catch(e => {
-                document.getElementById('runners').innerHTML = '<p class="status-error">Error loading runners</p>';
-            });
+        function renderRunners(data) {
+            const html = data.runners.map(r =>
+                `<div class="runner-item runner-${r.status}">
+                    ${r.name} - ${r.status}
+                </div>`
+            ).join('');
+            document.getElementById('runners').innerHTML = html || '<p>No runners found</p>';
+        }
 
-        // Load jobs
-        fetch('/api/jobs')
-            .then(r => r.json())
-            .then(data => {
-                const html = data.jobs.map(j =>
-                    `<div class="job-item">
-                        <strong>${j.name}</strong> - ${j.status}<br>
-                        <small>${j.updated_at}</small>
-                    </div>`
-                ).join('');
-                document.getElementById('jobs').innerHTML = html || '<p>No recent jobs</p>';
-            })
-            .catch(e => {
-                document.getElementById('jobs').innerHTML = '<p class="status-error">Error loading jobs</p>';
+        function renderJobs(data) {
+            const html = data.jobs.map(j =>
+                `<div class="job-item">
+                    <strong>${j.name}</strong> - ${j.status}<br>
+                    <small>${j.updated_at}</small>
+                </div>`
+            ).join('');
+            document.getElementById('jobs').innerHTML = html || '<p>No recent jobs</p>';
+        }
+
+        function loadAll() {
+            fetch('/api/runners')
+                .then(r => r.json())
+                .then(renderRunners)
+                .catch(e => {
+                    document.getElementById('runners').innerHTML = '<p class="status-error">Error loading runners</p>';
+                });
+
+            fetch('/api/jobs')
+                .then(r => r.json())
+                .then(renderJobs)
+                .catch(e => {
+                    document.getElementById('jobs').innerHTML = '<p class="status-error">Error loading jobs</p>';
+                });
+        }
+
+        // Live updates pushed by the server; falls back to polling without EventSource
+        if (window.EventSource) {
+            const events = new EventSource('/api/events');
+            events.addEventListener('update', e => {
+                const data = JSON.parse(e.data);
+                renderRunners(data.runners);
+                renderJobs(data.jobs);
+                document.getElementById('timestamp').textContent = data.updated_at.replace('T', ' ').slice(0, 19);
             });
+        } else {
+            loadAll();
+            setInterval(loadAll, 30000);
+        }
     </script>
 </body>
 </html>
 """
 
+@app.before_request
+def start_queue_drain():
+    """Resume draining jobs queued before a restart without waiting for a new submission"""
+    queue_drain()
+
 @app.route('/')
 def index():
     """Dashboard homepage"""
@@ -198,9 +406,13 @@ def health():
         "base_url": BASE_URL
     })
 
-@app.route('/api/runners')
-def runners():
-    """Get runner status from GitHub API"""
+def load_runners():
+    """Runner status from the runner state cache, else GitHub API, as (payload, HTTP status)"""
+    if read_runner_state is not None:
+        state = read_runner_state(max_age=DEFAULT_MAX_AGE)
+        if state is not None:
+            return {"runners": state.get('runners', []), "checked_at": state.get('checked_at')}, 200
+
     try:
         result = subprocess.run(
             ['gh', 'api', 'repos/Khamel83/relayq/actions/runners'],
@@ -220,20 +432,38 @@ def runners():
                 }
                 for r in data.get('runners', [])
             ]
-            return jsonify({"runners": runners_list})
+            return {"runners": runners_list}, 200
         else:
-            return jsonify({"error": "Failed to fetch runners", "runners": []}), 500
+            return {"error": "Failed to fetch runners", "runners": []}, 500
     except subprocess.TimeoutExpired:
-        return jsonify({"error": "Request timeout", "runners": []}), 504
+        return {"error": "Request timeout", "runners": []}, 504
     except Exception as e:
-        return jsonify({"error": str(e), "runners": []}), 500
+        return {"error": str(e), "runners": []}, 500
+
+def load_jobs():
+    """Recent jobs from the job ledger, else workflow runs from GitHub API, as (payload, HTTP status)"""
+    ledger = job_ledger()
+    if ledger is not None:
+        jobs_list = [
+            {
+                "id": j['run_id'] or j['job_key'],
+                "name": f"{j['job_type'] or 'job'} {j['job_id'] or j['job_key']}",
+                "status": j['state'],
+                "runner": j['runner'],
+                "conclusion": {'completed': 'success', 'failed': 'failure'}.get(j['state']),
+                "created_at": ledger_time(j['created_at']),
+                "updated_at": ledger_time(j['updated_at']),
+                "html_url": j['run_url']
+            }
+            for j in ledger.recent(10)
+        ]
+        if jobs_list:
+            return {"jobs": jobs_list, "source": "ledger"}, 200
 
-@app.route('/api/jobs')
-def jobs():
-    """Get recent workflow runs from GitHub API"""
     try:
+        # First page only: ten runs, not the whole history
         result = subprocess.run(
-            ['gh', 'api', 'repos/Khamel83/relayq/actions/runs', '--paginate', '-q', '.workflow_runs[:10]'],
+            ['gh', 'api', 'repos/Khamel83/relayq/actions/runs?per_page=10', '-q', '.workflow_runs'],
             capture_output=True,
             text=True,
             timeout=10
@@ -253,26 +483,186 @@ def jobs():
                 }
                 for j in (data if isinstance(data, list) else [])
             ]
-            return jsonify({"jobs": jobs_list})
+            return {"jobs": jobs_list}, 200
         else:
-            return jsonify({"error": "Failed to fetch jobs", "jobs": []}), 500
+            return {"error": "Failed to fetch jobs", "jobs": []}, 500
     except subprocess.TimeoutExpired:
-        return jsonify({"error": "Request timeout", "jobs": []}), 504
+        return {"error": "Request timeout", "jobs": []}, 504
     except Exception as e:
-        return jsonify({"error": str(e), "jobs": []}), 500
+        return {"error": str(e), "jobs": []}, 500
+
+_cache = TTLCache(REFRESH_S)
+refresher = Refresher(_cache)
+
+@app.route('/api/runners')
+def runners():
+    """Runner status (cached; concurrent requests share one lookup)"""
+    refresher.touch()
+    payload, status = _cache.get('runners', load_runners)
+    return jsonify(payload), status
+
+@app.route('/api/jobs')
+def jobs():
+    """Recent jobs (cached; concurrent requests share one lookup)"""
+    refresher.touch()
+    payload, status = _cache.get('jobs', load_jobs)
+    return jsonify(payload), status
+
+@app.route('/api/events')
+def events():
+    """Server-Sent Events: the current runners/jobs snapshot now and on every change"""
+    refresher.touch()
+
+    def stream():
+        refresher.subscribe(1)
+        try:
+            version = 0
+            while True:
+                latest, snapshot = refresher.wait(version, KEEPALIVE_S)
+                if latest > version and snapshot is not None:
+                    version = latest
+                    yield f"event: update\ndata: {json.dumps(snapshot)}\n\n"
+                else:
+                    # Keeps proxies (Tailscale Funnel) from closing an idle stream
+                    yield ": keepalive\n\n"
+        finally:
+            refresher.subscribe(-1)
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Queue, latency and runner utilization metrics in Prometheus text format"""
+    if metrics is None:
+        return Response("metrics unavailable: RelayQ bin/ not found\n", status=503, mimetype='text/plain')
+    # Collection happens on the refresher tick; a scrape only keeps it running
+    refresher.touch()
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def validate_submission(item):
+    """Ledger job for one submission; raises ValueError if it is invalid"""
+    if not isinstance(item, dict):
+        raise ValueError("job must be a JSON object")
+    url = item.get('url')
+    parts = urlsplit(url) if isinstance(url, str) else None
+    if parts is None or parts.scheme not in ('http', 'https') or not parts.netloc:
+        raise ValueError("url must be an http(s) URL")
+    backend = item.get('backend', 'local')
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of: {', '.join(BACKENDS)}")
+    workflow = item.get('workflow') or POOLED_WORKFLOW
+    if workflow not in SUBMIT_WORKFLOWS:
+        raise ValueError(f"unknown workflow: {workflow}")
+
+    inputs = {"url": url, "backend": backend}
+    if item.get('model'):
+        inputs['model'] = str(item['model'])
+    # A caller-supplied id makes resubmission idempotent
+    job_id = str(item.get('id') or uuid.uuid4().hex)
+    return {"id": job_id, "job_type": "transcribe", "workflow": workflow, "inputs": inputs}
+
+def parse_submissions(body):
+    """(index, job or None, error or None) per item of a JSON array or NDJSON body"""
+    text = body.decode('utf-8')
+    if text.lstrip().startswith('['):
+        items = json.loads(text)
+    else:
+        items = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(ValueError(f"invalid JSON: {e}"))
+    if len(items) > SUBMIT_MAX_BATCH:
+        raise OverflowError(f"at most {SUBMIT_MAX_BATCH} jobs per request")
+
+    for index, item in enumerate(items):
+        try:
+            if isinstance(item, ValueError):
+                raise item
+            yield index, validate_submission(item), None
+        except ValueError as e:
+            yield index, None, str(e)
+
+def enqueue(drain, jobs):
+    """Queue jobs in one ledger transaction and wake the drain"""
+    drain.ledger.record_jobs(jobs)
+    drain.wake.set()
+
+@app.route('/api/submit/batch', methods=['POST'])
+def submit_batch():
+    """
+    Queue many transcription jobs; returns job IDs without waiting for GitHub
+
+    Example:
+        curl -X POST https://machine.ts.net:8000/api/submit/batch \
+          -H "Content-Type: application/x-ndjson" \
+          --data-binary $'{"url": "https://example.com/a.mp3"}\n{"url": "https://example.com/b.mp3", "backend": "router"}'
+    """
+    drain = queue_drain()
+    if drain is None:
+        return jsonify({"error": "Job queue unavailable: RelayQ bin/ not found under RELAYQ_HOME"}), 503
+
+    accepted, rejected = [], []
+    try:
+        for index, job, error in parse_submissions(request.get_data()):
+            if job is not None:
+                accepted.append((index, job))
+            else:
+                rejected.append({"index": index, "error": error})
+    except OverflowError as e:
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"error": f"Body must be a JSON array or NDJSON: {e}"}), 400
+
+    if accepted:
+        enqueue(drain, [job for _, job in accepted])
+    return jsonify({
+        "queued": len(accepted),
+        "jobs": [{"index": index, "id": job['id']} for index, job in accepted],
+        "rejected": rejected
+    }), 202 if accepted else 400
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Status of one submitted job from the job ledger"""
+    ledger = job_ledger()
+    job = ledger.get(job_id) if ledger is not None else None
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify({
+        "id": job['job_key'],
+        "status": job['state'],
+        "workflow": job['workflow'],
+        "inputs": json.loads(job['inputs']) if job['inputs'] else None,
+        "runner": job['runner'],
+        "run_id": job['run_id'],
+        "html_url": job['run_url'],
+        "error": job['error'],
+        "attempts": job['attempts'],
+        "created_at": ledger_time(job['created_at']),
+        "dispatched_at": ledger_time(job['dispatched_at']),
+        "started_at": ledger_time(job['started_at']),
+        "finished_at": ledger_time(job['finished_at']),
+        "updated_at": ledger_time(job['updated_at'])
+    })
 
 @app.route('/api/submit', methods=['POST'])
 def submit_job():
     """
-    Submit a transcription job
+    Submit a transcription job and wait for dispatch.sh to dispatch it
+
+    With ?async=1 the job is queued like /api/submit/batch instead, and the
+    response is a 202 with its status URL.
 
     Example:
         curl -X POST https://machine.ts.net:8000/api/submit \
           -H "Content-Type: application/json" \
           -d '{"url": "https://example.com/audio.mp3", "backend": "local"}'
     """
-    from flask import request
-
     data = request.json
     if not data or 'url' not in data:
         return jsonify({"error": "Missing required field: url"}), 400
@@ -280,13 +670,30 @@ def submit_job():
     url = data['url']
     backend = data.get('backend', 'local')
 
+    if request.args.get('async') == '1':
+        drain = queue_drain()
+        if drain is None:
+            return jsonify({"error": "Job queue unavailable: RelayQ bin/ not found under RELAYQ_HOME"}), 503
+        try:
+            job = validate_submission(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        enqueue(drain, [job])
+        return jsonify({
+            "status": "queued",
+            "id": job['id'],
+            "url": url,
+            "backend": backend,
+            "status_url": f"/api/jobs/{job['id']}"
+        }), 202
+
     try:
         result = subprocess.run(
             ['./bin/dispatch.sh', '.github/workflows/transcribe_audio.yml',
              f'url={url}', f'backend={backend}'],
             capture_output=True,
             text=True,
-            cwd=os.path.expanduser('~/relayq'),
+            cwd=RELAYQ_HOME,
             timeout=30
         )
 
@@ -0,0 +1,126 @@
+"""
+Fake GitHub API for the dispatcher and run resolver tests.
+
+Serves the endpoints those use: GET /repos/<repo> (auth check),
+POST .../workflows/<file>/dispatches and GET .../actions/runs. Dispatches
+that start a run add one whose display_title carries the relayq_id, the way
+the transcribe workflows name their runs. Each dispatch takes the next
+behaviour from server.dispatch_modes (default 'ok'):
+
+    ok         204, run started
+    lost       run NOT started, connection dropped before any response
+    applied    run started, connection dropped before any response
+    429 / 500  that status (429 with Retry-After: 0), no run
+    422        validation error, no run
+"""
+
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+def iso(when: datetime) -> str:
+    return when.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status: int, body=None, headers=()):
+        data = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == f"/repos/{server.repo}":
+            self.reply(200, {'full_name': server.repo})
+        elif url.path == f"/repos/{server.repo}/actions/runs":
+            with server.lock:
+                server.run_queries.append(query)
+                if server.runs_status != 200:
+                    self.reply(server.runs_status, {'message': 'unavailable'})
+                    return
+                since = query.get('created', ['>=1970-01-01T00:00:00Z'])[0].lstrip('>=')
+                runs = [r for r in reversed(server.runs) if r['created_at'] >= since]
+            per_page = int(query.get('per_page', ['30'])[0])
+            page = int(query.get('page', ['1'])[0])
+            self.reply(200, {'total_count': len(runs), 'workflow_runs': runs[(page - 1) * per_page:page * per_page]})
+        else:
+            self.reply(404, {'message': 'Not Found'})
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        url = urlsplit(self.path)
+        if not url.path.endswith('/dispatches'):
+            self.reply(404, {'message': 'Not Found'})
+            return
+        with server.lock:
+            mode = server.dispatch_modes.pop(0) if server.dispatch_modes else 'ok'
+            server.dispatches.append(payload)
+            if mode in ('ok', 'applied'):
+                server.add_run(url.path.split('/')[-2], (payload.get('inputs') or {}).get('relayq_id'))
+        if mode in ('lost', 'applied'):
+            # The request reached GitHub, the response never reaches the client
+            self.close_connection = True
+        elif mode == 'ok':
+            self.reply(204)
+        elif mode == '429':
+            self.reply(429, {'message': 'slow down'}, [('Retry-After', '0')])
+        else:
+            self.reply(int(mode), {'message': f"fake {mode}"})
+
+class FakeGitHub(ThreadingHTTPServer):
+    """Start with start(), stop with stop(); point GitHubAPI(base_url=server.url) at it"""
+
+    daemon_threads = True
+
+    def __init__(self, repo: str = 'owner/repo'):
+        super().__init__(('127.0.0.1', 0), FakeGitHubHandler)
+        self.repo = repo
+        self.lock = threading.Lock()
+        self.dispatch_modes = []
+        self.dispatches = []
+        self.runs = []
+        self.run_queries = []
+        self.runs_status = 200
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def add_run(self, workflow: str, token=None, created_at=None):
+        """Record a workflow_dispatch run (callers that are not the handler must hold no lock)"""
+        run_id = 1000 + len(self.runs)
+        self.runs.append({
+            'id': run_id,
+            'name': workflow,
+            'display_title': f"Transcribe {token}" if token else workflow,
+            'status': 'queued',
+            'html_url': f"https://github.com/{self.repo}/actions/runs/{run_id}",
+            'created_at': created_at or iso(datetime.now(timezone.utc)),
+        })
+        return run_id
+
+    def runs_for(self, token: str):
+        return [r for r in self.runs if token in r['display_title']]
+
+    def start(self) -> 'FakeGitHub':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,228 @@
+"""
+Tests for bin/asr_dispatch.py against a local fake transcription API
+(what OPENAI_BASE_URL / ROUTER_BASE_URL point at): fallback, rate-limit
+cool-downs, hedging, and stats shared between processes.
+
+Run with: python3 -m unittest discover -s tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+import asr_dispatch
+from asr_dispatch import ASRError, Dispatcher, EndpointStats, configured_endpoints
+
+class FakeASRHandler(BaseHTTPRequestHandler):
+    """Behaves per API key, from server.modes (default 'ok'):
+
+        ok         200 with the transcript
+        500        server error
+        429        rate limited, Retry-After: 120
+        slow       200, but only once server.release is set
+        truncated  Content-Length promises more than is sent
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        key = self.headers.get('Authorization', '').replace('Bearer ', '')
+        with server.lock:
+            server.requests.append(key)
+        mode = server.modes.get(key, 'ok')
+        if mode == 'slow':
+            server.release.wait(10)
+        if mode in ('ok', 'slow'):
+            self.reply(200, f"transcript from {key}".encode())
+        elif mode == '429':
+            self.reply(429, b'rate limited', [('Retry-After', '120')])
+        elif mode == 'truncated':
+            self.send_response(200)
+            self.send_header('Content-Length', '1000')
+            self.end_headers()
+            self.wfile.write(b'partial')
+            self.close_connection = True
+        else:
+            self.reply(int(mode), b'error')
+
+    def reply(self, status: int, data: bytes, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+class FakeASR(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, modes=None):
+        super().__init__(('127.0.0.1', 0), FakeASRHandler)
+        self.modes = modes or {}
+        self.requests = []
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/v1"
+
+    def stop(self):
+        self.release.set()
+        self.shutdown()
+        self.server_close()
+
+class DispatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='relayq-test-')
+        self.audio = os.path.join(self.workdir, 'clip.mp3')
+        with open(self.audio, 'wb') as f:
+            f.write(b'\0' * 4096)
+        self.stats_path = os.path.join(self.workdir, 'asr_stats.json')
+        self.openai, self.router = FakeASR(), FakeASR()
+        self.saved = (asr_dispatch.OPENAI_BASE_URL, asr_dispatch.ROUTER_BASE_URL, asr_dispatch.MIN_HEDGE_S)
+        asr_dispatch.OPENAI_BASE_URL = self.openai.url
+        asr_dispatch.ROUTER_BASE_URL = self.router.url
+
+    def tearDown(self):
+        asr_dispatch.OPENAI_BASE_URL, asr_dispatch.ROUTER_BASE_URL, asr_dispatch.MIN_HEDGE_S = self.saved
+        self.openai.stop()
+        self.router.stop()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def dispatcher(self, **env) -> Dispatcher:
+        return Dispatcher(configured_endpoints(env), EndpointStats(self.stats_path), timeout=5)
+
+    def transcribe(self, dispatcher: Dispatcher, **kwargs):
+        """transcribe() in a thread, so a hang fails the test instead of stalling the suite"""
+        outcome = {}
+
+        def run():
+            try:
+                outcome['result'] = dispatcher.transcribe(self.audio, **kwargs)
+            except ASRError as e:
+                outcome['error'] = e
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive(), "transcribe() did not return")
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+
+    def test_failing_endpoint_falls_back(self):
+        self.openai.modes = {'sk-broken': '500'}
+        dispatcher = self.dispatcher(OPENAI_API_KEY='sk-broken', OPENROUTER_KEYS='or-1')
+        result = self.transcribe(dispatcher, backend='openai')
+        self.assertEqual(result['text'], 'transcript from or-1')
+        self.assertEqual(result['attempts'], 2)
+        self.assertIn('HTTP 500', result['errors'][0])
+        self.assertEqual((self.openai.requests, self.router.requests), (['sk-broken'], ['or-1']))
+
+    def test_all_endpoints_failing_raises(self):
+        self.openai.modes = {'sk-broken': '500'}
+        self.router.modes = {'or-1': '500'}
+        dispatcher = self.dispatcher(OPENAI_API_KEY='sk-broken', OPENROUTER_KEYS='or-1')
+        with self.assertRaisesRegex(ASRError, 'all endpoints failed'):
+            self.transcribe(dispatcher)
+
+    def test_truncated_response_falls_back_instead_of_hanging(self):
+        self.router.modes = {'or-1': 'truncated'}
+        dispatcher = self.dispatcher(OPENROUTER_KEYS='or-1,or-2')
+        result = self.transcribe(dispatcher)
+        self.assertEqual(result['text'], 'transcript from or-2')
+        self.assertIn('IncompleteRead', result['errors'][0])
+        self.assertEqual(dispatcher.busy, {e.id: 0 for e in dispatcher.endpoints})
+
+    def test_rate_limit_cools_down_for_retry_after(self):
+        self.router.modes = {'or-1': '429'}
+        dispatcher = self.dispatcher(OPENROUTER_KEYS='or-1,or-2')
+        limited = dispatcher.endpoints[0]
+        self.assertEqual(self.transcribe(dispatcher)['text'], 'transcript from or-2')
+
+        # The cool-down is in the shared file, so a new process skips the key too
+        stats = EndpointStats(self.stats_path)
+        self.assertTrue(stats.cooling(limited.id, time.time() + 100))
+        self.assertFalse(stats.cooling(limited.id, time.time() + 130))
+        dispatcher = Dispatcher(dispatcher.endpoints, stats, timeout=5)
+        self.assertEqual(self.transcribe(dispatcher)['attempts'], 1)
+        self.assertEqual(self.router.requests, ['or-1', 'or-2', 'or-2'])
+
+    def test_hedge_starts_after_primary_deadline(self):
+        asr_dispatch.MIN_HEDGE_S = 0.3
+        self.openai.modes = {'sk-slow': 'slow'}
+        dispatcher = self.dispatcher(OPENAI_API_KEY='sk-slow', OPENROUTER_KEYS='or-1')
+        started = time.monotonic()
+        result = self.transcribe(dispatcher, backend='openai', hedge=True)
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+        self.assertTrue(result['hedged'])
+        self.assertEqual(result['text'], 'transcript from or-1')
+        self.assertEqual((self.openai.requests, self.router.requests), (['sk-slow'], ['or-1']))
+
+    def test_no_hedge_without_flag(self):
+        asr_dispatch.MIN_HEDGE_S = 0.1
+        self.openai.modes = {'sk-slow': 'slow'}
+        dispatcher = self.dispatcher(OPENAI_API_KEY='sk-slow', OPENROUTER_KEYS='or-1')
+        threading.Timer(0.5, self.openai.release.set).start()
+        result = self.transcribe(dispatcher, backend='openai')
+        self.assertFalse(result['hedged'])
+        self.assertEqual(result['text'], 'transcript from sk-slow')
+        self.assertEqual(self.router.requests, [])
+
+class EndpointStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='relayq-test-')
+        self.path = os.path.join(self.workdir, 'relayq', 'asr_stats.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_save_merges_concurrent_instances(self):
+        # Two jobs that loaded the file before either saved
+        first, second = EndpointStats(self.path), EndpointStats(self.path)
+        first.record('openai#a', True, 2.0, 1.0)
+        first.record('router#b', False, 1.0, 1.0, ASRError('HTTP 500', 500))
+        second.record('openai#a', True, 4.0, 1.0)
+        second.record('openai#a', False, 1.0, 1.0, ASRError('HTTP 429', 429, 30))
+        first.save()
+        second.save()
+
+        merged = EndpointStats(self.path)
+        self.assertEqual(merged.data, second.data)
+        entry = merged.entry('openai#a')
+        self.assertEqual((entry['ok'], entry['errors']), (2, 1))
+        self.assertEqual(entry['s_per_mb'], [2.0, 4.0])
+        self.assertTrue(merged.cooling('openai#a', time.time()))
+        self.assertEqual(merged.entry('router#b')['errors'], 1)
+
+        # Saved events are not merged a second time
+        first.save()
+        self.assertEqual(EndpointStats(self.path).entry('openai#a')['ok'], 2)
+
+    def test_hedge_deadline_uses_p95_once_sampled(self):
+        stats = EndpointStats(self.path)
+        self.assertEqual(stats.hedge_deadline('openai#a', 2.0), 2.0 * asr_dispatch.DEFAULT_HEDGE_S_PER_MB)
+        for seconds in (1, 2, 3, 4, 20):
+            stats.record('openai#a', True, float(seconds), 1.0)
+        self.assertEqual(stats.hedge_deadline('openai#a', 2.0), 40.0)
+        self.assertEqual(stats.hedge_deadline('openai#a', 0.01), asr_dispatch.MIN_HEDGE_S)
+
+if __name__ == '__main__':
+    unittest.main()
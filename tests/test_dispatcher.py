@@ -0,0 +1,152 @@
+"""
+Tests for bin/dispatcher.py: token bucket pacing, retry_delay, and
+dispatching against a fake GitHub that rate limits, fails, and drops
+responses. A dispatch whose response is lost must never start a second run.
+
+Run with: python3 -m unittest discover -s tests
+"""
+
+import contextlib
+import io
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import dispatcher
+from dispatcher import Dispatcher, TokenBucket, retry_delay
+from fake_github import FakeGitHub
+from github_api import Response
+
+TRANSCRIBE = '.github/workflows/transcribe_mac.yml'
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_burst_then_paced(self):
+        bucket = TokenBucket(rate=20.0, burst=3)
+        started = time.monotonic()
+        for _ in range(3):
+            bucket.acquire()
+        self.assertLess(time.monotonic() - started, 0.05)
+        for _ in range(4):
+            bucket.acquire()
+        # 4 more tokens at 20/s
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+    def test_pause_holds_every_caller(self):
+        bucket = TokenBucket(rate=50.0, burst=5)
+        bucket.pause(0.3)
+        started = time.monotonic()
+        bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.28)
+
+class RetryDelayTest(unittest.TestCase):
+
+    def test_delays(self):
+        reset = str(int(time.time()) + 30)
+        cases = [
+            (Response(429, {'retry-after': '7'}, b''), 1, 7.0),
+            (Response(403, {'x-ratelimit-remaining': '0', 'x-ratelimit-reset': reset}, b''), 1, 30.0),
+            (Response(403, {}, b'You have exceeded a secondary rate limit'), 1, 60.0),
+            (Response(502, {}, b''), 2, 4.0),
+            (Response(503, {}, b''), 9, 30.0),
+        ]
+        for response, attempt, expected in cases:
+            with self.subTest(status=response.status, headers=response.headers):
+                self.assertAlmostEqual(retry_delay(response, attempt), expected, delta=1.5)
+
+    def test_permanent_errors(self):
+        for response in (Response(403, {}, b'Resource not accessible'), Response(404, {}, b''),
+                         Response(422, {}, b'Unexpected inputs')):
+            with self.subTest(status=response.status):
+                self.assertIsNone(retry_delay(response, 1))
+
+class DispatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = (dispatcher.CONFIRM_TIMEOUT_S, dispatcher.CONFIRM_INTERVAL_S)
+        dispatcher.CONFIRM_TIMEOUT_S = 0.5
+        dispatcher.CONFIRM_INTERVAL_S = 0.1
+        self.github = FakeGitHub().start()
+        self.dispatcher = Dispatcher('owner/repo', concurrency=2, rate_per_min=6000,
+                                     api_url=self.github.url, token='')
+
+    def tearDown(self):
+        self.dispatcher.close()
+        self.github.stop()
+        dispatcher.CONFIRM_TIMEOUT_S, dispatcher.CONFIRM_INTERVAL_S = self.saved
+
+    def dispatch(self, workflow: str = TRANSCRIBE, **job):
+        with contextlib.redirect_stderr(io.StringIO()):
+            return self.dispatcher.dispatch(dict(job, id='ep-1', workflow=workflow))
+
+    def test_dispatched_with_correlation_token(self):
+        result = self.dispatch(inputs={'url': 'https://example.com/a.mp3', 'size': 12, 'fast': True})
+        self.assertEqual(result['status'], 'dispatched')
+        self.assertEqual(result['http_status'], 204)
+        self.assertRegex(result['relayq_id'], r'^rq-[0-9a-f]{16}$')
+        self.assertEqual(result['job_key'], result['relayq_id'])
+        payload, = self.github.dispatches
+        self.assertEqual(payload['inputs'], {'url': 'https://example.com/a.mp3', 'size': '12', 'fast': True,
+                                             'relayq_id': result['relayq_id']})
+
+    def test_rate_limited_then_dispatched(self):
+        self.github.dispatch_modes = ['429', '429']
+        result = self.dispatch()
+        self.assertEqual((result['status'], result['attempts']), ('dispatched', 3))
+        self.assertEqual(len(self.github.dispatches), 3)
+
+    def test_validation_error_is_not_retried(self):
+        self.github.dispatch_modes = ['422']
+        result = self.dispatch()
+        self.assertEqual((result['status'], result['http_status'], result['attempts']), ('failed', 422, 1))
+        self.assertEqual(len(self.github.dispatches), 1)
+
+    def test_lost_response_for_applied_dispatch_is_not_resent(self):
+        self.github.dispatch_modes = ['applied']
+        result = self.dispatch()
+        self.assertEqual(result['status'], 'dispatched')
+        self.assertNotIn('error', result)
+        self.assertEqual(len(self.github.dispatches), 1)
+        run, = self.github.runs_for(result['relayq_id'])
+        self.assertEqual(result['run_id'], run['id'])
+
+    def test_lost_response_without_a_run_is_resent_once(self):
+        self.github.dispatch_modes = ['lost']
+        result = self.dispatch()
+        self.assertEqual((result['status'], result['attempts']), ('dispatched', 2))
+        self.assertEqual(len(self.github.dispatches), 2)
+        self.assertEqual(len(self.github.runs_for(result['relayq_id'])), 1)
+        # Both attempts carried the same token, so the resolver can only ever find one run
+        self.assertEqual({p['inputs']['relayq_id'] for p in self.github.dispatches}, {result['relayq_id']})
+
+    def test_lost_response_unverifiable_is_failed_not_resent(self):
+        self.github.dispatch_modes = ['lost']
+        self.github.runs_status = 500
+        result = self.dispatch()
+        self.assertEqual(result['status'], 'failed')
+        self.assertIn('no response', result['error'])
+        self.assertEqual(len(self.github.dispatches), 1)
+
+    def test_lost_response_without_token_is_failed_not_resent(self):
+        self.github.dispatch_modes = ['applied']
+        result = self.dispatch(workflow='.github/workflows/system_management.yml')
+        self.assertNotIn('relayq_id', result)
+        self.assertEqual(result['status'], 'failed')
+        self.assertEqual(len(self.github.dispatches), 1)
+
+    def test_run_yields_one_result_per_job(self):
+        self.github.dispatch_modes = ['ok', '422', 'ok']
+        jobs = [{'id': i, 'workflow': TRANSCRIBE} for i in range(3)]
+        jobs.append({'id': 3, 'error': 'Unknown job type: x'})
+        with contextlib.redirect_stderr(io.StringIO()):
+            results = sorted(self.dispatcher.run(jobs), key=lambda r: r['id'])
+        self.assertEqual([r['id'] for r in results], [0, 1, 2, 3])
+        self.assertEqual(sorted(r['status'] for r in results), ['dispatched', 'dispatched', 'failed', 'failed'])
+        self.assertEqual(len(self.github.dispatches), 3)
+
+if __name__ == '__main__':
+    unittest.main()
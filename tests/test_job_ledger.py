@@ -0,0 +1,105 @@
+"""
+Tests for bin/job_ledger.py: a routing decision, the dispatch it led to and
+the GitHub run are one ledger row, whichever order they are recorded in.
+
+Run with: python3 -m unittest discover -s tests
+"""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dispatcher import Dispatcher
+from fake_github import FakeGitHub
+from job_ledger import JobLedger
+from select_target import run_batch
+
+POLICY = {
+    'routes': {
+        'transcribe': {'prefer': ['macmini'], 'constraints': {'max_size_mb': 500}},
+    },
+}
+
+class DecisionDispatchLinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='relayq-test-')
+        self.ledger = JobLedger(os.path.join(self.workdir, 'jobs.db'))
+        self.github = FakeGitHub().start()
+        self.dispatcher = Dispatcher('owner/repo', rate_per_min=6000, api_url=self.github.url, token='')
+
+    def tearDown(self):
+        self.dispatcher.close()
+        self.github.stop()
+        self.ledger.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def route(self, jobs):
+        out = io.StringIO()
+        run_batch(POLICY, io.StringIO(''.join(json.dumps(job) + '\n' for job in jobs)), out)
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def dispatch(self, decisions):
+        with contextlib.redirect_stderr(io.StringIO()):
+            return list(self.dispatcher.run(decisions))
+
+    def rows(self):
+        return self.ledger.conn().execute("SELECT * FROM jobs ORDER BY job_id").fetchall()
+
+    def test_decision_dispatch_and_run_share_a_row(self):
+        # Both batches number from 0; the keys keep them apart
+        for batch in range(2):
+            decisions = self.route([{'id': 0, 'job_type': 'transcribe', 'size_mb': 50, 'inputs': {'url': f'u{batch}'}},
+                                    {'id': 1, 'job_type': 'transcribe', 'size_mb': 900}])
+            self.ledger.record_decisions(decisions)
+            results = self.dispatch(decisions)
+            self.ledger.record_dispatches(results)
+            self.assertEqual({r['job_key'] for r in results}, {d['job_key'] for d in decisions})
+
+        rows = self.rows()
+        self.assertEqual(len(rows), 4)
+        dispatched = [row for row in rows if row['state'] == 'dispatched']
+        self.assertEqual(len(dispatched), 2)
+        for row in dispatched:
+            self.assertEqual(row['workflow'], '.github/workflows/transcribe_mac.yml')
+            self.assertIsNotNone(row['routed_at'])
+            self.assertIsNotNone(row['decision'])
+            self.assertRegex(row['relayq_id'], r'^rq-')
+        failed = [row for row in rows if row['state'] == 'failed']
+        self.assertEqual(len(failed), 2)
+        self.assertTrue(all('route constraints' in row['error'] for row in failed))
+
+        # The run GitHub started updates that same row
+        run = self.github.runs_for(dispatched[0]['relayq_id'])[0]
+        self.ledger.record_runs([dict(run, relayq_id=dispatched[0]['relayq_id'], status='in_progress',
+                                      run_started_at=run['created_at'])])
+        row = self.ledger.get(dispatched[0]['job_key'])
+        self.assertEqual((row['state'], row['run_id']), ('running', run['id']))
+        self.assertEqual(len(self.rows()), 4)
+
+    def test_decisions_recorded_after_dispatch_keep_its_state(self):
+        decisions = self.route([{'id': 'ep-1', 'job_type': 'transcribe', 'size_mb': 10}])
+        self.ledger.record_dispatches(self.dispatch(decisions))
+        self.ledger.record_decisions(decisions)
+        row, = self.rows()
+        self.assertEqual(row['state'], 'dispatched')
+        self.assertIsNotNone(row['routed_at'])
+        self.assertIsNotNone(row['dispatched_at'])
+
+    def test_caller_key_is_kept(self):
+        decisions = self.route([{'id': 'ep-1', 'job_type': 'transcribe', 'job_key': 'atlas-ep-1'}])
+        self.assertEqual(decisions[0]['job_key'], 'atlas-ep-1')
+        self.ledger.record_decisions(decisions)
+        self.ledger.record_dispatches(self.dispatch(decisions))
+        self.assertEqual(self.ledger.get('atlas-ep-1')['state'], 'dispatched')
+
+if __name__ == '__main__':
+    unittest.main()
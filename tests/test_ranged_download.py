@@ -0,0 +1,164 @@
+"""
+Tests for bin/ranged_download.py against a local HTTP server that drops
+connections midway, can ignore Range, and can change its ETag.
+
+Run with: python3 -m unittest discover -s tests
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+import ranged_download
+from ranged_download import DownloadError, RangedDownload
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Serves server.data; cuts bodies short while server.drops > 0"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        data, total = server.data, len(server.data)
+        start, end, status = 0, total - 1, 200
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if_range = self.headers.get('If-Range')
+        if server.ranges and match and (if_range is None or if_range == server.etag):
+            start, end, status = int(match.group(1)), int(match.group(2) or total - 1), 206
+        body = data[start:end + 1]
+
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', server.etag)
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{total}")
+        self.end_headers()
+
+        with server.lock:
+            # Never the one-byte probe, which reads headers only even when Range is ignored
+            drop = self.headers.get('Range') != 'bytes=0-0' and server.drops > 0
+            if drop:
+                server.drops -= 1
+        try:
+            self.wfile.write(body[:len(body) // 3] if drop else body)
+            self.wfile.flush()
+        except OSError:
+            pass
+        if drop:
+            self.close_connection = True
+            if server.change_after_drop:
+                server.data, server.etag = server.change_after_drop
+                server.change_after_drop = None
+
+class RangedDownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = (ranged_download.MIN_SEGMENT_BYTES, ranged_download.BACKOFF_S)
+        # Small segments so a 1 MB file is fetched over several connections
+        ranged_download.MIN_SEGMENT_BYTES = 128 * 1024
+        ranged_download.BACKOFF_S = 0.0
+
+        self.data = os.urandom(1024 * 1024)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+        self.server.daemon_threads = True
+        self.server.data = self.data
+        self.server.etag = '"v1"'
+        self.server.ranges = True
+        self.server.drops = 0
+        self.server.change_after_drop = None
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/media.mp3"
+
+        self.workdir = tempfile.mkdtemp(prefix='relayq-test-')
+        self.dest = os.path.join(self.workdir, 'media.mp3')
+        self.partial_dir = os.path.join(self.workdir, 'partial')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+        ranged_download.MIN_SEGMENT_BYTES, ranged_download.BACKOFF_S = self.saved
+
+    def download(self, **kwargs) -> RangedDownload:
+        return RangedDownload(self.url, self.dest, segments=4, partial_dir=self.partial_dir, timeout=5, **kwargs)
+
+    def read_dest(self) -> bytes:
+        with open(self.dest, 'rb') as f:
+            return f.read()
+
+    def test_retries_dropped_segments_from_last_byte(self):
+        self.server.drops = 6
+        stats = self.download().run()
+        self.assertEqual(self.read_dest(), self.data)
+        self.assertEqual(stats['mode'], 'ranged')
+        self.assertEqual(stats['segments'], 4)
+        self.assertEqual(stats['retries'], 6)
+        # Each retry asks only for what is missing, so no byte is counted twice
+        self.assertEqual(stats['bytes'], len(self.data))
+        self.assertEqual(os.listdir(self.partial_dir), [])
+
+    def test_resumes_partial_in_a_later_run(self):
+        self.server.drops = 4
+        with self.assertRaises(DownloadError):
+            self.download(retries=0).run()
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertTrue(any(name.endswith('.part.json') for name in os.listdir(self.partial_dir)))
+
+        self.server.drops = 0
+        stats = self.download().run()
+        self.assertEqual(self.read_dest(), self.data)
+        self.assertGreater(stats['resumed_bytes'], 0)
+        self.assertEqual(stats['bytes'] + stats['resumed_bytes'], len(self.data))
+
+    def test_changed_etag_discards_partial(self):
+        self.server.drops = 4
+        with self.assertRaises(DownloadError):
+            self.download(retries=0).run()
+
+        new_data = os.urandom(len(self.data))
+        self.server.data, self.server.etag, self.server.drops = new_data, '"v2"', 0
+        stats = self.download().run()
+        self.assertEqual(stats['resumed_bytes'], 0)
+        self.assertEqual(self.read_dest(), new_data)
+
+    def test_etag_change_mid_download_is_an_error(self):
+        # If-Range no longer matches, so the retry gets a 200 with the new body
+        self.server.drops = 1
+        self.server.change_after_drop = (os.urandom(len(self.data)), '"v2"')
+        with self.assertRaisesRegex(DownloadError, 'changed during download'):
+            self.download().run()
+        self.assertFalse(os.path.exists(self.dest))
+
+    def test_single_stream_when_range_is_ignored(self):
+        self.server.ranges = False
+        self.server.drops = 2
+        stats = self.download().run()
+        self.assertEqual(self.read_dest(), self.data)
+        self.assertEqual(stats['mode'], 'single')
+        self.assertEqual(stats['retries'], 2)
+
+    def test_sha256_match(self):
+        self.download(sha256=hashlib.sha256(self.data).hexdigest().upper()).run()
+        self.assertEqual(self.read_dest(), self.data)
+
+    def test_sha256_mismatch_removes_partial(self):
+        with self.assertRaisesRegex(DownloadError, 'does not match'):
+            self.download(sha256='0' * 64).run()
+        self.assertFalse(os.path.exists(self.dest))
+        leftovers = [name for name in os.listdir(self.partial_dir) if not name.endswith('.lock')]
+        self.assertEqual(leftovers, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Tests for bin/routerd.py: malformed requests get an {"error": ...} reply
+and the connection keeps serving.
+
+Run with: python3 -m unittest discover -s tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+# Runner state, ledger and throughput table nowhere near the real ones (read-only, so absent is fine)
+SCRATCH = tempfile.mkdtemp(prefix='relayq-test-')
+os.environ.setdefault('RELAYQ_RUNNER_STATE', os.path.join(SCRATCH, 'runners.json'))
+os.environ.setdefault('RELAYQ_LEDGER', os.path.join(SCRATCH, 'jobs.db'))
+os.environ.setdefault('RELAYQ_THROUGHPUT', os.path.join(SCRATCH, 'throughput.json'))
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+from routerd import CompiledPolicy, RouterClient, handle_request, make_server
+
+POLICY_YAML = """\
+routes:
+  transcribe:
+    workflow: .github/workflows/transcribe_audio.yml
+    constraints:
+      max_size_mb: 500
+"""
+
+class RouterdTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='relayq-test-')
+        self.policy_path = os.path.join(self.workdir, 'policy.yaml')
+        with open(self.policy_path, 'w') as f:
+            f.write(POLICY_YAML)
+        self.policy = CompiledPolicy(self.policy_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def reply(self, line: bytes):
+        return handle_request(self.policy, line)
+
+    def test_valid_query(self):
+        reply = self.reply(b'{"job_type": "transcribe", "params": {"size_mb": 50}}')
+        self.assertEqual(reply, {'workflow': '.github/workflows/transcribe_audio.yml'})
+
+    def test_malformed_requests_get_errors(self):
+        cases = {
+            b'{"job_type": "transcribe", "params": []}': 'Invalid params',
+            b'{"job_type": "transcribe", "params": "x"}': 'Invalid params',
+            b'{"job_type": "transcribe", "params": {"size_mb": "50"}}': 'Invalid size_mb',
+            b'{"op": "place", "job_type": "transcribe", "params": {"size_mb": null}}': 'Invalid size_mb',
+            b'{"job_type": ["transcribe"]}': 'Invalid job_type',
+            b'{"op": "release", "runner": ["macmini"], "job_type": "transcribe"}': 'release needs',
+            b'[1, 2]': 'must be a JSON object',
+            b'{"job_type": ': 'invalid request',
+        }
+        for line, message in cases.items():
+            with self.subTest(line=line):
+                self.assertIn(message, self.reply(line).get('error', ''))
+
+    def test_connection_survives_bad_request(self):
+        address = os.path.join(self.workdir, 'router.sock')
+        server = make_server(address, self.policy)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            with RouterClient(address) as client:
+                self.assertIn('error', client.request({'job_type': 'transcribe', 'params': {'size_mb': 'big'}}))
+                self.assertEqual(client.query('transcribe', {'size_mb': 50})['workflow'],
+                                 '.github/workflows/transcribe_audio.yml')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+if __name__ == '__main__':
+    unittest.main()
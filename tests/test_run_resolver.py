@@ -0,0 +1,108 @@
+"""
+Tests for bin/run_resolver.py against a fake GitHub runs listing:
+batch resolution, paging, and the created>= watermark moving forward.
+
+Run with: python3 -m unittest discover -s tests
+"""
+
+import contextlib
+import io
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_github import FakeGitHub, iso
+from github_api import GitHubAPI
+from run_resolver import CLOCK_SKEW, PER_PAGE, RunResolver, new_token, resolve_results
+
+class RunResolverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.github = FakeGitHub().start()
+        self.api = GitHubAPI(token='', base_url=self.github.url, timeout=5)
+        self.resolver = RunResolver('owner/repo', self.api)
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+
+    def tearDown(self):
+        self.api.close()
+        self.github.stop()
+
+    def created_filter(self, query) -> str:
+        return query['created'][0]
+
+    def test_watermark_advances_to_oldest_pending(self):
+        old, new = new_token(), new_token()
+        old_at, new_at = self.now - timedelta(hours=1), self.now - timedelta(minutes=10)
+        self.resolver.add(old, old_at.isoformat())
+        self.resolver.add(new, new_at.isoformat())
+        self.github.add_run('transcribe_mac.yml', old, iso(old_at))
+
+        found = self.resolver.poll()
+        self.assertEqual(set(found), {old})
+        self.assertEqual(self.created_filter(self.github.run_queries[-1]), '>=' + iso(old_at - CLOCK_SKEW))
+        self.assertEqual(self.resolver.since, new_at)
+
+        self.github.add_run('transcribe_mac.yml', new, iso(new_at))
+        found = self.resolver.poll()
+        self.assertEqual(set(found), {new})
+        self.assertEqual(self.created_filter(self.github.run_queries[-1]), '>=' + iso(new_at - CLOCK_SKEW))
+        self.assertIsNone(self.resolver.since)
+
+        # Nothing pending: no more queries, and a resolved token is not tracked again
+        queries = len(self.github.run_queries)
+        self.assertEqual(self.resolver.poll(), {})
+        self.resolver.add(old, old_at.isoformat())
+        self.assertEqual(self.resolver.pending, {})
+        self.assertEqual(len(self.github.run_queries), queries)
+
+    def test_pages_only_until_every_token_is_found(self):
+        oldest, newest = new_token(), new_token()
+        self.github.add_run('transcribe_mac.yml', oldest, iso(self.now))
+        for _ in range(PER_PAGE + 20):
+            self.github.add_run('transcribe_mac.yml', new_token(), iso(self.now))
+        self.github.add_run('transcribe_mac.yml', newest, iso(self.now))
+
+        self.resolver.add(newest, self.now.isoformat())
+        self.resolver.poll()
+        self.assertEqual(self.resolver.queries, 1)
+
+        self.resolver.add(oldest, self.now.isoformat())
+        self.resolver.poll()
+        self.assertEqual(self.resolver.queries, 3)
+        self.assertEqual(self.resolver.resolved[oldest]['run_id'], self.github.runs_for(oldest)[0]['id'])
+
+    def test_resolve_gives_up_at_timeout(self):
+        missing = new_token()
+        self.resolver.add(missing, self.now.isoformat())
+        self.assertEqual(self.resolver.resolve(timeout=0.3, interval=0.1), {})
+        self.assertIn(missing, self.resolver.pending)
+        self.assertGreaterEqual(self.resolver.queries, 2)
+
+    def test_resolve_results_attaches_runs(self):
+        token, failed_token = new_token(), new_token()
+        run_id = self.github.add_run('transcribe_rpi.yml', token)
+        results = [
+            {'id': 0, 'status': 'dispatched', 'relayq_id': token, 'dispatched_at': self.now.isoformat()},
+            {'id': 1, 'status': 'failed', 'relayq_id': failed_token},
+            {'id': 2, 'status': 'dispatched'},
+        ]
+        results = resolve_results(results, self.resolver, timeout=1, interval=0.1)
+        self.assertEqual(results[0]['run_id'], run_id)
+        self.assertNotIn('run_id', results[1])
+        self.assertNotIn('run_id', results[2])
+        self.assertNotIn(failed_token, self.resolver.pending)
+
+    def test_resolve_results_survives_listing_errors(self):
+        self.github.runs_status = 502
+        results = [{'id': 0, 'status': 'dispatched', 'relayq_id': new_token(), 'dispatched_at': self.now.isoformat()}]
+        with contextlib.redirect_stderr(io.StringIO()) as err:
+            results = resolve_results(results, self.resolver, timeout=1, interval=0.1)
+        self.assertIn('stopped early', err.getvalue())
+        self.assertNotIn('run_id', results[0])
+
+if __name__ == '__main__':
+    unittest.main()
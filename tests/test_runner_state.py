@@ -0,0 +1,134 @@
+"""
+Tests for bin/runner_state.py's poller against a local stub of the GitHub
+runners endpoint (what `runner_state.py poll --api-url` points at).
+
+Run with: python3 -m unittest discover -s tests
+"""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+from github_api import GitHubAPI
+from runner_state import RunnerStatePoller, read_runner_state
+
+RUNNERS = {
+    'total_count': 2,
+    'runners': [
+        {'name': 'macmini', 'status': 'online', 'busy': True, 'labels': [{'name': 'self-hosted'}, {'name': 'macmini'}]},
+        {'name': 'rpi4', 'status': 'offline', 'busy': False, 'labels': [{'name': 'self-hosted'}, {'name': 'rpi4'}]},
+    ],
+}
+
+class RunnersHandler(BaseHTTPRequestHandler):
+    """GET /repos/<repo>/actions/runners; server.mode picks the response"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.headers.get('If-None-Match')))
+        body = json.dumps(server.payload).encode()
+        if server.mode == 'error':
+            self.reply(500, b'{"message": "boom"}')
+        elif server.mode == 'truncated':
+            # Promise the whole body, send a third, hang up
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', server.etag)
+            self.end_headers()
+            self.wfile.write(body[:len(body) // 3])
+            self.close_connection = True
+        elif self.headers.get('If-None-Match') == server.etag:
+            self.reply(304, b'')
+        else:
+            self.reply(200, body, [('ETag', server.etag), ('X-RateLimit-Remaining', '4999'),
+                                   ('X-RateLimit-Limit', '5000')])
+
+    def reply(self, status, body, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class RunnerStatePollerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), RunnersHandler)
+        self.server.daemon_threads = True
+        self.server.payload = RUNNERS
+        self.server.etag = '"r1"'
+        self.server.mode = 'ok'
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.workdir = tempfile.mkdtemp(prefix='relayq-test-')
+        self.state_path = os.path.join(self.workdir, 'runners.json')
+        api = GitHubAPI(token='', base_url=f"http://127.0.0.1:{self.server.server_port}", timeout=5)
+        self.poller = RunnerStatePoller('owner/repo', self.state_path, api)
+
+    def tearDown(self):
+        self.poller.api.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_fetches_and_publishes_snapshot(self):
+        state = self.poller.poll_once()
+        self.assertEqual(self.server.requests, [('/repos/owner/repo/actions/runners?per_page=100', None)])
+        self.assertEqual(state['etag'], '"r1"')
+        self.assertEqual(state['not_modified'], 0)
+        self.assertEqual(state['rate_limit']['remaining'], 4999)
+        self.assertEqual(state['runners'][0], {'name': 'macmini', 'status': 'online', 'busy': True,
+                                               'labels': ['self-hosted', 'macmini']})
+        self.assertEqual(state['runners'][1]['status'], 'offline')
+        self.assertEqual(read_runner_state(self.state_path)['runners'], state['runners'])
+
+    def test_not_modified_keeps_snapshot(self):
+        first = dict(self.poller.poll_once())
+        for count in (1, 2):
+            state = self.poller.poll_once()
+            self.assertEqual(state['not_modified'], count)
+        self.assertEqual(self.server.requests[-1][1], '"r1"')
+        self.assertEqual(state['runners'], first['runners'])
+        self.assertEqual(state['fetched_at'], first['fetched_at'])
+        self.assertGreaterEqual(state['checked_at'], first['checked_at'])
+
+        # A new ETag replaces the snapshot
+        self.server.etag = '"r2"'
+        self.server.payload = {'runners': []}
+        state = self.poller.poll_once()
+        self.assertEqual((state['etag'], state['not_modified'], state['runners']), ('"r2"', 0, []))
+
+    def test_errors_keep_last_good_snapshot(self):
+        good = dict(self.poller.poll_once())
+        for mode in ('error', 'truncated'):
+            with self.subTest(mode=mode):
+                self.server.mode = mode
+                self.server.etag = '"changed"'
+                with contextlib.redirect_stderr(io.StringIO()) as err:
+                    self.assertIsNone(self.poller.try_poll())
+                self.assertIn('runner poll failed', err.getvalue())
+                self.assertEqual(read_runner_state(self.state_path)['runners'], good['runners'])
+                self.assertEqual(read_runner_state(self.state_path)['etag'], good['etag'])
+
+        # And the next poll after the outage works again
+        self.server.mode = 'ok'
+        self.assertEqual(self.poller.try_poll()['etag'], '"changed"')
+
+if __name__ == '__main__':
+    unittest.main()
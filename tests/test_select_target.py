@@ -0,0 +1,66 @@
+"""
+Tests for select_target.py batch routing: malformed jobs get a per-job
+error line instead of aborting the stream.
+
+Run with: python3 -m unittest discover -s tests
+"""
+
+import io
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+from select_target import job_error, run_batch
+
+POLICY = {
+    'routes': {
+        'transcribe': {
+            'workflow': '.github/workflows/transcribe_audio.yml',
+            'constraints': {'max_size_mb': 500},
+        },
+    },
+}
+
+class JobErrorTest(unittest.TestCase):
+
+    def test_valid_job(self):
+        self.assertIsNone(job_error({'job_type': 'transcribe'}, {'size_mb': 12.5}))
+        self.assertIsNone(job_error({'job_type': 'transcribe'}, {}))
+
+    def test_non_numeric_size_mb(self):
+        for size_mb in ('120', None, True, [1], {'mb': 1}):
+            with self.subTest(size_mb=size_mb):
+                error = job_error({'job_type': 'transcribe'}, {'size_mb': size_mb})
+                self.assertRegex(error, r'^Invalid size_mb')
+
+class RouteBatchTest(unittest.TestCase):
+
+    def route(self, lines):
+        out = io.StringIO()
+        failed = run_batch(POLICY, io.StringIO('\n'.join(lines) + '\n'), out)
+        return failed, [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_bad_size_mb_fails_only_that_job(self):
+        failed, decisions = self.route([
+            '{"id": "a", "job_type": "transcribe", "size_mb": "120"}',
+            '{"id": "b", "job_type": "transcribe", "params": {"size_mb": null}}',
+            '{"id": "c", "job_type": "transcribe", "size_mb": 120}',
+            '{"id": "d", "job_type": "transcribe", "size_mb": 900}',
+        ])
+        self.assertEqual(failed, 3)
+        self.assertEqual([d['id'] for d in decisions], ['a', 'b', 'c', 'd'])
+        self.assertRegex(decisions[0]['error'], 'Invalid size_mb')
+        self.assertRegex(decisions[1]['error'], 'Invalid size_mb')
+        self.assertEqual(decisions[2]['workflow'], POLICY['routes']['transcribe']['workflow'])
+        self.assertRegex(decisions[3]['error'], 'route constraints')
+
+    def test_malformed_lines(self):
+        failed, decisions = self.route(['not json', '{"job_type": ["x"]}', '{"job_type": "transcribe", "params": []}'])
+        self.assertEqual(failed, 3)
+        self.assertEqual(len(decisions), 3)
+
+if __name__ == '__main__':
+    unittest.main()
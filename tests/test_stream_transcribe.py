@@ -0,0 +1,83 @@
+"""
+Tests for bin/stream_transcribe.py: a stream several chunks long runs through
+the whole pipeline (curl, a fake decoder, the stub model) and finishes.
+
+Run with: python3 -m unittest discover -s tests
+"""
+
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import unittest
+
+BIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin')
+sys.path.insert(0, BIN)
+
+from stream_transcribe import MAX_CHUNK_S, MIN_CHUNK_S, SAMPLE_RATE
+
+# Stands in for ffmpeg: the "media" is already 16 kHz s16le, so copy it through
+FAKE_DECODER = """#!{python}
+import shutil, sys
+shutil.copyfileobj(sys.stdin.buffer, sys.stdout.buffer)
+"""
+
+def write_pcm(path: str, seconds: int):
+    """Noise with a second of silence every 20 s, so there are places to cut"""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    with open(path, 'wb') as f:
+        for second in range(seconds):
+            if second % 20 == 19:
+                f.write(bytes(SAMPLE_RATE * 2))
+            else:
+                f.write(rng.integers(-8000, 8000, SAMPLE_RATE, dtype=np.int16).tobytes())
+
+@unittest.skipUnless(shutil.which('curl'), "needs curl")
+class StreamTranscribeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='relayq-test-')
+        self.decoder = os.path.join(self.workdir, 'fake-ffmpeg')
+        with open(self.decoder, 'w') as f:
+            f.write(FAKE_DECODER.format(python=sys.executable))
+        os.chmod(self.decoder, 0o755)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_stream_longer_than_one_chunk_finishes(self):
+        # Long enough that chunks go to the workers while the decoder is still running
+        seconds = int(2 * (MAX_CHUNK_S + MIN_CHUNK_S)) + 40
+        media = os.path.join(self.workdir, 'episode.pcm')
+        write_pcm(media, seconds)
+        output = os.path.join(self.workdir, 'episode.txt')
+        stats = os.path.join(self.workdir, 'stats.json')
+
+        proc = subprocess.Popen(
+            [sys.executable, os.path.join(BIN, 'stream_transcribe.py'), 'file://' + media, output,
+             '--model', 'stub', '--device', 'cpu', '--workers', '2', '--stats-json', stats],
+            env=dict(os.environ, RELAYQ_FFMPEG=self.decoder),
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, start_new_session=True)
+        try:
+            _, err = proc.communicate(timeout=60)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.communicate()
+            self.fail("stream_transcribe did not finish: the decoder never saw EOF")
+        self.assertEqual(proc.returncode, 0, err)
+
+        with open(stats) as f:
+            result = json.load(f)
+        self.assertGreaterEqual(result['chunks'], 3)
+        self.assertEqual(result['audio_s'], seconds)
+        self.assertEqual(result['bytes'], seconds * SAMPLE_RATE * 2)
+        with open(output) as f:
+            self.assertEqual(f.read().count('[stub transcript'), result['chunks'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+Tests for bin/whisperd.py with the "stub" model: a real `whisperd.py serve`
+process driven through WhisperClient, including LRU eviction under the
+memory budget.
+
+Run with: python3 -m unittest discover -s tests
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import wave
+
+BIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin')
+sys.path.insert(0, BIN)
+
+from whisperd import WhisperClient
+
+def write_wav(path: str, seconds: float, rate: int = 16000):
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(b'\0\0' * int(seconds * rate))
+
+class WhisperdTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='relayq-test-')
+        self.socket = os.path.join(self.workdir, 'whisper.sock')
+        self.audio = os.path.join(self.workdir, 'clip.wav')
+        write_wav(self.audio, 2.5)
+        # Stub models take 1 MB each: room for two
+        self.server = subprocess.Popen(
+            [sys.executable, os.path.join(BIN, 'whisperd.py'), 'serve', '--socket', self.socket,
+             '--memory-mb', '2', '--preload', 'stub@cpu'],
+            stderr=subprocess.PIPE, text=True)
+        self.client = self.connect()
+
+    def tearDown(self):
+        self.client.close()
+        self.server.terminate()
+        self.server.communicate(timeout=10)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def connect(self) -> WhisperClient:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                return WhisperClient(self.socket, timeout=10)
+            except OSError:
+                if self.server.poll() is not None or time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def transcribe(self, device: str = 'cpu', **kwargs):
+        return self.client.transcribe(self.audio, model='stub', device=device, **kwargs)
+
+    def test_round_trip_uses_preloaded_model(self):
+        output = os.path.join(self.workdir, 'out.txt')
+        reply = self.transcribe(output=output)
+        self.assertNotIn('error', reply)
+        self.assertTrue(reply['cached'])
+        self.assertEqual(reply['output'], output)
+        with open(output) as f:
+            text = f.read()
+        self.assertIn('clip.wav: 2.5s', text)
+        self.assertEqual(reply['chars'], len(text))
+
+        reply = self.transcribe()
+        self.assertIn('2.5s', reply['text'])
+
+    def test_lru_eviction_within_budget(self):
+        self.assertFalse(self.transcribe('a')['cached'])
+        # Touch cpu so 'a' becomes least recently used
+        self.assertTrue(self.transcribe('cpu')['cached'])
+        self.assertFalse(self.transcribe('b')['cached'])
+
+        status = self.client.request({'op': 'status'})
+        self.assertEqual([(m['model'], m['device']) for m in status['models']], [('stub', 'cpu'), ('stub', 'b')])
+        self.assertEqual((status['used_mb'], status['budget_mb']), (2, 2))
+        self.assertEqual((status['loads'], status['evictions']), (3, 1))
+
+        # The evicted model loads again; the others are still resident
+        self.assertFalse(self.transcribe('a')['cached'])
+        self.assertTrue(self.transcribe('b')['cached'])
+
+    def test_errors_do_not_drop_the_connection(self):
+        reply = self.client.request({'audio': os.path.join(self.workdir, 'missing.wav'), 'model': 'stub'})
+        self.assertIn('audio file not found', reply['error'])
+        self.assertEqual(self.client.request({'op': 'bogus'}), {'error': 'unknown op: bogus'})
+        self.assertTrue(self.transcribe()['cached'])
+
+if __name__ == '__main__':
+    unittest.main()